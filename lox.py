@@ -1,25 +1,59 @@
 # Interactive prompt for loxpy
 # TODO: command history
 
-from sys import argv, version_info
+from argparse import ArgumentParser
+from io import StringIO
+from sys import argv, stderr, version_info
+from typing import Callable, Optional, Sequence, TextIO, Union
 
-from loxpy.error import LoxRuntimeError, LoxParseError
+from loxpy import __version__
+from loxpy.error import LoxRuntimeError, LoxParseError, LoxInterpreterError
 from loxpy.token import Token, TokenType
 # components 
 from loxpy.interpreter import Interpreter
 from loxpy.scanner import Scanner
 from loxpy.parser import Parser
 from loxpy.resolver import Resolver
+from loxpy.compiler import compile_program
+from loxpy.vm import VM
+from loxpy.codegen import PythonRuntime
+from loxpy.source import SourceReader, open_source
+from loxpy.cache import CachedProgram, load_program, save_program, source_digest
+from loxpy.project import load_project
+from loxpy.statement import Stmt
+from loxpy.optimizer import format_tree, optimize, specialize
 
 
-USAGE = "Usage: lox [file]" 
-LOX_VERSION = "0.1.0"
+USAGE = "Usage: lox [--vm | --closures | --python] [-O] [--dump-ast] [--no-cache] [--cache-dir DIR] [--jobs N] [file ...]" 
+LOX_VERSION = __version__
 
 
 class Lox:
-    had_error = False       # had_parse_error?
-    had_runtime_error = False
-    interp = Interpreter()
+    def __init__(
+        self,
+        use_vm: bool=False,
+        compile_closures: bool=False,
+        use_python: bool=False,
+        use_cache: bool=False,
+        cache_dir: Optional[str]=None,
+        optimize: bool=False,
+        dump_ast: bool=False
+    ) -> None:
+        self.had_error = False       # had_parse_error?
+        self.had_runtime_error = False
+        self.interp = Interpreter(compile_closures=compile_closures)
+        # Load resolved programs from __loxcache__ (or cache_dir) when the 
+        # source hasn't changed
+        self.use_cache = use_cache
+        self.cache_dir = cache_dir
+        # Run the optimizer over the resolved program, and print the tree
+        # (before and after optimizing) to stderr
+        self.optimize = optimize
+        self.dump_ast = dump_ast
+        # Execute with the bytecode VM rather than walking the tree
+        self.vm = VM() if use_vm else None
+        # Translate to Python and execute that instead
+        self.py_runtime = PythonRuntime() if use_python else None
 
     def _repl_header(self) -> str:
         py_version = ".".join(str(i) for i in version_info[:3])
@@ -36,39 +70,106 @@ class Lox:
         else:
             self.report(token.line, f" at [{token.lexeme}]", message)
 
-    def run(self, source: str) -> None:
+    def _front_end(self, source: Union[str, SourceReader], output: Optional[TextIO]=None) -> Sequence[Stmt]:
+        # Tokens are scanned as the parser asks for them. Warnings go to
+        # output, or stdout if it isn't given.
+        scanner = Scanner(source, output=output)
+        parser = Parser(scanner.iter_tokens())
+        stmts = parser.parse()
+
+        # Only resolve if we parsed correctly
+        if self.had_error or not stmts:
+            exit(-1)
+
+        resolver = Resolver(output=output)
+        resolver.resolve(stmts)
+
+        return stmts
+
+    def _cached_front_end(self, filename: str) -> Sequence[Stmt]:
+        """
+        Load the resolved program for filename from the cache, or build
+        it and save it for next time
+        """
+        digest = source_digest(filename)
+        program = load_program(filename, digest, self.cache_dir)
+        if program is not None:
+            print(program.messages, end="")
+            return program.stmts
+
+        # Keep any warnings so that they are shown when loading the cache
+        messages = StringIO()
         try:
-            scanner = Scanner(source)
-            tokens = scanner.scan()
-            parser = Parser(tokens)
-            stmts = parser.parse()
+            with open_source(filename) as source:
+                program = CachedProgram(self._front_end(source, messages))
+        finally:
+            print(messages.getvalue(), end="")
 
-            # Only resolve if we parsed correctly
-            if self.had_error or not stmts:
-                exit(-1)
+        program.messages = messages.getvalue()
+        save_program(filename, digest, program, self.cache_dir)
 
-            resolver = Resolver(self.interp)
-            resolver.resolve(stmts)
+        return program.stmts
 
-            self.interp.interpret(stmts)
+    def _run(self, front_end: Callable[[], Sequence[Stmt]], keep_globals: bool=True) -> None:
+        try:
+            stmts = front_end()
+            if self.optimize:
+                stmts = optimize(stmts, dump=stderr if self.dump_ast else None, keep_globals=keep_globals)
+            elif self.dump_ast:
+                print(format_tree(stmts), file=stderr)
+
+            if self.vm is not None:
+                self.vm.run(compile_program(stmts))
+            elif self.py_runtime is not None:
+                self.py_runtime.execute(stmts)
+            else:
+                if not self.interp.compile_closures:
+                    # The closure compiler already picks the code for each
+                    # operator once, when compiling
+                    stmts = specialize(stmts)
+                # Runtime errors are reported below, the same as for the
+                # other backends
+                self.interp.run(stmts)
 
         except LoxParseError as parse_error:
             self.error(parse_error.token, str(parse_error))
+        except LoxInterpreterError as resolve_error:
+            self.error(resolve_error.token, resolve_error.message)
+            self.had_error = True
         except LoxRuntimeError as runtime_error:
             print(f"{runtime_error}: [line {runtime_error.token.line}]")
             self.had_runtime_error = True
 
-    def run_file(self, filename: str) -> None:
-        with open(filename, "r") as fp:
-            source = fp.read()
-
-        self.run(source)
+    def run(self, source: Union[str, SourceReader], keep_globals: bool=True) -> None:
+        # Unused globals can only be removed when nothing else will run
+        # after source, which isn't the case in the REPL
+        self._run(lambda: self._front_end(source), keep_globals)
 
+    def _exit_on_error(self) -> None:
         if self.had_error:
             exit(-1)
         elif self.had_runtime_error:
             exit(-2)
 
+    def run_file(self, filename: str) -> None:
+        if self.use_cache:
+            self._run(lambda: self._cached_front_end(filename), keep_globals=False)
+        else:
+            # The file is scanned as it is read rather than loaded up front
+            with open_source(filename) as source:
+                self.run(source, keep_globals=False)
+
+        self._exit_on_error()
+
+    def run_project(self, filenames: Sequence[str], jobs: Optional[int]=None) -> None:
+        """
+        Run a program made of several files, which share their globals.
+        The front end for each file is run in parallel on up to jobs
+        processes.
+        """
+        self._run(lambda: load_project(filenames, jobs), keep_globals=False)
+        self._exit_on_error()
+
     def prompt(self) -> None:
         print(self._repl_header())
 
@@ -90,11 +191,38 @@ class Lox:
                 exit(0)
 
 
-def main(args):
+def get_parser() -> ArgumentParser:
+    parser = ArgumentParser(description="Lox interpreter", usage=USAGE)
+    parser.add_argument("file", nargs="*", help="Lox source file(s) to run, omit to start a REPL. Several files are run as one program")
+    backend = parser.add_mutually_exclusive_group()
+    backend.add_argument("--vm", action="store_true", help="Compile to bytecode and run on the VM")
+    backend.add_argument("--closures", action="store_true", help="Compile the tree to closures before running")
+    backend.add_argument("--python", action="store_true", help="Translate to Python source and run that")
+    parser.add_argument("-O", "--optimize", action="store_true", help="Fold constants, prune constant branches and remove dead code before running")
+    parser.add_argument("--dump-ast", action="store_true", help="Print the tree to stderr (before and after optimizing with -O)")
+    parser.add_argument("--no-cache", action="store_true", help="Don't load or save the resolved program in __loxcache__")
+    parser.add_argument("--cache-dir", default=None, help="Keep cached programs in this directory instead of next to the script")
+    parser.add_argument("-j", "--jobs", type=int, default=None, help="Processes to use for the front end when running several files (default: one per CPU)")
+
+    return parser
 
-    lox = Lox()
-    if len(args) == 1:
-        lox.run_file(args[0])
+
+def main(args):
+    opts = get_parser().parse_args(args)
+
+    lox = Lox(
+        use_vm=opts.vm,
+        compile_closures=opts.closures,
+        use_python=opts.python,
+        use_cache=not opts.no_cache,
+        cache_dir=opts.cache_dir,
+        optimize=opts.optimize,
+        dump_ast=opts.dump_ast
+    )
+    if len(opts.file) > 1:
+        lox.run_project(opts.file, opts.jobs)
+    elif len(opts.file) == 1:
+        lox.run_file(opts.file[0])
     else:
         lox.prompt()
 
@@ -1,3 +1,5 @@
 # TODO: import here 
 
 #from loxpy import Interpreter
+
+__version__ = "0.1.0"
@@ -0,0 +1,182 @@
+"""
+BATCH
+
+Run many Lox scripts in one go, eg
+
+    python -m loxpy.batch tests/scripts/ extra.lox --jobs 8
+
+rather than starting a new Python process for every script. The scripts
+are shared out over a pool of worker processes that stay up for the
+whole batch. Each script is run by its own Interpreter, so nothing is
+shared between scripts, and its output, status and run time are sent
+back to be reported.
+"""
+
+import os
+import time
+from argparse import ArgumentParser
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from io import StringIO
+from sys import argv
+from typing import Iterator, List, Optional, Sequence
+
+from loxpy.scanner import Scanner
+from loxpy.parser import Parser
+from loxpy.resolver import Resolver
+from loxpy.interpreter import Interpreter
+from loxpy.optimizer import specialize
+from loxpy.source import open_source
+from loxpy.token import TokenType
+from loxpy.error import LoxParseError, LoxInterpreterError, LoxRuntimeError
+
+
+# Status of a script. These are only reported by the batch runner, they
+# aren't the exit codes of lox.py.
+STATUS_OK = 0
+STATUS_ERROR = -1           # parse or resolve error
+STATUS_RUNTIME_ERROR = -2
+# Any other exception, eg: the file couldn't be read or decoded
+STATUS_CRASH = -3
+
+
+@dataclass
+class ScriptResult:
+    """
+    ScriptResult
+    What happened when a script was run. Any error message is at the
+    end of stdout.
+    """
+    filename: str
+    status: int
+    stdout: str
+    # Wall clock time for the whole script, front end included, in seconds
+    elapsed: float
+
+
+def run_script(filename: str) -> ScriptResult:
+    """
+    Run the script in filename on a fresh Interpreter
+    """
+    stdout = StringIO()
+    status = STATUS_OK
+    start = time.perf_counter()
+
+    try:
+        with open_source(filename) as source:
+            stmts = Parser(Scanner(source, output=stdout).iter_tokens()).parse()
+        Resolver(output=stdout).resolve(stmts)
+        Interpreter(output=stdout).run(specialize(stmts))
+    except (LoxParseError, LoxInterpreterError) as e:
+        where = "at end" if e.token.token_type == TokenType.LOX_EOF else f"at [{e.token.lexeme}]"
+        print(f"[line {e.token.line}]: Error {where}, {e.message}", file=stdout)
+        status = STATUS_ERROR
+    except LoxRuntimeError as e:
+        print(f"{e}: [line {e.token.line}]", file=stdout)
+        status = STATUS_RUNTIME_ERROR
+    except Exception as e:
+        # Report it rather than let it through, since pool.map would
+        # raise it again and lose the rest of the batch
+        print(f"{e.__class__.__name__}: {e}", file=stdout)
+        status = STATUS_CRASH
+
+    return ScriptResult(filename, status, stdout.getvalue(), time.perf_counter() - start)
+
+
+def find_scripts(paths: Sequence[str]) -> List[str]:
+    """
+    Expand each directory in paths to the .lox files under it, in sorted
+    order. Other paths are kept as they are.
+    """
+    filenames = []
+    for path in paths:
+        if not os.path.isdir(path):
+            filenames.append(path)
+            continue
+
+        found = []
+        for dirpath, _, names in os.walk(path):
+            found.extend(os.path.join(dirpath, name) for name in names if name.endswith(".lox"))
+        filenames.extend(sorted(found))
+
+    return filenames
+
+
+class BatchRunner:
+    """
+    BatchRunner
+    Pool of worker processes for running scripts. The pool is started
+    once and can run any number of batches, so close() it (or use it as
+    a context manager) when done. With jobs=1 scripts are run in this
+    process instead.
+    """
+
+    def __init__(self, jobs: Optional[int]=None) -> None:
+        self.jobs = jobs if jobs is not None else (os.cpu_count() or 1)
+        # Workers are forked from this process, so they start with loxpy
+        # already imported
+        self.pool = ProcessPoolExecutor(max_workers=self.jobs) if self.jobs > 1 else None
+
+    def __enter__(self) -> "BatchRunner":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def close(self) -> None:
+        if self.pool is not None:
+            self.pool.shutdown()
+            self.pool = None
+
+    def run(self, filenames: Sequence[str]) -> Iterator[ScriptResult]:
+        """
+        Run each of filenames, yielding the results in the same order
+        """
+        if self.pool is None:
+            return map(run_script, filenames)
+
+        # Small batches keep the workers busy when scripts vary in length
+        chunk_size = max(1, len(filenames) // (self.jobs * 8))
+        return self.pool.map(run_script, filenames, chunksize=chunk_size)
+
+
+def run_batch(paths: Sequence[str], jobs: Optional[int]=None) -> List[ScriptResult]:
+    """
+    Run all the scripts in paths (files or directories)
+    """
+    with BatchRunner(jobs) as runner:
+        return list(runner.run(find_scripts(paths)))
+
+
+def get_parser() -> ArgumentParser:
+    parser = ArgumentParser(description="Run many Lox scripts on a pool of worker processes")
+    parser.add_argument("paths", nargs="+", help="Lox scripts, or directories to find them in")
+    parser.add_argument("-j", "--jobs", type=int, default=None, help="Number of worker processes (default: one per CPU)")
+    parser.add_argument("--show-output", action="store_true", help="Print the output of each script after its result")
+
+    return parser
+
+
+def main(args: Sequence[str]) -> int:
+    opts = get_parser().parse_args(args)
+    filenames = find_scripts(opts.paths)
+
+    failed = 0
+    total_time = 0.0
+    start = time.perf_counter()
+    with BatchRunner(opts.jobs) as runner:
+        for result in runner.run(filenames):
+            print(f"{result.status:>3} {result.elapsed:8.4f}s {result.filename}")
+            if opts.show_output:
+                print(result.stdout, end="")
+            if result.status != STATUS_OK:
+                failed += 1
+            total_time += result.elapsed
+
+    print(f"{len(filenames)} scripts, {failed} failed, {total_time:.4f}s in scripts, {time.perf_counter() - start:.4f}s in total")
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    exit(main(argv[1:]))
@@ -0,0 +1,123 @@
+"""
+CACHE
+
+On-disk cache of resolved programs, along the lines of CPython's
+__pycache__. A program is stored next to its script in __loxcache__
+(or in a given cache directory) and is only used if the hash of the
+source and the loxpy version both match.
+
+Like .pyc files the cache is pickled, so only load caches from
+directories that you would also run scripts from.
+"""
+
+import hashlib
+import os
+import pickle
+import sys
+from dataclasses import dataclass
+from typing import Optional, Sequence
+
+from loxpy import __version__
+from loxpy.statement import Stmt
+
+
+CACHE_DIR_NAME = "__loxcache__"
+CACHE_FORMAT = 2
+
+# Errors that mean a cache file can't be used, in which case the program
+# is simply built again.
+LOAD_ERRORS = (OSError, EOFError, ValueError, pickle.UnpicklingError, AttributeError, ImportError, IndexError, TypeError)
+
+
+@dataclass
+class CachedProgram:
+    """
+    CachedProgram
+    A resolved program, along with anything the scanner and resolver
+    printed (eg: unused variable warnings) so that it can be shown again
+    when the program is loaded.
+    """
+    stmts: Sequence[Stmt]
+    messages: str = ""
+
+
+def source_digest(filename: str) -> str:
+    """
+    sha256 of the contents of filename
+    """
+    digest = hashlib.sha256()
+    with open(filename, "rb") as fp:
+        while True:
+            chunk = fp.read(1 << 20)
+            if not chunk:
+                break
+            digest.update(chunk)
+
+    return digest.hexdigest()
+
+
+def cache_path(filename: str, cache_dir: Optional[str]=None) -> str:
+    """
+    Path of the cache file for the script filename. Caches for scripts
+    with the same name in different directories can share a cache_dir.
+    """
+    filename = os.path.abspath(filename)
+    name = os.path.basename(filename)
+
+    if cache_dir is None:
+        cache_dir = os.path.join(os.path.dirname(filename), CACHE_DIR_NAME)
+    else:
+        path_hash = hashlib.sha256(filename.encode("utf-8")).hexdigest()
+        name = f"{name}.{path_hash[:16]}"
+
+    return os.path.join(cache_dir, f"{name}.loxpy-{__version__}.pickle")
+
+
+def _header(digest: str) -> bytes:
+    return f"loxpy {__version__} {CACHE_FORMAT} {sys.implementation.cache_tag} {digest}\n".encode("utf-8")
+
+
+def load_program(filename: str, digest: str, cache_dir: Optional[str]=None) -> Optional[CachedProgram]:
+    """
+    Load the cached program for filename, or return None if there is no
+    cache or it was made from a different source or version
+    """
+    try:
+        with open(cache_path(filename, cache_dir), "rb") as fp:
+            # Check the header before unpickling anything
+            if fp.readline() != _header(digest):
+                return None
+            program = pickle.load(fp)
+    except LOAD_ERRORS:
+        return None
+
+    if not isinstance(program, CachedProgram):
+        return None
+
+    return program
+
+
+def save_program(filename: str, digest: str, program: CachedProgram, cache_dir: Optional[str]=None) -> bool:
+    """
+    Save program to the cache for filename. Returns False if the cache
+    couldn't be written, which isn't an error. The program must not have
+    been run yet, since running it fills in inline caches in the AST.
+    """
+    path = cache_path(filename, cache_dir)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(tmp_path, "wb") as fp:
+            fp.write(_header(digest))
+            pickle.dump(program, fp, protocol=pickle.HIGHEST_PROTOCOL)
+        # Readers never see a partly written cache
+        os.replace(tmp_path, path)
+    except (OSError, pickle.PicklingError, RecursionError):
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        return False
+
+    return True
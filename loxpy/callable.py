@@ -1,17 +1,25 @@
 from typing import Any, Dict, Optional, Sequence
 from abc import ABC, abstractmethod
 
-from loxpy.environment import Environment
+from loxpy.environment import Frame, Scope
 from loxpy.statement import FuncStmt
-from loxpy.token import Token, Str2Token
+from loxpy.token import Token
 from loxpy.error import LoxRuntimeError
 
 from loxpy.interface import Interprets
 
 
-class LoxReturnException(Exception):
+class LoxReturn:
+    """
+    Completion value of a Lox return statement. Statements that execute
+    other statements hand it straight back up (without running anything
+    after it) until it reaches the call that is returning, so a return
+    costs no more than an ordinary Python return.
+    """
+
+    __slots__ = ("value",)
+
     def __init__(self, value: Any) -> None:
-        super(LoxReturnException, self).__init__()
         self.value = value
 
 
@@ -59,10 +67,12 @@ class LoxInstance:
 
 
 class LoxFunction(LoxCallable):
-    def __init__(self, decl: FuncStmt, closure: Environment, is_init: bool):
+    def __init__(self, decl: FuncStmt, closure: Scope, is_init: bool, this: Optional[LoxInstance]=None):
         self.decl = decl
         self.closure = closure
         self.is_initializer = is_init
+        # For a bound method, the instance passed as 'this' when it is called
+        self.this = this
 
     def __str__(self) -> str:
         return f"<fn {self.decl.name.lexeme}>"
@@ -71,29 +81,38 @@ class LoxFunction(LoxCallable):
         return len(self.decl.params)
 
     def call(self, interp: Interprets, args: Sequence[Any]) -> Any:
-        env = Environment(self.closure)
+        if self.this is not None:
+            return self.invoke(interp, self.this, args)
 
-        for param, arg in zip(self.decl.params, args):
-            env.define(param.lexeme, arg)
+        # Parameters take the first slots of the frame, followed by
+        # the locals declared at the top level of the body.
+        env = Frame(list(args) + [None] * (self.decl.num_slots - len(args)), self.closure)
 
-        try:
-            interp.execute_block(self.decl.body, env)
-        except LoxReturnException as rt:
-            if self.is_initializer:
-                return self.closure.get_at(0, Str2Token("this"))
+        return self.execute(interp, env)
 
-            return rt.value
+    def invoke(self, interp: Interprets, this: LoxInstance, args: Sequence[Any]) -> Any:
+        """
+        Call a method on this directly, without binding it first. The 
+        instance takes the first slot of the frame, ahead of the parameters.
+        """
+        values = [this, *args]
+        env = Frame(values + [None] * (self.decl.num_slots - len(values)), self.closure)
+
+        return self.execute(interp, env)
+
+    def execute(self, interp: Interprets, env: Frame) -> Any:
+        result = interp.execute_block(self.decl.body, env)
 
         if self.is_initializer:
-            return self.closure.get_at(0, Str2Token("this"))
+            return env.values[0]           # this
+
+        if type(result) is LoxReturn:
+            return result.value
 
         return None
 
     def bind(self, instance: LoxInstance) -> "LoxFunction":
-        env = Environment(self.closure)
-        env.define("this", instance)
-
-        return LoxFunction(self.decl, env, self.is_initializer)
+        return LoxFunction(self.decl, self.closure, self.is_initializer, instance)
 
 
 class LoxClass(LoxCallable):
@@ -102,33 +121,33 @@ class LoxClass(LoxCallable):
         self.superclass: Optional["LoxClass"] = superclass
         self.methods: Dict[str, LoxFunction] = methods
 
+        # Classes can't change once they are created, so flatten the
+        # inherited methods into one table (our own methods overlaid on
+        # the superclass table) and look up the initializer up front.
+        if superclass is not None:
+            self.method_table: Dict[str, LoxFunction] = dict(superclass.method_table)
+            self.method_table.update(methods)
+        else:
+            self.method_table = dict(methods)
+
+        self.initializer: Optional[LoxFunction] = self.method_table.get("init")
+        self.num_params = self.initializer.arity() if self.initializer is not None else 0
+
     def __str__(self) -> str:
         return f"LoxClass({self.name})"
 
     def arity(self) -> int:
-        initializer = self.find_method("init")
-        if initializer is not None:
-            return initializer.arity()
-
-        return 0;
+        return self.num_params
 
     def call(self, interp: Interprets, args: Sequence[Any]) -> Any:
         instance = LoxInstance(self)
 
-        # When we call check for an init function. If we have one then 
-        # bind and call it, forwarding the argument list..
-        initializer = self.find_method("init")
-        if initializer is not None:
-            initializer.bind(instance).call(interp, args)
+        # If we have an init function then bind and call it, forwarding 
+        # the argument list.
+        if self.initializer is not None:
+            self.initializer.invoke(interp, instance, args)
 
         return instance
 
     def find_method(self, name: str) -> Optional[LoxFunction]:
-        if name in self.methods:
-            return self.methods[name]
-
-        if self.superclass is not None:
-            return self.superclass.find_method(name)
-
-        return None
-
+        return self.method_table.get(name)
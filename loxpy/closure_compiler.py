@@ -0,0 +1,643 @@
+"""
+CLOSURE COMPILER
+Turn each node of a resolved AST into a pre-bound Python closure.
+
+Rather than dispatching through Expr.accept() and the visit_* methods on
+every evaluation, each node is visited exactly once and turned into a
+function of the current environment. The closure for a node calls the
+(already compiled) closures for its children directly, and the resolver's
+depth and slot for each variable are baked in so that reads and writes go
+straight to the right frame.
+
+"""
+
+from typing import Any, Callable, List, Optional, Sequence, Union, TYPE_CHECKING
+
+from loxpy.visitor import Visitor
+from loxpy.token import Token, TokenType
+from loxpy.expr import (
+    Expr,
+    BinaryExpr,
+    CallExpr,
+    GetExpr,
+    SetExpr,
+    ThisExpr,
+    SuperExpr,
+    LiteralExpr,
+    LogicalExpr,
+    GroupingExpr,
+    UnaryExpr,
+    VarExpr,
+    AssignmentExpr
+)
+from loxpy.statement import (
+    Stmt,
+    ExprStmt,
+    FuncStmt,
+    IfStmt,
+    PrintStmt,
+    ReturnStmt,
+    VarStmt,
+    BlockStmt,
+    ClassStmt,
+    WhileStmt
+)
+from loxpy.environment import Frame, Scope
+from loxpy.callable import LoxCallable, LoxFunction, LoxClass, LoxInstance, LoxReturn
+from loxpy.error import LoxRuntimeError
+from loxpy.value import is_equal, stringify
+
+if TYPE_CHECKING:
+    from loxpy.interpreter import Interpreter
+
+
+# A compiled node is a function of the environment it executes in
+Compiled = Callable[[Scope], Any]
+
+
+class CompiledFunction(LoxFunction):
+    """
+    A LoxFunction whose body has already been compiled into closures.
+    """
+
+    def __init__(self, decl: FuncStmt, closure: Scope, is_init: bool, body: Sequence[Compiled], this: Optional[LoxInstance]=None):
+        super(CompiledFunction, self).__init__(decl, closure, is_init, this)
+        self.body = body
+        # Padding for the locals that follow the parameters when this is
+        # called as a plain function
+        self.padding = [None] * (decl.num_slots - len(decl.params))
+
+    def call(self, interp, args: Sequence[Any]) -> Any:
+        if self.this is not None:
+            return self.invoke(interp, self.this, args)
+
+        return self.execute(interp, Frame(args + self.padding, self.closure))     # type: ignore
+
+    def execute(self, interp, env: Frame) -> Any:
+        for stmt in self.body:
+            result = stmt(env)
+            if type(result) is LoxReturn:
+                break
+        else:
+            result = None
+
+        if self.is_initializer:
+            return env.values[0]
+
+        if result is not None:
+            return result.value     # type: ignore
+
+        return None
+
+    def bind(self, instance: LoxInstance) -> "CompiledFunction":
+        return CompiledFunction(self.decl, self.closure, self.is_initializer, self.body, instance)
+
+
+class ClosureCompiler(Visitor):
+    """
+    ClosureCompiler
+    Compiles statements into closures that execute against the globals
+    and helpers of an Interpreter. The statements must already have been
+    resolved into that interpreter.
+    """
+
+    def __init__(self, interp: "Interpreter") -> None:
+        self.interp = interp
+
+    # ======== Helpers ======== #
+    def _lookup(self, expr: Union[VarExpr, ThisExpr], name: Token) -> Compiled:
+        dist = expr.depth
+        slot = expr.slot
+
+        if dist is None:
+            globals_get = self.interp.globals.get
+
+            def get_global(env: Scope) -> Any:
+                return globals_get(name)
+
+            return get_global
+
+        if dist == 0:
+            def get_local(env: Scope) -> Any:
+                return env.values[slot]     # type: ignore
+
+            return get_local
+
+        if dist == 1:
+            def get_enclosing(env: Scope) -> Any:
+                return env.enclosing.values[slot]   # type: ignore
+
+            return get_enclosing
+
+        def get_ancestor(env: Scope) -> Any:
+            return env.get_at(dist, slot)   # type: ignore
+
+        return get_ancestor
+
+    @staticmethod
+    def _declared_key(name: Token, slot: Optional[int]) -> Union[int, str]:
+        # Locals are stored in their slot of a Frame, and globals by name
+        # in an Environment. Either way the value goes in env.values[key].
+        return slot if slot is not None else name.lexeme
+
+    def _method_finder(self, expr: GetExpr) -> Callable[[LoxInstance], LoxFunction]:
+        name = expr.name
+        key = name.lexeme
+        # Inline cache of the last class seen here and its method
+        cached_class: Optional[LoxClass] = None
+        cached_method: Optional[LoxFunction] = None
+
+        def find_method(obj: LoxInstance) -> LoxFunction:
+            nonlocal cached_class, cached_method
+            if obj.lox_class is not cached_class:
+                method = obj.lox_class.find_method(key)
+                if method is None:
+                    raise LoxRuntimeError(
+                        name,
+                        f"Undefined property '{key}' on class '{obj.lox_class.name}'"
+                    )
+                cached_class = obj.lox_class
+                cached_method = method
+
+            return cached_method     # type: ignore
+
+        return find_method
+
+    def _property_getter(self, expr: GetExpr, find_method: Callable[[LoxInstance], LoxFunction]) -> Callable[[Any], Any]:
+        name = expr.name
+        key = name.lexeme
+
+        def get_property(obj: Any) -> Any:
+            if not isinstance(obj, LoxInstance):
+                raise LoxRuntimeError(name, "Only instances have properties")
+
+            fields = obj.fields
+            if key in fields:
+                return fields[key]
+
+            return find_method(obj).bind(obj)
+
+        return get_property
+
+    def compile_expr(self, expr: Expr) -> Compiled:
+        return expr.accept(self)
+
+    def compile_stmt(self, stmt: Stmt) -> Compiled:
+        return stmt.accept(self)
+
+    def compile_block(self, stmts: Sequence[Stmt]) -> List[Compiled]:
+        return [self.compile_stmt(stmt) for stmt in stmts]
+
+    # ======== Expression visitors ======== #
+    def visit_assignment_expr(self, expr: AssignmentExpr) -> Compiled:
+        value_fn = self.compile_expr(expr.value)
+        dist = expr.depth
+        name = expr.name
+        slot = expr.slot
+
+        if dist is None:
+            globals_assign = self.interp.globals.assign
+
+            def assign_global(env: Scope) -> Any:
+                value = value_fn(env)
+                globals_assign(name, value)
+                return value
+
+            return assign_global
+
+        if dist == 0:
+            def assign_local(env: Scope) -> Any:
+                value = env.values[slot] = value_fn(env)     # type: ignore
+                return value
+
+            return assign_local
+
+        def assign_ancestor(env: Scope) -> Any:
+            value = env.ancestor(dist).values[slot] = value_fn(env)     # type: ignore
+            return value
+
+        return assign_ancestor
+
+    def visit_binary_expr(self, expr: BinaryExpr) -> Compiled:
+        left = self.compile_expr(expr.left)
+        right = self.compile_expr(expr.right)
+        op = expr.op
+        op_type = op.token_type
+        check = self.interp.check_number_operands
+
+        if op_type == TokenType.PLUS:
+            def add(env: Scope) -> Any:
+                lhs = left(env)
+                rhs = right(env)
+                if (type(lhs) is not float or type(rhs) is not float) and \
+                        (type(lhs) is not str or type(rhs) is not str):
+                    check(op, lhs, rhs)
+                return lhs + rhs
+
+            return add
+
+        if op_type == TokenType.MINUS:
+            def sub(env: Scope) -> Any:
+                lhs = left(env)
+                rhs = right(env)
+                if type(lhs) is not float or type(rhs) is not float:
+                    check(op, lhs, rhs)
+                return lhs - rhs
+
+            return sub
+
+        if op_type == TokenType.STAR:
+            def mul(env: Scope) -> Any:
+                lhs = left(env)
+                rhs = right(env)
+                if type(lhs) is not float or type(rhs) is not float:
+                    check(op, lhs, rhs)
+                return lhs * rhs
+
+            return mul
+
+        if op_type == TokenType.SLASH:
+            def div(env: Scope) -> Any:
+                lhs = left(env)
+                rhs = right(env)
+                if type(lhs) is not float or type(rhs) is not float:
+                    check(op, lhs, rhs)
+                if rhs == 0.0:
+                    raise LoxRuntimeError(op, "Division by zero")
+                return lhs / rhs
+
+            return div
+
+        if op_type == TokenType.GREATER:
+            def greater(env: Scope) -> Any:
+                lhs = left(env)
+                rhs = right(env)
+                if type(lhs) is not float or type(rhs) is not float:
+                    check(op, lhs, rhs)
+                return lhs > rhs
+
+            return greater
+
+        if op_type == TokenType.GREATER_EQUAL:
+            def greater_equal(env: Scope) -> Any:
+                lhs = left(env)
+                rhs = right(env)
+                if type(lhs) is not float or type(rhs) is not float:
+                    check(op, lhs, rhs)
+                return lhs >= rhs
+
+            return greater_equal
+
+        if op_type == TokenType.LESS:
+            def less(env: Scope) -> Any:
+                lhs = left(env)
+                rhs = right(env)
+                if type(lhs) is not float or type(rhs) is not float:
+                    check(op, lhs, rhs)
+                return lhs < rhs
+
+            return less
+
+        if op_type == TokenType.LESS_EQUAL:
+            def less_equal(env: Scope) -> Any:
+                lhs = left(env)
+                rhs = right(env)
+                if type(lhs) is not float or type(rhs) is not float:
+                    check(op, lhs, rhs)
+                return lhs <= rhs
+
+            return less_equal
+
+        if op_type == TokenType.BANG_EQUAL:
+            def not_equal(env: Scope) -> Any:
+                return not is_equal(left(env), right(env))
+
+            return not_equal
+
+        if op_type == TokenType.EQUAL_EQUAL:
+            def equal(env: Scope) -> Any:
+                return is_equal(left(env), right(env))
+
+            return equal
+
+        raise LoxRuntimeError(op, f"Unknown binary operator [{op.lexeme}]")
+
+    def visit_call_expr(self, expr: CallExpr) -> Compiled:
+        if type(expr.callee) is GetExpr:
+            return self._compile_invoke(expr, expr.callee)
+
+        callee_fn = self.compile_expr(expr.callee)
+        arg_fns = [self.compile_expr(arg) for arg in expr.arguments]
+        paren = expr.paren
+        interp = self.interp
+
+        def call(env: Scope) -> Any:
+            function = callee_fn(env)
+            if not isinstance(function, LoxCallable):
+                raise LoxRuntimeError(paren, "Can only call functions")
+
+            args = [arg(env) for arg in arg_fns]
+
+            if len(args) != function.arity():
+                raise LoxRuntimeError(paren, f"Expected {function.arity()} arguments, got {len(args)}")
+
+            try:
+                return function.call(interp, args)
+            except (NotImplementedError, TypeError, ValueError) as e:
+                raise LoxRuntimeError(paren, str(e))
+            except RecursionError:
+                raise LoxRuntimeError(paren, "Stack overflow")
+
+        return call
+
+    def _compile_invoke(self, expr: CallExpr, callee: GetExpr) -> Compiled:
+        """
+        Compile obj.method(...) so that the method is called with obj as 
+        'this' directly, rather than creating a bound method to call once.
+        """
+        obj_fn = self.compile_expr(callee.obj)
+        arg_fns = [self.compile_expr(arg) for arg in expr.arguments]
+        find_method = self._method_finder(callee)
+        get_property = self._property_getter(callee, find_method)
+        key = callee.name.lexeme
+        paren = expr.paren
+        interp = self.interp
+
+        def invoke(env: Scope) -> Any:
+            obj = obj_fn(env)
+            if isinstance(obj, LoxInstance) and key not in obj.fields:
+                function = find_method(obj)
+                this = obj
+            else:
+                function = get_property(obj)
+                this = None
+                if not isinstance(function, LoxCallable):
+                    raise LoxRuntimeError(paren, "Can only call functions")
+
+            args = [arg(env) for arg in arg_fns]
+
+            if len(args) != function.arity():
+                raise LoxRuntimeError(paren, f"Expected {function.arity()} arguments, got {len(args)}")
+
+            try:
+                if this is not None:
+                    return function.invoke(interp, this, args)
+                return function.call(interp, args)
+            except (NotImplementedError, TypeError, ValueError) as e:
+                raise LoxRuntimeError(paren, str(e))
+            except RecursionError:
+                raise LoxRuntimeError(paren, "Stack overflow")
+
+        return invoke
+
+    def visit_get_expr(self, expr: GetExpr) -> Compiled:
+        obj_fn = self.compile_expr(expr.obj)
+        get_property = self._property_getter(expr, self._method_finder(expr))
+
+        def get(env: Scope) -> Any:
+            return get_property(obj_fn(env))
+
+        return get
+
+    def visit_grouping_expr(self, expr: GroupingExpr) -> Compiled:
+        # Groupings only matter to the parser, there is nothing to execute
+        return self.compile_expr(expr.expression)
+
+    def visit_literal_expr(self, expr: LiteralExpr) -> Compiled:
+        value = expr.value.literal
+
+        def literal(env: Scope) -> Any:
+            return value
+
+        return literal
+
+    def visit_logical_expr(self, expr: LogicalExpr) -> Compiled:
+        left = self.compile_expr(expr.left)
+        right = self.compile_expr(expr.right)
+        is_true = self.interp.is_true
+
+        if expr.op.token_type == TokenType.OR:
+            def logical_or(env: Scope) -> Any:
+                lhs = left(env)
+                if is_true(lhs):
+                    return lhs
+                return right(env)
+
+            return logical_or
+
+        def logical_and(env: Scope) -> Any:
+            lhs = left(env)
+            if not is_true(lhs):
+                return lhs
+            return right(env)
+
+        return logical_and
+
+    def visit_set_expr(self, expr: SetExpr) -> Compiled:
+        obj_fn = self.compile_expr(expr.obj)
+        value_fn = self.compile_expr(expr.value)
+        name = expr.name
+
+        def set_property(env: Scope) -> Any:
+            obj = obj_fn(env)
+            if not isinstance(obj, LoxInstance):
+                raise LoxRuntimeError(name, "Only instances have fields")
+
+            value = value_fn(env)
+            obj.set(name, value)
+            return value
+
+        return set_property
+
+    def visit_super_expr(self, expr: SuperExpr) -> Compiled:
+        dist = expr.depth
+        method_name = expr.method
+
+        def super_method(env: Scope) -> Any:
+            superclass = env.get_at(dist, 0)        # type: ignore
+            obj = env.get_at(dist - 1, 0)           # type: ignore
+            method = superclass.find_method(method_name.lexeme)
+
+            if method is None:
+                raise LoxRuntimeError(
+                    method_name,
+                    f"Undefined property '{method_name.lexeme}'"
+                )
+
+            return method.bind(obj)
+
+        return super_method
+
+    def visit_this_expr(self, expr: ThisExpr) -> Compiled:
+        return self._lookup(expr, expr.keyword)
+
+    def visit_unary_expr(self, expr: UnaryExpr) -> Compiled:
+        right = self.compile_expr(expr.right)
+        op = expr.op
+        check = self.interp.check_number_operand
+        is_true = self.interp.is_true
+
+        if op.token_type == TokenType.MINUS:
+            def negate(env: Scope) -> Any:
+                value = right(env)
+                if type(value) is not float:
+                    check(op, value)
+                return -value
+
+            return negate
+
+        def bang(env: Scope) -> Any:
+            return not is_true(right(env))
+
+        return bang
+
+    def visit_var_expr(self, expr: VarExpr) -> Compiled:
+        return self._lookup(expr, expr.name)
+
+    # ======== Statement visitors ======== #
+    def visit_block_stmt(self, stmt: BlockStmt) -> Compiled:
+        body = self.compile_block(stmt.stmts)
+        num_slots = stmt.num_slots
+
+        if self.interp.collect_results:
+            def block_results(env: Scope) -> Any:
+                block_env = Frame([None] * num_slots, env)
+                ret = []
+                for s in body:
+                    result = s(block_env)
+                    if type(result) is LoxReturn:
+                        return result
+                    ret.append(result)
+                return ret
+
+            return block_results
+
+        def block(env: Scope) -> Any:
+            block_env = Frame([None] * num_slots, env)
+            for s in body:
+                result = s(block_env)
+                if type(result) is LoxReturn:
+                    return result
+            return None
+
+        return block
+
+    def visit_class_stmt(self, stmt: ClassStmt) -> Compiled:
+        superclass_fn = self.compile_expr(stmt.superclass) if stmt.superclass is not None else None
+        methods = [(method, self.compile_block(method.body)) for method in stmt.methods]
+        name = stmt.name
+        key = self._declared_key(name, stmt.slot)
+        superclass_expr = stmt.superclass
+
+        def class_decl(env: Scope) -> Any:
+            superclass: Optional[LoxClass] = None
+            if superclass_fn is not None:
+                superclass = superclass_fn(env)
+                if not isinstance(superclass, LoxClass):
+                    raise LoxRuntimeError(
+                        superclass_expr.name,       # type: ignore
+                        f"Superclass of '{name.lexeme}' must be a class"
+                    )
+
+            env.values[key] = None      # type: ignore
+
+            method_env = env
+            if superclass is not None:
+                method_env = Frame([superclass], env)
+
+            funcs = {}
+            for method, body in methods:
+                funcs[method.name.lexeme] = CompiledFunction(
+                    method, method_env, method.name.lexeme == "init", body
+                )
+
+            env.values[key] = LoxClass(name.lexeme, superclass, funcs)     # type: ignore
+
+        return class_decl
+
+    def visit_expr_stmt(self, stmt: ExprStmt) -> Compiled:
+        return self.compile_expr(stmt.expr)
+
+    def visit_func_stmt(self, stmt: FuncStmt) -> Compiled:
+        body = self.compile_block(stmt.body)
+        key = self._declared_key(stmt.name, stmt.slot)
+
+        def func_decl(env: Scope) -> Any:
+            env.values[key] = CompiledFunction(stmt, env, False, body)     # type: ignore
+
+        return func_decl
+
+    def visit_if_stmt(self, stmt: IfStmt) -> Compiled:
+        cond = self.compile_expr(stmt.condition)
+        then_branch = self.compile_stmt(stmt.then_branch)
+        else_branch = self.compile_stmt(stmt.else_branch) if stmt.else_branch else None
+        is_true = self.interp.is_true
+
+        def if_stmt(env: Scope) -> Any:
+            if is_true(cond(env)):
+                return then_branch(env)
+            elif else_branch is not None:
+                return else_branch(env)
+            return None
+
+        return if_stmt
+
+    def visit_print_stmt(self, stmt: PrintStmt) -> Compiled:
+        expr = self.compile_expr(stmt.expr)
+        output = self.interp.output
+
+        def print_stmt(env: Scope) -> Any:
+            value = expr(env)
+            print(stringify(value), file=output)
+            return value
+
+        return print_stmt
+
+    def visit_return_stmt(self, stmt: ReturnStmt) -> Compiled:
+        value_fn = self.compile_expr(stmt.value) if stmt.value is not None else None
+
+        def return_stmt(env: Scope) -> Any:
+            return LoxReturn(value_fn(env) if value_fn is not None else None)
+
+        return return_stmt
+
+    def visit_var_stmt(self, stmt: VarStmt) -> Compiled:
+        init = self.compile_expr(stmt.initializer) if stmt.initializer is not None else None
+        key = self._declared_key(stmt.name, stmt.slot)
+
+        def var_decl(env: Scope) -> Any:
+            env.values[key] = init(env) if init is not None else None     # type: ignore
+
+        return var_decl
+
+    def visit_while_stmt(self, stmt: WhileStmt) -> Compiled:
+        cond = self.compile_expr(stmt.condition)
+        body = self.compile_stmt(stmt.body)
+        is_true = self.interp.is_true
+
+        if self.interp.collect_results:
+            def while_results(env: Scope) -> Any:
+                ret = None
+                while is_true(cond(env)):
+                    ret = body(env)
+                    if type(ret) is LoxReturn:
+                        break
+                return ret
+
+            return while_results
+
+        def while_stmt(env: Scope) -> Any:
+            while is_true(cond(env)):
+                ret = body(env)
+                if type(ret) is LoxReturn:
+                    return ret
+            return None
+
+        return while_stmt
+
+    # Entry point method
+    def compile(self, stmts: Sequence[Stmt]) -> List[Compiled]:
+        """
+        Compile a resolved Sequence of Lox Statements into closures
+        """
+        return self.compile_block(stmts)
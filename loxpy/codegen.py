@@ -0,0 +1,943 @@
+"""
+CODEGEN
+Translate a Lox program into Python source and run it with CPython's own
+compiler.
+
+Lox functions become Python functions, Lox classes become Python classes
+derived from a small runtime shim, and loops become while loops. The
+generated code only calls back into the runtime helpers below when the
+fast path (e.g. two floats for arithmetic) doesn't apply. Runtime errors
+are mapped back to the Lox source line and re-raised as LoxRuntimeError.
+
+Names are mangled so that Lox identifiers can never clash with Python
+keywords, builtins or the runtime helpers:
+
+    g_<name>        global variable
+    l<n>_<name>     local variable, unique per declaration
+    b<n>_<name>     local variable held in a _LoxBox
+    p_<name>        field or method on an instance
+    _<anything>     runtime helpers and temporaries
+
+A local that is declared inside a loop and captured by a closure must be
+a fresh variable on every iteration, which Python closures don't give us.
+These are held in boxes, and any function or class declared in the loop
+is created by a factory function that binds the current boxes.
+
+"""
+
+from dataclasses import fields
+from itertools import count
+from types import FunctionType, MethodType
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+from loxpy.visitor import Visitor
+from loxpy.token import Token, TokenType
+from loxpy.expr import (
+    Expr,
+    BinaryExpr,
+    CallExpr,
+    GetExpr,
+    SetExpr,
+    ThisExpr,
+    SuperExpr,
+    LiteralExpr,
+    LogicalExpr,
+    GroupingExpr,
+    UnaryExpr,
+    VarExpr,
+    AssignmentExpr
+)
+from loxpy.statement import (
+    Stmt,
+    ExprStmt,
+    FuncStmt,
+    IfStmt,
+    PrintStmt,
+    ReturnStmt,
+    VarStmt,
+    BlockStmt,
+    ClassStmt,
+    WhileStmt
+)
+from loxpy.error import LoxRuntimeError
+from loxpy.builtins import BUILTIN_MAP
+from loxpy.value import is_equal, stringify
+
+
+# ======== Runtime support for generated code ======== #
+class _LoxBox:
+    __slots__ = ("v",)
+
+    def __init__(self, v: Any) -> None:
+        self.v = v
+
+
+class _LoxError(Exception):
+    """
+    Raised by the runtime helpers, the line is filled in from the traceback
+    """
+
+    def __init__(self, msg: str) -> None:
+        super(_LoxError, self).__init__(msg)
+        self.message = msg
+
+
+class _LoxArityError(_LoxError):
+    """
+    Raised by a function that was called with the wrong number of
+    arguments. The error is reported at the line of the call.
+    """
+
+
+# Default for every parameter of a generated function, so that a call
+# with too few arguments reaches the function's own check
+_lox_missing = object()
+
+
+def _lox_arity(arity: int, *args: Any) -> None:
+    got = sum(1 for arg in args if arg is not _lox_missing)
+    raise _LoxArityError(f"Expected {arity} arguments, got {got}")
+
+
+class _LoxInstance:
+    """
+    Base class of every generated Lox class
+    """
+
+    def __init__(this, *_args) -> None:
+        if _args:
+            _lox_arity(0, *_args)
+
+
+def _display_name(py_name: str) -> str:
+    return py_name.split("_", 1)[1]
+
+
+def _lox_str(value: Any) -> str:
+    if isinstance(value, FunctionType):
+        builtin = getattr(value, "lox_builtin", None)
+        if builtin is not None:
+            return f"{builtin}"
+        return f"<fn {_display_name(value.__name__)}>"
+    if isinstance(value, MethodType):
+        return f"<fn {_display_name(value.__func__.__name__)}>"
+    if isinstance(value, type) and issubclass(value, _LoxInstance):
+        return f"LoxClass({_display_name(value.__name__)})"
+    if isinstance(value, _LoxInstance):
+        fields = ",".join(_display_name(fname) for fname in vars(value))
+        return f"LoxInstance({_display_name(type(value).__name__)}) [{fields}]"
+
+    return stringify(value)
+
+
+def _lox_arith(op: str, left: Any, right: Any) -> Any:
+    if op == "+" and type(left) is str and type(right) is str:
+        return left + right
+    if type(left) is not float:
+        raise _LoxError(f"Left operand to [{op}] must be a number")
+    raise _LoxError(f"Right operand to [{op}] must be a number")
+
+
+def _lox_negate(value: Any) -> float:
+    raise _LoxError("Operand must be a number")
+
+
+def _lox_get(obj: Any) -> Any:
+    raise _LoxError("Only instances have properties")
+
+
+def _lox_set(obj: Any, name: str, value: Any) -> Any:
+    if not isinstance(obj, _LoxInstance):
+        raise _LoxError("Only instances have fields")
+    setattr(obj, name, value)
+    return value
+
+
+def _lox_box_set(box: _LoxBox, value: Any) -> Any:
+    box.v = value
+    return value
+
+
+def _lox_superclass(value: Any, name: str) -> type:
+    if isinstance(value, type) and issubclass(value, _LoxInstance):
+        return value
+    raise _LoxError(f"Superclass of '{name}' must be a class")
+
+
+def _lox_undefined(name: str, value: Any) -> Any:
+    raise _LoxError(f"Undefined variable {name}")
+
+
+def _lox_builtin(name: str, func: Any) -> FunctionType:
+    def builtin(*args):
+        if len(args) != func.arity():
+            raise _LoxError(f"Expected {func.arity()} arguments, got {len(args)}")
+        return func.call(None, args)
+
+    builtin.__name__ = f"g_{name}"
+    builtin.lox_builtin = func         # type: ignore
+    return builtin
+
+
+RUNTIME_NAMES = {
+    "_LoxBox": _LoxBox,
+    "_LoxInstance": _LoxInstance,
+    "_lox_missing": _lox_missing,
+    "_lox_arity": _lox_arity,
+    "_lox_str": _lox_str,
+    "_lox_equal": is_equal,
+    "_lox_arith": _lox_arith,
+    "_lox_negate": _lox_negate,
+    "_lox_get": _lox_get,
+    "_lox_set": _lox_set,
+    "_lox_box_set": _lox_box_set,
+    "_lox_superclass": _lox_superclass,
+    "_lox_undefined": _lox_undefined,
+}
+
+ARITH_OPS = {
+    TokenType.PLUS: "+",
+    TokenType.MINUS: "-",
+    TokenType.STAR: "*",
+    TokenType.SLASH: "/",
+    TokenType.GREATER: ">",
+    TokenType.GREATER_EQUAL: ">=",
+    TokenType.LESS: "<",
+    TokenType.LESS_EQUAL: "<=",
+}
+
+COMPARISON_OPS = (
+    TokenType.GREATER,
+    TokenType.GREATER_EQUAL,
+    TokenType.LESS,
+    TokenType.LESS_EQUAL,
+    TokenType.EQUAL_EQUAL,
+    TokenType.BANG_EQUAL,
+)
+
+
+def _first_line(node: Any) -> int:
+    """
+    Line of the first token found in node, searching fields in order
+    """
+    if isinstance(node, Token):
+        return node.line
+
+    if isinstance(node, (Expr, Stmt)):
+        for f in fields(node):
+            line = _first_line(getattr(node, f.name))
+            if line >= 0:
+                return line
+
+    if isinstance(node, (list, tuple)):
+        for item in node:
+            line = _first_line(item)
+            if line >= 0:
+                return line
+
+    return -1
+
+
+# ======== Scope analysis ======== #
+class _FunctionInfo:
+    def __init__(self) -> None:
+        self.loop_depth = 0
+        self.assigned_globals: Set[str] = set()
+        self.assigned_nonlocals: Set["_Binding"] = set()
+
+
+class _Binding:
+    """
+    A local variable declaration
+    """
+
+    def __init__(self, name: str, index: int, func: _FunctionInfo, ctx_depth: int) -> None:
+        self.name = name
+        self.index = index
+        self.func = func
+        self.in_loop = func.loop_depth > 0
+        self.ctx_depth = ctx_depth
+        self.captured = False
+
+    @property
+    def boxed(self) -> bool:
+        return self.in_loop and self.captured
+
+    @property
+    def py_name(self) -> str:
+        return f"{'b' if self.boxed else 'l'}{self.index}_{self.name}"
+
+    @property
+    def def_name(self) -> str:
+        return f"l{self.index}_{self.name}"
+
+
+class _ScopeAnalysis(Visitor):
+    """
+    Work out which Python name each Lox variable maps to, which locals need
+    to be boxed and what each function or class declaration captures.
+    """
+
+    def __init__(self) -> None:
+        self.scopes: List[Dict[str, _Binding]] = []
+        self.main = _FunctionInfo()
+        self.funcs: List[_FunctionInfo] = [self.main]
+        self.contexts: List[Set[_Binding]] = []
+        self.classes: List[str] = []
+        self.counter = count(1)
+
+        # All keyed by node identity
+        self.refs: Dict[int, Optional[_Binding]] = {}
+        self.decls: Dict[int, Optional[_Binding]] = {}
+        self.params: Dict[int, List[_Binding]] = {}
+        self.func_info: Dict[int, _FunctionInfo] = {}
+        self.captures: Dict[int, Set[_Binding]] = {}
+        self.in_loop: Dict[int, bool] = {}
+        self.super_names: Dict[int, str] = {}
+        self.global_decls: Set[str] = set()
+
+    def _declare(self, node: Any, name: str) -> Optional[_Binding]:
+        if not self.scopes:
+            self.global_decls.add(name)
+            self.funcs[-1].assigned_globals.add(name)
+            self.decls[id(node)] = None
+            return None
+
+        binding = _Binding(name, next(self.counter), self.funcs[-1], len(self.contexts))
+        self.scopes[-1][name] = binding
+        self.decls[id(node)] = binding
+        return binding
+
+    def _reference(self, expr: Expr, name: str, assign: bool=False) -> None:
+        binding = None
+        for scope in reversed(self.scopes):
+            if name in scope:
+                binding = scope[name]
+                break
+
+        self.refs[id(expr)] = binding
+        func = self.funcs[-1]
+        if binding is None:
+            if assign:
+                func.assigned_globals.add(name)
+            return
+
+        if binding.func is not func:
+            binding.captured = True
+            if assign:
+                func.assigned_nonlocals.add(binding)
+
+        for free in self.contexts[binding.ctx_depth:]:
+            free.add(binding)
+
+    def _function(self, stmt: FuncStmt) -> None:
+        info = _FunctionInfo()
+        self.func_info[id(stmt)] = info
+        self.funcs.append(info)
+        self.scopes.append({})
+        self.params[id(stmt)] = [
+            _Binding(param.lexeme, next(self.counter), info, len(self.contexts))
+            for param in stmt.params
+        ]
+        for binding in self.params[id(stmt)]:
+            self.scopes[-1][binding.name] = binding
+
+        self.analyze(stmt.body)
+
+        self.scopes.pop()
+        self.funcs.pop()
+
+    def analyze(self, stmts: Sequence[Stmt]) -> None:
+        for stmt in stmts:
+            stmt.accept(self)
+
+    # ======== Expressions ======== #
+    def visit_assignment_expr(self, expr: AssignmentExpr) -> None:
+        expr.value.accept(self)
+        self._reference(expr, expr.name.lexeme, assign=True)
+
+    def visit_binary_expr(self, expr: BinaryExpr) -> None:
+        expr.left.accept(self)
+        expr.right.accept(self)
+
+    def visit_call_expr(self, expr: CallExpr) -> None:
+        expr.callee.accept(self)
+        for arg in expr.arguments:
+            arg.accept(self)
+
+    def visit_get_expr(self, expr: GetExpr) -> None:
+        expr.obj.accept(self)
+
+    def visit_grouping_expr(self, expr: GroupingExpr) -> None:
+        expr.expression.accept(self)
+
+    def visit_literal_expr(self, expr: LiteralExpr) -> None:
+        pass
+
+    def visit_logical_expr(self, expr: LogicalExpr) -> None:
+        expr.left.accept(self)
+        expr.right.accept(self)
+
+    def visit_set_expr(self, expr: SetExpr) -> None:
+        expr.obj.accept(self)
+        expr.value.accept(self)
+
+    def visit_super_expr(self, expr: SuperExpr) -> None:
+        self.super_names[id(expr)] = self.classes[-1] if self.classes else ""
+
+    def visit_this_expr(self, expr: ThisExpr) -> None:
+        pass
+
+    def visit_unary_expr(self, expr: UnaryExpr) -> None:
+        expr.right.accept(self)
+
+    def visit_var_expr(self, expr: VarExpr) -> None:
+        self._reference(expr, expr.name.lexeme)
+
+    # ======== Statements ======== #
+    def visit_block_stmt(self, stmt: BlockStmt) -> None:
+        self.scopes.append({})
+        self.analyze(stmt.stmts)
+        self.scopes.pop()
+
+    def visit_class_stmt(self, stmt: ClassStmt) -> None:
+        self.in_loop[id(stmt)] = self.funcs[-1].loop_depth > 0
+        self._declare(stmt, stmt.name.lexeme)
+        if stmt.superclass is not None:
+            stmt.superclass.accept(self)
+
+        self.super_names[id(stmt)] = f"_super{next(self.counter)}" if stmt.superclass is not None else ""
+        self.classes.append(self.super_names[id(stmt)])
+        self.captures[id(stmt)] = set()
+        self.contexts.append(self.captures[id(stmt)])
+        for method in stmt.methods:
+            self._function(method)
+        self.contexts.pop()
+        self.classes.pop()
+
+    def visit_expr_stmt(self, stmt: ExprStmt) -> None:
+        stmt.expr.accept(self)
+
+    def visit_func_stmt(self, stmt: FuncStmt) -> None:
+        self.in_loop[id(stmt)] = self.funcs[-1].loop_depth > 0
+        self._declare(stmt, stmt.name.lexeme)
+        self.captures[id(stmt)] = set()
+        self.contexts.append(self.captures[id(stmt)])
+        self._function(stmt)
+        self.contexts.pop()
+
+    def visit_if_stmt(self, stmt: IfStmt) -> None:
+        stmt.condition.accept(self)
+        stmt.then_branch.accept(self)
+        if stmt.else_branch is not None:
+            stmt.else_branch.accept(self)
+
+    def visit_print_stmt(self, stmt: PrintStmt) -> None:
+        stmt.expr.accept(self)
+
+    def visit_return_stmt(self, stmt: ReturnStmt) -> None:
+        if stmt.value is not None:
+            stmt.value.accept(self)
+
+    def visit_var_stmt(self, stmt: VarStmt) -> None:
+        # The initializer can't see the variable being declared
+        if stmt.initializer is not None:
+            stmt.initializer.accept(self)
+        self._declare(stmt, stmt.name.lexeme)
+
+    def visit_while_stmt(self, stmt: WhileStmt) -> None:
+        self.funcs[-1].loop_depth += 1
+        stmt.condition.accept(self)
+        stmt.body.accept(self)
+        self.funcs[-1].loop_depth -= 1
+
+
+# ======== Code generation ======== #
+class PythonProgram:
+    """
+    Python source generated from a Lox program along with the information
+    needed to map errors back to the Lox source.
+    """
+
+    _ids = count()
+
+    def __init__(self, source: str, line_map: Sequence[int]) -> None:
+        self.source = source
+        self.line_map = line_map
+        self.filename = f"<lox-{next(self._ids)}>"
+        self.code = compile(source, self.filename, "exec")
+
+    def lox_line(self, py_line: int) -> int:
+        if 0 < py_line <= len(self.line_map):
+            return self.line_map[py_line - 1]
+        return 0
+
+
+class PythonCodegen(Visitor):
+    """
+    PythonCodegen
+    Emit Python source for a sequence of Lox statements. Expressions are
+    returned as strings, statements append lines to the output.
+    """
+
+    def __init__(self, known_globals: Iterable[str]=()) -> None:
+        self.known_globals: Set[str] = set(known_globals)
+        self.scope = _ScopeAnalysis()
+        self.lines: List[str] = []
+        self.line_map: List[int] = []
+        self.indent = 0
+        self.cur_line = 0
+        self.temps = count(1)
+        self.in_init = False
+
+    # ======== Helpers ======== #
+    def _emit(self, line: str) -> None:
+        self.lines.append("    " * self.indent + line)
+        self.line_map.append(self.cur_line)
+
+    def _temp(self) -> str:
+        return f"_t{next(self.temps)}"
+
+    def _suite(self, stmts: Sequence[Stmt]) -> None:
+        self.indent += 1
+        start = len(self.lines)
+        for stmt in stmts:
+            self._stmt(stmt)
+        if len(self.lines) == start:
+            self._emit("pass")
+        self.indent -= 1
+
+    def _stmt(self, stmt: Stmt) -> None:
+        line = _first_line(stmt)
+        if line >= 0:
+            self.cur_line = line
+        stmt.accept(self)
+
+    def _expr(self, expr: Expr) -> str:
+        return expr.accept(self)
+
+    def _is_bool(self, expr: Expr) -> bool:
+        """
+        True if expr always evaluates to a Python bool
+        """
+        if isinstance(expr, GroupingExpr):
+            return self._is_bool(expr.expression)
+        if isinstance(expr, BinaryExpr):
+            return expr.op.token_type in COMPARISON_OPS
+        if isinstance(expr, UnaryExpr):
+            return expr.op.token_type == TokenType.BANG
+        if isinstance(expr, LiteralExpr):
+            return expr.value.token_type in (TokenType.TRUE, TokenType.FALSE)
+        if isinstance(expr, LogicalExpr):
+            return self._is_bool(expr.left) and self._is_bool(expr.right)
+        return False
+
+    def _truthy(self, expr: Expr) -> str:
+        if self._is_bool(expr):
+            return self._expr(expr)
+        t = self._temp()
+        return f"(({t} := {self._expr(expr)}) is not None and {t} is not False)"
+
+    def _is_simple(self, expr: Expr) -> bool:
+        """
+        True if expr is a number literal or an unboxed variable
+        """
+        if isinstance(expr, LiteralExpr):
+            return expr.value.token_type == TokenType.NUMBER
+        if isinstance(expr, VarExpr):
+            binding = self.scope.refs.get(id(expr))
+            return binding is None or not binding.boxed
+        return False
+
+    def _operand(self, expr: Expr, code: str, direct: bool) -> Tuple[str, Optional[str]]:
+        """
+        Code to use a numeric operand and the check that it is a float
+        """
+        if isinstance(expr, LiteralExpr) and expr.value.token_type == TokenType.NUMBER:
+            return code, None
+        if direct and self._is_simple(expr):
+            return code, f"(type({code}) is float)"
+        t = self._temp()
+        return t, f"(type({t} := {code}) is float)"
+
+    def _var_name(self, expr: Expr, name: str) -> str:
+        binding = self.scope.refs.get(id(expr))
+        if binding is None:
+            return f"g_{name}"
+        if binding.boxed:
+            return f"{binding.py_name}.v"
+        return binding.py_name
+
+    def _declarations(self, info: _FunctionInfo) -> List[str]:
+        decls = []
+        if info.assigned_globals:
+            decls.append("global " + ", ".join(f"g_{name}" for name in sorted(info.assigned_globals)))
+        nonlocals = sorted(b.py_name for b in info.assigned_nonlocals if not b.boxed)
+        if nonlocals:
+            decls.append("nonlocal " + ", ".join(nonlocals))
+        return decls
+
+    def _signature(self, def_name: str, params: Sequence[str], is_method: bool) -> None:
+        """
+        Emit the def line for a function taking params, followed by the
+        check that it was called with exactly that many arguments. Every
+        parameter has a default and any extra arguments are collected, so
+        that a wrong count gets to the check rather than raising Python's
+        own TypeError.
+        """
+        args = [f"{param}=_lox_missing" for param in params] + ["*_args"]
+        if is_method:
+            args.insert(0, "this")
+        self._emit(f"def {def_name}({', '.join(args)}):")
+
+        cond = "_args" if not params else f"_args or {params[-1]} is _lox_missing"
+        self._emit(f"    if {cond}:")
+        self._emit(f"        _lox_arity({', '.join([str(len(params))] + list(params) + ['*_args'])})")
+
+    def _function(self, stmt: FuncStmt, def_name: str, is_method: bool=False) -> None:
+        self._signature(def_name, [b.py_name for b in self.scope.params[id(stmt)]], is_method)
+
+        prev_init = self.in_init
+        prev_line = self.cur_line
+        self.in_init = is_method and stmt.name.lexeme == "init"
+
+        self.indent += 1
+        for decl in self._declarations(self.scope.func_info[id(stmt)]):
+            self._emit(decl)
+        self._suite_body(stmt.body)
+        if self.in_init:
+            self._emit("return this")
+        self.indent -= 1
+
+        self.in_init = prev_init
+        self.cur_line = prev_line
+
+    def _suite_body(self, stmts: Sequence[Stmt]) -> None:
+        for stmt in stmts:
+            self._stmt(stmt)
+
+    def _declare(self, stmt: Stmt, name: str, emit_decl) -> None:
+        """
+        Emit a function or class declaration, wrapping it in a factory
+        when it has to capture the current iteration's boxes.
+        """
+        binding = self.scope.decls.get(id(stmt))
+        def_name = f"g_{name}" if binding is None else binding.def_name
+
+        factory_args = sorted(b.py_name for b in self.scope.captures[id(stmt)] if b.boxed)
+        super_name = self.scope.super_names.get(id(stmt), "")
+        if super_name:
+            factory_args.insert(0, super_name)
+
+        if binding is not None and binding.boxed:
+            self._emit(f"{binding.py_name} = _LoxBox(None)")
+
+        if not self.scope.in_loop[id(stmt)] or not factory_args:
+            emit_decl(def_name)
+            if binding is not None and binding.boxed:
+                self._emit(f"{binding.py_name}.v = {def_name}")
+            return
+
+        factory = f"_make{next(self.temps)}"
+        args = ", ".join(factory_args)
+        self._emit(f"def {factory}({args}):")
+        self.indent += 1
+        emit_decl(def_name)
+        self._emit(f"return {def_name}")
+        self.indent -= 1
+
+        target = def_name
+        if binding is not None and binding.boxed:
+            target = f"{binding.py_name}.v"
+        self._emit(f"{target} = {factory}({args})")
+
+    # ======== Expression visitors ======== #
+    def visit_assignment_expr(self, expr: AssignmentExpr) -> str:
+        value = self._expr(expr.value)
+        binding = self.scope.refs.get(id(expr))
+        name = expr.name.lexeme
+
+        if binding is None:
+            if name not in self.known_globals and name not in self.scope.global_decls:
+                return f"_lox_undefined({name!r}, {value})"
+            return f"(g_{name} := {value})"
+        if binding.boxed:
+            return f"_lox_box_set({binding.py_name}, {value})"
+        return f"({binding.py_name} := {value})"
+
+    def visit_binary_expr(self, expr: BinaryExpr) -> str:
+        left = self._expr(expr.left)
+        right = self._expr(expr.right)
+        op_type = expr.op.token_type
+
+        if op_type == TokenType.EQUAL_EQUAL:
+            return f"_lox_equal({left}, {right})"
+        if op_type == TokenType.BANG_EQUAL:
+            return f"(not _lox_equal({left}, {right}))"
+
+        # Names and number literals can be used directly, anything else is
+        # evaluated once into a temporary. The left operand must be read
+        # before the right is evaluated, so it can only be used directly if
+        # the right operand can't change it.
+        op = ARITH_OPS[op_type]
+        a, a_check = self._operand(expr.left, left, self._is_simple(expr.right))
+        b, b_check = self._operand(expr.right, right, True)
+        checks = [c for c in (a_check, b_check) if c is not None]
+
+        if not checks:
+            return f"({a} {op} {b})"
+        return f"({a} {op} {b} if {' & '.join(checks)} else _lox_arith({op!r}, {a}, {b}))"
+
+    def visit_call_expr(self, expr: CallExpr) -> str:
+        args = [self._expr(arg) for arg in expr.arguments]
+
+        # Call superclass methods without creating a bound method
+        if isinstance(expr.callee, SuperExpr):
+            super_name = self.scope.super_names[id(expr.callee)]
+            return f"{super_name}.p_{expr.callee.method.lexeme}({', '.join(['this'] + args)})"
+
+        return f"{self._expr(expr.callee)}({', '.join(args)})"
+
+    def visit_get_expr(self, expr: GetExpr) -> str:
+        obj = self._expr(expr.obj)
+        attr = f"p_{expr.name.lexeme}"
+        if isinstance(expr.obj, ThisExpr):
+            return f"{obj}.{attr}"
+
+        # Only instances have properties, classes and functions have
+        # Python attributes that Lox mustn't see
+        if not self._is_simple(expr.obj):
+            t = self._temp()
+            return f"({t}.{attr} if isinstance({t} := {obj}, _LoxInstance) else _lox_get({t}))"
+        return f"({obj}.{attr} if isinstance({obj}, _LoxInstance) else _lox_get({obj}))"
+
+    def visit_grouping_expr(self, expr: GroupingExpr) -> str:
+        return f"({self._expr(expr.expression)})"
+
+    def visit_literal_expr(self, expr: LiteralExpr) -> str:
+        return repr(expr.value.literal)
+
+    def visit_logical_expr(self, expr: LogicalExpr) -> str:
+        right = self._expr(expr.right)
+        op = "or" if expr.op.token_type == TokenType.OR else "and"
+
+        if self._is_bool(expr.left):
+            return f"({self._expr(expr.left)} {op} {right})"
+
+        t = self._temp()
+        test = f"(({t} := {self._expr(expr.left)}) is not None and {t} is not False)"
+        if op == "or":
+            return f"({t} if {test} else {right})"
+        return f"({right} if {test} else {t})"
+
+    def visit_set_expr(self, expr: SetExpr) -> str:
+        return f"_lox_set({self._expr(expr.obj)}, 'p_{expr.name.lexeme}', {self._expr(expr.value)})"
+
+    def visit_super_expr(self, expr: SuperExpr) -> str:
+        super_name = self.scope.super_names[id(expr)]
+        return f"{super_name}.p_{expr.method.lexeme}.__get__(this)"
+
+    def visit_this_expr(self, expr: ThisExpr) -> str:
+        return "this"
+
+    def visit_unary_expr(self, expr: UnaryExpr) -> str:
+        if expr.op.token_type == TokenType.BANG:
+            if self._is_bool(expr.right):
+                return f"(not {self._expr(expr.right)})"
+            t = self._temp()
+            return f"(({t} := {self._expr(expr.right)}) is None or {t} is False)"
+
+        t = self._temp()
+        return f"(-{t} if type({t} := {self._expr(expr.right)}) is float else _lox_negate({t}))"
+
+    def visit_var_expr(self, expr: VarExpr) -> str:
+        return self._var_name(expr, expr.name.lexeme)
+
+    # ======== Statement visitors ======== #
+    def visit_block_stmt(self, stmt: BlockStmt) -> None:
+        self._suite_body(stmt.stmts)
+
+    def visit_class_stmt(self, stmt: ClassStmt) -> None:
+        name = stmt.name.lexeme
+        super_name = self.scope.super_names[id(stmt)]
+        if stmt.superclass is not None:
+            self._emit(f"{super_name} = _lox_superclass({self._expr(stmt.superclass)}, {name!r})")
+
+        def emit_class(def_name: str) -> None:
+            self._emit(f"class {def_name}({super_name or '_LoxInstance'}):")
+            self.indent += 1
+            for method in stmt.methods:
+                params = [b.py_name for b in self.scope.params[id(method)]]
+                if method.name.lexeme == "init":
+                    self._signature("__init__", params, is_method=True)
+                    self._emit(f"    this.p_init({', '.join(params)})")
+                self._function(method, f"p_{method.name.lexeme}", is_method=True)
+            if not stmt.methods:
+                self._emit("pass")
+            self.indent -= 1
+
+        self._declare(stmt, name, emit_class)
+
+    def visit_expr_stmt(self, stmt: ExprStmt) -> None:
+        expr = stmt.expr
+
+        # Plain assignments don't need to produce a value
+        if isinstance(expr, AssignmentExpr):
+            binding = self.scope.refs.get(id(expr))
+            name = expr.name.lexeme
+            if binding is not None or name in self.known_globals or name in self.scope.global_decls:
+                self._emit(f"{self._var_name(expr, name)} = {self._expr(expr.value)}")
+                return
+
+        # 'this' is always an instance, anything else goes through _lox_set
+        # to check that it is one
+        if isinstance(expr, SetExpr) and isinstance(expr.obj, ThisExpr):
+            self._emit(f"this.p_{expr.name.lexeme} = {self._expr(expr.value)}")
+            return
+
+        self._emit(self._expr(expr))
+
+    def visit_func_stmt(self, stmt: FuncStmt) -> None:
+        def emit_func(def_name: str) -> None:
+            self._function(stmt, def_name)
+
+        self._declare(stmt, stmt.name.lexeme, emit_func)
+
+    def visit_if_stmt(self, stmt: IfStmt) -> None:
+        self._emit(f"if {self._truthy(stmt.condition)}:")
+        self._suite([stmt.then_branch])
+        if stmt.else_branch is not None:
+            self._emit("else:")
+            self._suite([stmt.else_branch])
+
+    def visit_print_stmt(self, stmt: PrintStmt) -> None:
+        self._emit(f"print(_lox_str({self._expr(stmt.expr)}))")
+
+    def visit_return_stmt(self, stmt: ReturnStmt) -> None:
+        if self.in_init:
+            self._emit("return this")
+        elif stmt.value is not None:
+            self._emit(f"return {self._expr(stmt.value)}")
+        else:
+            self._emit("return None")
+
+    def visit_var_stmt(self, stmt: VarStmt) -> None:
+        value = self._expr(stmt.initializer) if stmt.initializer is not None else "None"
+        binding = self.scope.decls[id(stmt)]
+
+        if binding is None:
+            self._emit(f"g_{stmt.name.lexeme} = {value}")
+        elif binding.boxed:
+            self._emit(f"{binding.py_name} = _LoxBox({value})")
+        else:
+            self._emit(f"{binding.py_name} = {value}")
+
+    def visit_while_stmt(self, stmt: WhileStmt) -> None:
+        self._emit(f"while {self._truthy(stmt.condition)}:")
+        self._suite([stmt.body])
+
+    # Entry point method
+    def generate(self, stmts: Sequence[Stmt]) -> PythonProgram:
+        """
+        Generate a PythonProgram from a Sequence of Lox Statements
+        """
+        self.scope.analyze(stmts)
+
+        self._emit("def __lox_main__():")
+        self.indent += 1
+        for decl in self._declarations(self.scope.main):
+            self._emit(decl)
+        self._suite_body(stmts)
+        self._emit("return None")
+        self.indent -= 1
+
+        return PythonProgram("\n".join(self.lines) + "\n", self.line_map)
+
+
+def transpile(stmts: Sequence[Stmt], known_globals: Iterable[str]=()) -> PythonProgram:
+    """
+    Translate stmts into Python. Names in known_globals are globals that
+    already exist at runtime, e.g. from a previous line in the REPL.
+    """
+    return PythonCodegen(known_globals).generate(stmts)
+
+
+# ======== Running generated code ======== #
+class PythonRuntime:
+    """
+    PythonRuntime
+    Holds the globals shared by every program it runs.
+    """
+
+    def __init__(self) -> None:
+        self.namespace: Dict[str, Any] = dict(RUNTIME_NAMES)
+        for name, func in BUILTIN_MAP.items():
+            self.namespace[f"g_{name}"] = _lox_builtin(name, func)
+        self.programs: Dict[str, PythonProgram] = {}
+
+    @property
+    def globals(self) -> Dict[str, Any]:
+        """
+        The Lox globals, keyed by their Lox name
+        """
+        return {
+            name[2:]: value for name, value in self.namespace.items()
+            if name.startswith("g_")
+        }
+
+    def _error_message(self, exc: BaseException) -> str:
+        if isinstance(exc, _LoxError):
+            return exc.message
+        if isinstance(exc, NameError):
+            return f"Undefined variable {_display_name(exc.name or '_')}"
+        if isinstance(exc, ZeroDivisionError):
+            return "Division by zero"
+        if isinstance(exc, RecursionError):
+            return "Stack overflow"
+        if isinstance(exc, AttributeError):
+            obj = getattr(exc, "obj", None)
+            name = _display_name(exc.name or "_")
+            if isinstance(obj, _LoxInstance):
+                return f"Undefined property '{name}' on class '{_display_name(type(obj).__name__)}'"
+            if isinstance(obj, type) and issubclass(obj, _LoxInstance):
+                return f"Undefined property '{name}'"
+            return "Only instances have properties"
+        if isinstance(exc, TypeError):
+            msg = str(exc)
+            if "not callable" in msg:
+                return "Can only call functions"
+            return msg
+
+        return str(exc)
+
+    def _lox_error(self, exc: BaseException) -> LoxRuntimeError:
+        # Find the innermost frame that belongs to generated code, or for
+        # a wrong number of arguments the one that made the call
+        lines = [0]
+        tb = exc.__traceback__
+        while tb is not None:
+            program = self.programs.get(tb.tb_frame.f_code.co_filename)
+            if program is not None:
+                lines.append(program.lox_line(tb.tb_lineno))
+            tb = tb.tb_next
+        line = lines[-2] if isinstance(exc, _LoxArityError) and len(lines) > 2 else lines[-1]
+
+        msg = self._error_message(exc)
+        token = Token(TokenType.IDENTIFIER, msg, None, line)
+        return LoxRuntimeError(token, msg)
+
+    def run(self, program: PythonProgram) -> None:
+        self.programs[program.filename] = program
+        exec(program.code, self.namespace)
+        main = self.namespace.pop("__lox_main__")
+
+        try:
+            main()
+        except (_LoxError, NameError, ZeroDivisionError, RecursionError, AttributeError, TypeError) as e:
+            raise self._lox_error(e) from None
+
+    def execute(self, stmts: Sequence[Stmt]) -> None:
+        """
+        Translate stmts and run them against the globals of this runtime
+        """
+        self.run(transpile(stmts, self.globals.keys()))
@@ -0,0 +1,655 @@
+"""
+COMPILER
+Lower a resolved Lox AST into bytecode for the stack VM in loxpy.vm
+
+Each function (and the top level script) is compiled into a FunctionProto
+holding a Chunk of code, the constant pool for that code and the metadata
+the VM needs to build a call frame. Locals live in numbered frame slots
+rather than in a dict, and variables captured by closures are accessed
+through upvalues, in the style of clox.
+
+"""
+
+from enum import IntEnum, auto
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from loxpy.visitor import Visitor
+from loxpy.token import Token, TokenType
+from loxpy.error import LoxInterpreterError
+from loxpy.expr import (
+    Expr,
+    BinaryExpr,
+    CallExpr,
+    GetExpr,
+    SetExpr,
+    ThisExpr,
+    SuperExpr,
+    LiteralExpr,
+    LogicalExpr,
+    GroupingExpr,
+    UnaryExpr,
+    VarExpr,
+    AssignmentExpr
+)
+from loxpy.statement import (
+    Stmt,
+    ExprStmt,
+    FuncStmt,
+    IfStmt,
+    PrintStmt,
+    ReturnStmt,
+    VarStmt,
+    BlockStmt,
+    ClassStmt,
+    WhileStmt
+)
+
+
+class OpCode(IntEnum):
+    # Roughly ordered by how often they are executed, since the VM
+    # dispatch loop tests them in this order.
+    GET_LOCAL = 0
+    CONSTANT = auto()
+    STORE_LOCAL = auto()
+    ADD = auto()
+    SUBTRACT = auto()
+    LESS = auto()
+    LESS_EQUAL = auto()
+    JUMP_IF_FALSE = auto()
+    JUMP = auto()
+    GET_GLOBAL = auto()
+    CALL = auto()
+    RETURN = auto()
+    POP = auto()
+    GET_UPVALUE = auto()
+    SET_UPVALUE = auto()
+    SET_LOCAL = auto()
+    INVOKE = auto()
+    GET_PROPERTY = auto()
+    SET_PROPERTY = auto()
+    MULTIPLY = auto()
+    DIVIDE = auto()
+    GREATER = auto()
+    GREATER_EQUAL = auto()
+    EQUAL = auto()
+    NOT_EQUAL = auto()
+    NOT = auto()
+    NEGATE = auto()
+    JUMP_IF_FALSE_OR_POP = auto()
+    JUMP_IF_TRUE_OR_POP = auto()
+    NIL = auto()
+    TRUE = auto()
+    FALSE = auto()
+    PRINT = auto()
+    SET_GLOBAL = auto()
+    DEFINE_GLOBAL = auto()
+    CLOSURE = auto()
+    CLOSE_UPVALUE = auto()
+    GET_SUPER = auto()
+    SUPER_INVOKE = auto()
+    CLASS = auto()
+    INHERIT = auto()
+    METHOD = auto()
+
+
+# Number of operands that follow each opcode in the code stream
+OPERAND_COUNT = {op: 0 for op in OpCode}
+OPERAND_COUNT.update({
+    OpCode.GET_LOCAL     : 1,
+    OpCode.CONSTANT      : 1,
+    OpCode.STORE_LOCAL   : 1,
+    OpCode.JUMP_IF_FALSE : 1,
+    OpCode.JUMP          : 1,
+    OpCode.GET_GLOBAL    : 1,
+    OpCode.CALL          : 1,
+    OpCode.GET_UPVALUE   : 1,
+    OpCode.SET_UPVALUE   : 1,
+    OpCode.SET_LOCAL     : 1,
+    OpCode.INVOKE        : 2,
+    OpCode.GET_PROPERTY  : 1,
+    OpCode.SET_PROPERTY  : 1,
+    OpCode.JUMP_IF_FALSE_OR_POP : 1,
+    OpCode.JUMP_IF_TRUE_OR_POP  : 1,
+    OpCode.SET_GLOBAL    : 1,
+    OpCode.DEFINE_GLOBAL : 1,
+    OpCode.CLOSURE       : 1,
+    OpCode.CLOSE_UPVALUE : 1,
+    OpCode.GET_SUPER     : 1,
+    OpCode.SUPER_INVOKE  : 2,
+    OpCode.CLASS         : 1,
+    OpCode.INHERIT       : 0,
+    OpCode.METHOD        : 1,
+})
+
+# Opcodes whose first operand is an index into the constant pool
+CONSTANT_OPERAND_OPS = frozenset((
+    OpCode.CONSTANT,
+    OpCode.GET_GLOBAL,
+    OpCode.SET_GLOBAL,
+    OpCode.DEFINE_GLOBAL,
+    OpCode.GET_PROPERTY,
+    OpCode.SET_PROPERTY,
+    OpCode.GET_SUPER,
+    OpCode.INVOKE,
+    OpCode.SUPER_INVOKE,
+    OpCode.CLASS,
+    OpCode.METHOD,
+    OpCode.CLOSURE,
+))
+
+# Binary operators that map directly onto a single opcode
+BINARY_OPS = {
+    TokenType.PLUS          : OpCode.ADD,
+    TokenType.MINUS         : OpCode.SUBTRACT,
+    TokenType.STAR          : OpCode.MULTIPLY,
+    TokenType.SLASH         : OpCode.DIVIDE,
+    TokenType.GREATER       : OpCode.GREATER,
+    TokenType.GREATER_EQUAL : OpCode.GREATER_EQUAL,
+    TokenType.LESS          : OpCode.LESS,
+    TokenType.LESS_EQUAL    : OpCode.LESS_EQUAL,
+    TokenType.EQUAL_EQUAL   : OpCode.EQUAL,
+    TokenType.BANG_EQUAL    : OpCode.NOT_EQUAL,
+}
+
+
+class Chunk:
+    """
+    Chunk
+    A sequence of bytecode along with its constant pool.
+
+    Operands are stored inline after their opcode. The tokens list runs
+    parallel to code and records the source token that produced each
+    entry so that runtime errors can report a line number.
+    """
+
+    def __init__(self) -> None:
+        self.code: List[int] = []
+        self.constants: List[Any] = []
+        self.tokens: List[Optional[Token]] = []
+        self._const_index: Dict[Tuple[type, Any], int] = {}
+
+    def __len__(self) -> int:
+        return len(self.code)
+
+    def write(self, value: int, token: Optional[Token]) -> int:
+        self.code.append(value)
+        self.tokens.append(token)
+        return len(self.code) - 1
+
+    def add_constant(self, value: Any) -> int:
+        # Only dedupe the plain values, functions are always unique
+        if type(value) in (str, float):
+            key = (type(value), value)
+            if key not in self._const_index:
+                self._const_index[key] = len(self.constants)
+                self.constants.append(value)
+            return self._const_index[key]
+
+        self.constants.append(value)
+        return len(self.constants) - 1
+
+
+class FunctionProto:
+    """
+    FunctionProto
+    Compiled form of a function. At runtime the VM wraps this in a
+    closure along with any captured upvalues.
+
+    Arguments:
+        name (str): name of the function, "script" for the top level.
+        arity (int): number of parameters.
+        num_slots (int): size of the frame needed to hold all locals,
+            including slot 0 which holds the callee or 'this'.
+        upvalues (List[Tuple[bool, int]]): for each upvalue, whether it
+            captures a local of the enclosing function and the slot (or
+            upvalue) index it captures.
+    """
+
+    def __init__(self, name: str, arity: int=0) -> None:
+        self.name: str = name
+        self.arity: int = arity
+        self.chunk: Chunk = Chunk()
+        self.num_slots: int = 1
+        self.upvalues: List[Tuple[bool, int]] = []
+
+    def __str__(self) -> str:
+        return f"<fn {self.name}>"
+
+
+class FunctionType(IntEnum):
+    SCRIPT = auto()
+    FUNCTION = auto()
+    METHOD = auto()
+    INITIALIZER = auto()
+
+
+class Local:
+    def __init__(self, name: str, depth: int) -> None:
+        self.name = name
+        self.depth = depth
+        self.captured = False
+
+
+class FunctionState:
+    """
+    Per-function compilation state (the 'Compiler' struct in clox).
+    """
+
+    def __init__(self, enclosing: Optional["FunctionState"], proto: FunctionProto, ftype: FunctionType) -> None:
+        self.enclosing = enclosing
+        self.proto = proto
+        self.ftype = ftype
+        self.scope_depth = 0
+        # Slot zero holds the callee, or the receiver for methods
+        slot_zero = "this" if ftype in (FunctionType.METHOD, FunctionType.INITIALIZER) else ""
+        self.locals: List[Local] = [Local(slot_zero, 0)]
+
+    def resolve_local(self, name: str) -> int:
+        for slot in range(len(self.locals) - 1, -1, -1):
+            if self.locals[slot].name == name:
+                return slot
+        return -1
+
+    def add_upvalue(self, index: int, is_local: bool) -> int:
+        upvalue = (is_local, index)
+        if upvalue in self.proto.upvalues:
+            return self.proto.upvalues.index(upvalue)
+
+        self.proto.upvalues.append(upvalue)
+        return len(self.proto.upvalues) - 1
+
+    def resolve_upvalue(self, name: str) -> int:
+        if self.enclosing is None:
+            return -1
+
+        local = self.enclosing.resolve_local(name)
+        if local != -1:
+            self.enclosing.locals[local].captured = True
+            return self.add_upvalue(local, True)
+
+        upvalue = self.enclosing.resolve_upvalue(name)
+        if upvalue != -1:
+            return self.add_upvalue(upvalue, False)
+
+        return -1
+
+
+class Compiler(Visitor):
+    """
+    Compiler
+    Walks a resolved list of statements and emits bytecode.
+    """
+
+    def __init__(self) -> None:
+        self.state: FunctionState = FunctionState(None, FunctionProto("script"), FunctionType.SCRIPT)
+        self.class_depth = 0
+
+    # ======== Emit helpers ======== #
+    @property
+    def chunk(self) -> Chunk:
+        return self.state.proto.chunk
+
+    def _emit(self, token: Optional[Token], op: OpCode, *operands: int) -> int:
+        pos = self.chunk.write(int(op), token)
+        for operand in operands:
+            self.chunk.write(operand, token)
+        return pos
+
+    def _emit_jump(self, token: Optional[Token], op: OpCode) -> int:
+        # Returns the position of the operand so it can be patched later
+        return self._emit(token, op, -1) + 1
+
+    def _patch_jump(self, operand_pos: int) -> None:
+        self.chunk.code[operand_pos] = len(self.chunk)
+
+    def _emit_constant(self, token: Optional[Token], value: Any) -> None:
+        self._emit(token, OpCode.CONSTANT, self.chunk.add_constant(value))
+
+    def _name_constant(self, name: Token) -> int:
+        return self.chunk.add_constant(name.lexeme)
+
+    # ======== Scopes ======== #
+    def _begin_scope(self) -> None:
+        self.state.scope_depth += 1
+
+    def _end_scope(self) -> None:
+        state = self.state
+        state.scope_depth -= 1
+
+        # Locals live in frame slots rather than on the operand stack so
+        # there is nothing to pop, only captured slots need closing.
+        while state.locals and state.locals[-1].depth > state.scope_depth:
+            local = state.locals.pop()
+            if local.captured:
+                self._emit(None, OpCode.CLOSE_UPVALUE, len(state.locals))
+
+    def _add_local(self, name: Token) -> int:
+        state = self.state
+        for local in reversed(state.locals):
+            if local.depth != -1 and local.depth < state.scope_depth:
+                break
+            if local.name == name.lexeme:
+                raise LoxInterpreterError(name, f"[{name.lexeme}] already in this scope")
+
+        state.locals.append(Local(name.lexeme, -1))
+        state.proto.num_slots = max(state.proto.num_slots, len(state.locals))
+        return len(state.locals) - 1
+
+    def _declare(self, name: Token) -> Optional[int]:
+        """
+        Declare a variable, returning its slot if it is local or None
+        if it is a global.
+        """
+        if self.state.scope_depth == 0:
+            return None
+        return self._add_local(name)
+
+    def _mark_initialized(self) -> None:
+        if self.state.scope_depth > 0:
+            self.state.locals[-1].depth = self.state.scope_depth
+
+    def _define(self, name: Token, slot: Optional[int]) -> None:
+        if slot is None:
+            self._emit(name, OpCode.DEFINE_GLOBAL, self._name_constant(name))
+        else:
+            self._mark_initialized()
+            self._emit(name, OpCode.STORE_LOCAL, slot)
+
+    def _get_variable(self, name: Token) -> None:
+        slot = self.state.resolve_local(name.lexeme)
+        if slot != -1:
+            if self.state.locals[slot].depth == -1:
+                raise LoxInterpreterError(
+                    name,
+                    f"Failed to read local variable [{name.lexeme}] in its own initializer"
+                )
+            self._emit(name, OpCode.GET_LOCAL, slot)
+            return
+
+        upvalue = self.state.resolve_upvalue(name.lexeme)
+        if upvalue != -1:
+            self._emit(name, OpCode.GET_UPVALUE, upvalue)
+        else:
+            self._emit(name, OpCode.GET_GLOBAL, self._name_constant(name))
+
+    def _set_variable(self, name: Token, pop: bool) -> None:
+        slot = self.state.resolve_local(name.lexeme)
+        if slot != -1:
+            self._emit(name, OpCode.STORE_LOCAL if pop else OpCode.SET_LOCAL, slot)
+            return
+
+        upvalue = self.state.resolve_upvalue(name.lexeme)
+        if upvalue != -1:
+            self._emit(name, OpCode.SET_UPVALUE, upvalue)
+        else:
+            self._emit(name, OpCode.SET_GLOBAL, self._name_constant(name))
+
+        if pop:
+            self._emit(None, OpCode.POP)
+
+    # ======== Functions ======== #
+    def _function(self, stmt: FuncStmt, ftype: FunctionType) -> None:
+        proto = FunctionProto(stmt.name.lexeme, len(stmt.params))
+        self.state = FunctionState(self.state, proto, ftype)
+        self._begin_scope()
+
+        for param in stmt.params:
+            self._add_local(param)
+            self._mark_initialized()
+
+        for body_stmt in stmt.body:
+            self._compile_stmt(body_stmt)
+        self._emit_return(stmt.name)
+
+        # No need to end the scope here, returning discards the frame
+        state = self.state
+        self.state = state.enclosing        # type: ignore
+        self._emit(stmt.name, OpCode.CLOSURE, self.chunk.add_constant(proto))
+
+    def _emit_return(self, token: Optional[Token]) -> None:
+        if self.state.ftype == FunctionType.INITIALIZER:
+            self._emit(token, OpCode.GET_LOCAL, 0)
+        else:
+            self._emit(token, OpCode.NIL)
+        self._emit(token, OpCode.RETURN)
+
+    def _compile_expr(self, expr: Expr) -> None:
+        expr.accept(self)
+
+    def _compile_stmt(self, stmt: Stmt) -> None:
+        stmt.accept(self)
+
+    # ======== Expression visitors ======== #
+    def visit_assignment_expr(self, expr: AssignmentExpr) -> None:
+        self._compile_expr(expr.value)
+        self._set_variable(expr.name, pop=False)
+
+    def visit_binary_expr(self, expr: BinaryExpr) -> None:
+        self._compile_expr(expr.left)
+        self._compile_expr(expr.right)
+        self._emit(expr.op, BINARY_OPS[expr.op.token_type])
+
+    def visit_call_expr(self, expr: CallExpr) -> None:
+        callee = expr.callee
+
+        # Method calls on an instance or on super skip the bound method
+        if isinstance(callee, GetExpr):
+            self._compile_expr(callee.obj)
+            for arg in expr.arguments:
+                self._compile_expr(arg)
+            self._emit(expr.paren, OpCode.INVOKE, self._name_constant(callee.name), len(expr.arguments))
+            return
+
+        if isinstance(callee, SuperExpr):
+            self._get_variable(Token(TokenType.THIS, "this", None, callee.keyword.line))
+            for arg in expr.arguments:
+                self._compile_expr(arg)
+            self._get_variable(callee.keyword)
+            self._emit(expr.paren, OpCode.SUPER_INVOKE, self._name_constant(callee.method), len(expr.arguments))
+            return
+
+        self._compile_expr(callee)
+        for arg in expr.arguments:
+            self._compile_expr(arg)
+        self._emit(expr.paren, OpCode.CALL, len(expr.arguments))
+
+    def visit_get_expr(self, expr: GetExpr) -> None:
+        self._compile_expr(expr.obj)
+        self._emit(expr.name, OpCode.GET_PROPERTY, self._name_constant(expr.name))
+
+    def visit_grouping_expr(self, expr: GroupingExpr) -> None:
+        self._compile_expr(expr.expression)
+
+    def visit_literal_expr(self, expr: LiteralExpr) -> None:
+        token = expr.value
+        if token.token_type == TokenType.TRUE:
+            self._emit(token, OpCode.TRUE)
+        elif token.token_type == TokenType.FALSE:
+            self._emit(token, OpCode.FALSE)
+        elif token.token_type in (TokenType.NUMBER, TokenType.STRING):
+            self._emit_constant(token, token.literal)
+        else:
+            self._emit(token, OpCode.NIL)
+
+    def visit_logical_expr(self, expr: LogicalExpr) -> None:
+        self._compile_expr(expr.left)
+        if expr.op.token_type == TokenType.OR:
+            end_jump = self._emit_jump(expr.op, OpCode.JUMP_IF_TRUE_OR_POP)
+        else:
+            end_jump = self._emit_jump(expr.op, OpCode.JUMP_IF_FALSE_OR_POP)
+        self._compile_expr(expr.right)
+        self._patch_jump(end_jump)
+
+    def visit_set_expr(self, expr: SetExpr) -> None:
+        self._compile_expr(expr.obj)
+        self._compile_expr(expr.value)
+        self._emit(expr.name, OpCode.SET_PROPERTY, self._name_constant(expr.name))
+
+    def visit_super_expr(self, expr: SuperExpr) -> None:
+        self._get_variable(Token(TokenType.THIS, "this", None, expr.keyword.line))
+        self._get_variable(expr.keyword)
+        self._emit(expr.method, OpCode.GET_SUPER, self._name_constant(expr.method))
+
+    def visit_this_expr(self, expr: ThisExpr) -> None:
+        self._get_variable(expr.keyword)
+
+    def visit_unary_expr(self, expr: UnaryExpr) -> None:
+        self._compile_expr(expr.right)
+        if expr.op.token_type == TokenType.MINUS:
+            self._emit(expr.op, OpCode.NEGATE)
+        else:
+            self._emit(expr.op, OpCode.NOT)
+
+    def visit_var_expr(self, expr: VarExpr) -> None:
+        self._get_variable(expr.name)
+
+    # ======== Statement visitors ======== #
+    def visit_block_stmt(self, stmt: BlockStmt) -> None:
+        self._begin_scope()
+        for s in stmt.stmts:
+            self._compile_stmt(s)
+        self._end_scope()
+
+    def visit_class_stmt(self, stmt: ClassStmt) -> None:
+        slot = self._declare(stmt.name)
+        self._emit(stmt.name, OpCode.CLASS, self._name_constant(stmt.name))
+        self._define(stmt.name, slot)
+
+        if stmt.superclass is not None:
+            # Hold the superclass in a scope of its own so that methods can
+            # capture it as an upvalue named 'super'.
+            self._begin_scope()
+            super_token = Token(TokenType.SUPER, "super", None, stmt.superclass.name.line)
+            super_slot = self._add_local(super_token)
+            self._compile_expr(stmt.superclass)
+            self._mark_initialized()
+            self._emit(super_token, OpCode.STORE_LOCAL, super_slot)
+
+            self._get_variable(super_token)
+            self._get_variable(stmt.name)
+            self._emit(stmt.superclass.name, OpCode.INHERIT)
+
+        self._get_variable(stmt.name)
+        for method in stmt.methods:
+            if method.name.lexeme == "init":
+                ftype = FunctionType.INITIALIZER
+            else:
+                ftype = FunctionType.METHOD
+            self._function(method, ftype)
+            self._emit(method.name, OpCode.METHOD, self._name_constant(method.name))
+        self._emit(None, OpCode.POP)
+
+        if stmt.superclass is not None:
+            self._end_scope()
+
+    def visit_expr_stmt(self, stmt: ExprStmt) -> None:
+        # Assignments as statements store directly without leaving the value behind
+        if isinstance(stmt.expr, AssignmentExpr):
+            self._compile_expr(stmt.expr.value)
+            self._set_variable(stmt.expr.name, pop=True)
+            return
+
+        self._compile_expr(stmt.expr)
+        self._emit(None, OpCode.POP)
+
+    def visit_func_stmt(self, stmt: FuncStmt) -> None:
+        slot = self._declare(stmt.name)
+        # Mark as initialized before compiling the body to allow recursion
+        self._mark_initialized()
+        self._function(stmt, FunctionType.FUNCTION)
+        self._define(stmt.name, slot)
+
+    def visit_if_stmt(self, stmt: IfStmt) -> None:
+        self._compile_expr(stmt.condition)
+        else_jump = self._emit_jump(None, OpCode.JUMP_IF_FALSE)
+        self._compile_stmt(stmt.then_branch)
+
+        if stmt.else_branch is not None:
+            end_jump = self._emit_jump(None, OpCode.JUMP)
+            self._patch_jump(else_jump)
+            self._compile_stmt(stmt.else_branch)
+            self._patch_jump(end_jump)
+        else:
+            self._patch_jump(else_jump)
+
+    def visit_print_stmt(self, stmt: PrintStmt) -> None:
+        self._compile_expr(stmt.expr)
+        self._emit(None, OpCode.PRINT)
+
+    def visit_return_stmt(self, stmt: ReturnStmt) -> None:
+        if stmt.value is None:
+            self._emit_return(stmt.keyword)
+            return
+
+        self._compile_expr(stmt.value)
+        self._emit(stmt.keyword, OpCode.RETURN)
+
+    def visit_var_stmt(self, stmt: VarStmt) -> None:
+        slot = self._declare(stmt.name)
+        if stmt.initializer is not None:
+            self._compile_expr(stmt.initializer)
+        else:
+            self._emit(stmt.name, OpCode.NIL)
+        self._define(stmt.name, slot)
+
+    def visit_while_stmt(self, stmt: WhileStmt) -> None:
+        loop_start = len(self.chunk)
+        self._compile_expr(stmt.condition)
+        exit_jump = self._emit_jump(None, OpCode.JUMP_IF_FALSE)
+        self._compile_stmt(stmt.body)
+        self._emit(None, OpCode.JUMP, loop_start)
+        self._patch_jump(exit_jump)
+
+    # Entry point method
+    def compile(self, stmts: Sequence[Stmt]) -> FunctionProto:
+        """
+        Compile a resolved Sequence of Lox Statements into the
+        FunctionProto for the top level script.
+        """
+        for stmt in stmts:
+            self._compile_stmt(stmt)
+        self._emit_return(None)
+
+        return self.state.proto
+
+
+def compile_program(stmts: Sequence[Stmt]) -> FunctionProto:
+    return Compiler().compile(stmts)
+
+
+# Utils for debugging bytecode
+def disassemble(proto: FunctionProto) -> str:
+    """
+    Render the bytecode for a function, and any functions nested in
+    its constant pool, in a human-readable format.
+    """
+
+    chunk = proto.chunk
+    lines = [f"== {proto.name} =="]
+    nested = []
+    ip = 0
+
+    while ip < len(chunk.code):
+        op = OpCode(chunk.code[ip])
+        operands = chunk.code[ip + 1 : ip + 1 + OPERAND_COUNT[op]]
+        token = chunk.tokens[ip]
+        line = f"{token.line:4d}" if token is not None else "   |"
+
+        s = f"{ip:04d} {line} {op.name:<20}"
+        if operands:
+            s += " " + " ".join(str(o) for o in operands)
+        if op in CONSTANT_OPERAND_OPS:
+            const = chunk.constants[operands[0]]
+            if isinstance(const, FunctionProto):
+                nested.append(const)
+                s += f" ({const})"
+            else:
+                s += f" ({const!r})"
+        lines.append(s)
+        ip += 1 + OPERAND_COUNT[op]
+
+    out = "\n".join(lines) + "\n"
+    for fn in nested:
+        out += disassemble(fn)
+
+    return out
@@ -0,0 +1,182 @@
+"""
+ENGINE
+
+Run Lox from Python, eg
+
+    engine = LoxEngine()
+    program = engine.compile("var x = 1; print x + y;")
+    result = engine.run(program, {"y": 2})
+    result.output           # "3\\n"
+    result.get("x")         # 1.0
+
+A program is scanned, parsed and resolved once by compile() and can then
+be run any number of times. Each run gets its own Interpreter and
+globals (fresh ones, or a fork of the globals from an earlier run), so
+nothing is shared between runs. Programs can be compiled and run from
+several threads at once. Errors are raised rather than printed, and nothing
+here calls exit().
+"""
+
+import time
+from dataclasses import dataclass, field, fields
+from io import StringIO
+from typing import Any, List, Mapping, Optional, Sequence, TextIO, Union
+
+from loxpy.scanner import Scanner
+from loxpy.parser import Parser
+from loxpy.resolver import Resolver
+from loxpy.interpreter import Interpreter, load_builtins
+from loxpy.environment import Environment
+from loxpy.optimizer import optimize, specialize
+from loxpy.source import SourceReader
+from loxpy.expr import Expr, GetExpr
+from loxpy.statement import Stmt
+
+
+def find_get_exprs(node: Any, found: List[GetExpr]) -> None:
+    """
+    Add every GetExpr in node to found
+    """
+    if type(node) is GetExpr:
+        found.append(node)
+
+    for f in fields(node):
+        value = getattr(node, f.name)
+        if isinstance(value, (Expr, Stmt)):
+            find_get_exprs(value, found)
+        elif isinstance(value, (list, tuple)):
+            for v in value:
+                if isinstance(v, (Expr, Stmt)):
+                    find_get_exprs(v, found)
+
+
+@dataclass
+class LoxProgram:
+    """
+    LoxProgram
+    A resolved program that is ready to run, and can be shared by any
+    number of runs. The only thing a run changes is the inline cache on
+    each property get, which is cleared when the run ends so that the
+    cache doesn't keep the run's classes (and through them its globals)
+    alive. Runs going on at the same time share the caches, which is safe
+    since a cache is only used if its class is the one being looked up.
+    """
+    name: str
+    stmts: Sequence[Stmt]
+    # Warnings printed by the front end, eg unused variables
+    messages: str = ""
+    # Every property get in stmts, for clearing their caches
+    get_exprs: List[GetExpr] = field(default_factory=list, repr=False)
+
+
+@dataclass
+class RunResult:
+    """
+    RunResult
+    What a run printed, and the globals it left behind. Pass globals to
+    LoxEngine.fork() to run another program on top of them.
+    """
+    output: str
+    globals: Environment
+    # Wall clock time to run the program, in seconds
+    elapsed: float = field(default=0.0)
+
+    def get(self, name: str) -> Any:
+        """
+        Value of the global name, raising KeyError if it wasn't defined
+        """
+        return self.globals.values[name]
+
+
+class LoxEngine:
+    """
+    LoxEngine
+    Compiles and runs Lox programs. The engine only holds its options, so
+    one engine can be used for every program in a process.
+    """
+
+    def __init__(self, optimize: bool=False) -> None:
+        # Run the optimizer over each program when it is compiled. Unused
+        # globals are always kept since later runs may use them.
+        self.optimize = optimize
+
+    def compile(self, source: Union[str, SourceReader], name: str="<script>") -> LoxProgram:
+        """
+        Scan, parse and resolve source. Raises LoxParseError or
+        LoxInterpreterError if the program is not valid.
+        """
+        # Warnings go to a stream of our own rather than through a
+        # redirected sys.stdout, which other threads would share
+        messages = StringIO()
+        stmts = Parser(Scanner(source, output=messages).iter_tokens()).parse()
+        Resolver(output=messages).resolve(stmts)
+
+        if self.optimize:
+            stmts = optimize(stmts, keep_globals=True)
+
+        stmts = specialize(stmts)
+        get_exprs: List[GetExpr] = []
+        for stmt in stmts:
+            find_get_exprs(stmt, get_exprs)
+
+        return LoxProgram(name, stmts, messages.getvalue(), get_exprs)
+
+    def new_globals(self, values: Optional[Mapping[str, Any]]=None) -> Environment:
+        """
+        Globals holding just the builtins, plus any of values. Python ints
+        are stored as floats since that's what Lox numbers are.
+        """
+        env = load_builtins()
+        if values is not None:
+            for name, value in values.items():
+                if type(value) is int:
+                    value = float(value)
+                env.define(name, value)
+
+        return env
+
+    def fork(self, env: Environment) -> Environment:
+        """
+        Copy of the globals in env. Defining or assigning a global in the
+        copy doesn't change env, but both still refer to the same
+        instances, so setting a field on one is seen by the other.
+        """
+        return env.copy()
+
+    def run(
+        self,
+        program: LoxProgram,
+        env: Union[Environment, Mapping[str, Any], None]=None,
+        output: Optional[TextIO]=None
+    ) -> RunResult:
+        """
+        Run program on the globals in env, or on new globals if env is a
+        mapping of values or None. Anything printed is written to output
+        if it is given, and otherwise returned in the RunResult. Raises
+        LoxRuntimeError if the program fails.
+        """
+        if not isinstance(env, Environment):
+            env = self.new_globals(env)
+
+        out = output if output is not None else StringIO()
+        interp = Interpreter(output=out)
+        interp.globals = interp.environment = env
+
+        # Run the statements directly, since Interpreter.interpret()
+        # reports runtime errors rather than raising them
+        start = time.perf_counter()
+        try:
+            for stmt in program.stmts:
+                interp.execute(stmt)
+        finally:
+            for expr in program.get_exprs:
+                expr.cache = None
+        elapsed = time.perf_counter() - start
+
+        return RunResult(out.getvalue() if output is None else "", env, elapsed)    # type: ignore
+
+    def eval(self, source: str, env: Union[Environment, Mapping[str, Any], None]=None) -> RunResult:
+        """
+        Compile and run source in one go
+        """
+        return self.run(self.compile(source), env)
@@ -1,4 +1,4 @@
-from typing import Any, Dict, Optional, Self
+from typing import Any, Dict, List, Optional, Self, Union
 
 from loxpy.token import Token
 from loxpy.error import LoxRuntimeError
@@ -34,6 +34,15 @@ class Environment:
     def define(self, name: str, value: Any) -> None:
         self.values[name] = value
 
+    def copy(self) -> "Environment":
+        """
+        New Environment with the same names bound to the same values, so
+        rebinding a name in one doesn't affect the other
+        """
+        env = Environment(self.enclosing)
+        env.values = dict(self.values)
+        return env
+
     def assign(self, name: Token, value: Any) -> None:
         if name.lexeme in self.values:
             self.values[name.lexeme] = value
@@ -62,9 +71,49 @@ class Environment:
         return self.ancestor(dist).get(name)
 
 
+class Frame:
+    """
+    Frame
+    Array-backed scope for local variables. The Resolver gives every local
+    a slot in the scope that declares it (and records how many slots each
+    scope needs) so locals are read and written by index rather than by
+    name. Globals are never resolved to a slot and stay in an Environment.
+    """
+
+    __slots__ = ("values", "enclosing")
+
+    def __init__(self, values: List[Any], enclosing: Union["Frame", Environment]):
+        self.values: List[Any] = values
+        self.enclosing: Union["Frame", Environment] = enclosing
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def __str__(self) -> str:
+        vals = ", ".join(f"[{slot}: {value}]" for slot, value in enumerate(self.values))
+        return f"Frame({vals})"
+
+    def ancestor(self, dist: int) -> "Frame":
+        frame = self
+        for _ in range(dist):
+            frame = frame.enclosing     # type: ignore
+
+        return frame
+
+    def assign_at(self, dist: int, slot: int, value: Any) -> None:
+        self.ancestor(dist).values[slot] = value
+
+    def get_at(self, dist: int, slot: int) -> Any:
+        return self.ancestor(dist).values[slot]
+
+
+# Any scope that statements can execute in
+Scope = Union[Environment, Frame]
+
+
 
 # Utils for debugging environments 
-def env_chain(env: Environment) -> str:
+def env_chain(env: Scope) -> str:
     """
     Print the current environment and its closures/ancestors.
     """
@@ -75,7 +124,10 @@ def env_chain(env: Environment) -> str:
 
     while cur_env is not None:
         s += f"Env({dist}) :\n\t"
-        s +=",\n\t".join(f"{key} : {val}" for key, val in cur_env.values.items())
+        if isinstance(cur_env, Frame):
+            s += ",\n\t".join(f"{slot} : {val}" for slot, val in enumerate(cur_env.values))
+        else:
+            s += ",\n\t".join(f"{key} : {val}" for key, val in cur_env.values.items())
         s += "\n"
 
         if cur_env.enclosing is not None:
@@ -1,14 +1,14 @@
 from abc import ABC, abstractmethod
-from dataclasses import dataclass
-from typing import Any, Optional, Sequence, Union
+from dataclasses import dataclass, field
+from typing import Any, Dict, Optional, Sequence, Tuple, Type, Union
 
-from loxpy.token import Token
+from loxpy.token import Token, TokenType
 
 
 ResultType = Union[float, bool, str, None]
 
 
-@dataclass(frozen=True)
+@dataclass(slots=True)
 class Expr(ABC):
     # TODO: what is the type of the visitor?
     @abstractmethod
@@ -17,9 +17,18 @@ class Expr(ABC):
 
 
 # All derived classes have a custom __str__() method to make the ASTPrinter work
-
-
-@dataclass(frozen=True)
+#
+# Expressions that refer to a variable also carry the resolution computed by the
+# Resolver, i.e. how many scopes up the variable lives (depth) and its index in
+# that scope (slot). Both are None for globals.
+#
+# Property gets carry an inline cache filled in by the interpreter. It
+# holds the class last seen at that site and the method found on it, as a 
+# (LoxClass, LoxFunction) tuple, so the lookup can be skipped while the class stays
+# the same.
+
+
+@dataclass(slots=True)
 class BinaryExpr(Expr):
     op: Token
     left: Expr
@@ -32,7 +41,7 @@ class BinaryExpr(Expr):
         return visitor.visit_binary_expr(self)
 
 
-@dataclass(frozen=True)
+@dataclass(slots=True)
 class CallExpr(Expr):
     callee: Expr
     paren: Token
@@ -46,10 +55,12 @@ class CallExpr(Expr):
 
 
 
-@dataclass(frozen=True)
+@dataclass(slots=True)
 class GetExpr(Expr):
     obj: Expr
     name: Token
+    # (class, method) of the last instance whose method was looked up here
+    cache: Optional[Tuple[Any, Any]] = field(default=None, compare=False, repr=False)
 
     def __str__(self) -> str:
         return f"GetExpr({self.name}: {self.obj})"
@@ -58,7 +69,7 @@ class GetExpr(Expr):
         return visitor.visit_get_expr(self)
 
 
-@dataclass(frozen=True)
+@dataclass(slots=True)
 class SetExpr(Expr):
     obj: Expr
     name: Token
@@ -71,10 +82,12 @@ class SetExpr(Expr):
         return visitor.visit_set_expr(self)
 
 
-@dataclass(frozen=True)
+@dataclass(slots=True)
 class SuperExpr(Expr):
     keyword: Token
     method: Token
+    depth: Optional[int] = field(default=None, compare=False, repr=False)
+    slot: Optional[int] = field(default=None, compare=False, repr=False)
 
     def __str__(self) -> str:
         return f"SuperExpr({self.keyword})"
@@ -83,9 +96,11 @@ class SuperExpr(Expr):
         return visitor.visit_super_expr(self)
 
 
-@dataclass(frozen=True)
+@dataclass(slots=True)
 class ThisExpr(Expr):
     keyword: Token
+    depth: Optional[int] = field(default=None, compare=False, repr=False)
+    slot: Optional[int] = field(default=None, compare=False, repr=False)
 
     def __str__(self) -> str:
         return f"ThisExpr({self.keyword})"
@@ -94,7 +109,7 @@ class ThisExpr(Expr):
         return visitor.visit_this_expr(self)
 
 
-@dataclass(frozen=True)
+@dataclass(slots=True)
 class GroupingExpr(Expr):
     expression: Expr
 
@@ -105,7 +120,7 @@ class GroupingExpr(Expr):
         return visitor.visit_grouping_expr(self)
 
 
-@dataclass(frozen=True)
+@dataclass(slots=True)
 class LiteralExpr(Expr):
     value: Token
 
@@ -116,7 +131,7 @@ class LiteralExpr(Expr):
         return visitor.visit_literal_expr(self)
 
 
-@dataclass(frozen=True)
+@dataclass(slots=True)
 class LogicalExpr(Expr):
     op: Token
     left: Expr
@@ -129,7 +144,7 @@ class LogicalExpr(Expr):
         return visitor.visit_logical_expr(self)
 
 
-@dataclass(frozen=True)
+@dataclass(slots=True)
 class UnaryExpr(Expr):
     op: Token
     right: Expr
@@ -141,9 +156,11 @@ class UnaryExpr(Expr):
         return visitor.visit_unary_expr(self)
 
 
-@dataclass(frozen=True)
+@dataclass(slots=True)
 class VarExpr(Expr):
     name: Token
+    depth: Optional[int] = field(default=None, compare=False, repr=False)
+    slot: Optional[int] = field(default=None, compare=False, repr=False)
 
     def __str__(self) -> str:
         return f"VarExpr({self.name.lexeme})"
@@ -152,13 +169,145 @@ class VarExpr(Expr):
         return visitor.visit_var_expr(self)
 
 
-@dataclass(frozen=True)
+@dataclass(slots=True)
 class AssignmentExpr(Expr):
     name: Token
     value: Expr
+    depth: Optional[int] = field(default=None, compare=False, repr=False)
+    slot: Optional[int] = field(default=None, compare=False, repr=False)
 
     def __str__(self) -> str:
         return f"AssignmentExpr({self.name})"
 
     def accept(self, visitor) -> Any:
         return visitor.visit_assignment_expr(self)
+
+
+# Specialised binary expressions
+#
+# After resolving, each BinaryExpr can be replaced by the subclass for its
+# operator so the backends don't have to look at op on every evaluation.
+# A few common shapes get their own subclass again, eg: adding a number
+# to something (i = i + 1) or comparing two locals (i < n). Each of these
+# has its own visit method, but the Visitor forwards them all to the
+# visit method of the class they derive from, so a visitor only needs to
+# implement the ones it can do something better with.
+
+
+@dataclass(slots=True)
+class AddExpr(BinaryExpr):
+    def accept(self, visitor) -> Any:
+        return visitor.visit_add_expr(self)
+
+
+@dataclass(slots=True)
+class SubtractExpr(BinaryExpr):
+    def accept(self, visitor) -> Any:
+        return visitor.visit_subtract_expr(self)
+
+
+@dataclass(slots=True)
+class MultiplyExpr(BinaryExpr):
+    def accept(self, visitor) -> Any:
+        return visitor.visit_multiply_expr(self)
+
+
+@dataclass(slots=True)
+class DivideExpr(BinaryExpr):
+    def accept(self, visitor) -> Any:
+        return visitor.visit_divide_expr(self)
+
+
+@dataclass(slots=True)
+class GreaterExpr(BinaryExpr):
+    def accept(self, visitor) -> Any:
+        return visitor.visit_greater_expr(self)
+
+
+@dataclass(slots=True)
+class GreaterEqualExpr(BinaryExpr):
+    def accept(self, visitor) -> Any:
+        return visitor.visit_greater_equal_expr(self)
+
+
+@dataclass(slots=True)
+class LessExpr(BinaryExpr):
+    def accept(self, visitor) -> Any:
+        return visitor.visit_less_expr(self)
+
+
+@dataclass(slots=True)
+class LessEqualExpr(BinaryExpr):
+    def accept(self, visitor) -> Any:
+        return visitor.visit_less_equal_expr(self)
+
+
+@dataclass(slots=True)
+class EqualExpr(BinaryExpr):
+    def accept(self, visitor) -> Any:
+        return visitor.visit_equal_expr(self)
+
+
+@dataclass(slots=True)
+class NotEqualExpr(BinaryExpr):
+    def accept(self, visitor) -> Any:
+        return visitor.visit_not_equal_expr(self)
+
+
+# The right operand of these is always a number LiteralExpr
+
+
+@dataclass(slots=True)
+class AddConstExpr(AddExpr):
+    def accept(self, visitor) -> Any:
+        return visitor.visit_add_const_expr(self)
+
+
+@dataclass(slots=True)
+class SubtractConstExpr(SubtractExpr):
+    def accept(self, visitor) -> Any:
+        return visitor.visit_subtract_const_expr(self)
+
+
+@dataclass(slots=True)
+class LessConstExpr(LessExpr):
+    def accept(self, visitor) -> Any:
+        return visitor.visit_less_const_expr(self)
+
+
+@dataclass(slots=True)
+class LessEqualConstExpr(LessEqualExpr):
+    def accept(self, visitor) -> Any:
+        return visitor.visit_less_equal_const_expr(self)
+
+
+# Both operands of this are VarExprs for locals
+
+
+@dataclass(slots=True)
+class LessLocalsExpr(LessExpr):
+    def accept(self, visitor) -> Any:
+        return visitor.visit_less_locals_expr(self)
+
+
+# The subclass of BinaryExpr for each operator
+OPERATOR_EXPRS: Dict[TokenType, Type[BinaryExpr]] = {
+    TokenType.PLUS          : AddExpr,
+    TokenType.MINUS         : SubtractExpr,
+    TokenType.STAR          : MultiplyExpr,
+    TokenType.SLASH         : DivideExpr,
+    TokenType.GREATER       : GreaterExpr,
+    TokenType.GREATER_EQUAL : GreaterEqualExpr,
+    TokenType.LESS          : LessExpr,
+    TokenType.LESS_EQUAL    : LessEqualExpr,
+    TokenType.EQUAL_EQUAL   : EqualExpr,
+    TokenType.BANG_EQUAL    : NotEqualExpr,
+}
+
+# The subclass for each operator when the right operand is a number
+CONST_OPERATOR_EXPRS: Dict[TokenType, Type[BinaryExpr]] = {
+    TokenType.PLUS          : AddConstExpr,
+    TokenType.MINUS         : SubtractConstExpr,
+    TokenType.LESS          : LessConstExpr,
+    TokenType.LESS_EQUAL    : LessEqualConstExpr,
+}
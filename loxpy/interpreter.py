@@ -4,13 +4,28 @@ Interpret a collection of Lox expressions
 
 """
 
-from typing import Any, Dict, Optional, Sequence, Union
+from typing import Any, Dict, List, Optional, Sequence, TextIO, Union
 
 from loxpy.visitor import Visitor
-from loxpy.token import Token, TokenType, Str2Token
+from loxpy.token import Token, TokenType
 from loxpy.expr import (
     Expr,
     BinaryExpr,
+    AddExpr,
+    SubtractExpr,
+    MultiplyExpr,
+    DivideExpr,
+    GreaterExpr,
+    GreaterEqualExpr,
+    LessExpr,
+    LessEqualExpr,
+    EqualExpr,
+    NotEqualExpr,
+    AddConstExpr,
+    SubtractConstExpr,
+    LessConstExpr,
+    LessEqualConstExpr,
+    LessLocalsExpr,
     CallExpr,
     GetExpr,
     SetExpr,
@@ -37,9 +52,11 @@ from loxpy.statement import (
     WhileStmt
 )
 
-from loxpy.environment import Environment
-from loxpy.callable import LoxCallable, LoxFunction, LoxClass, LoxInstance, LoxReturnException
+from loxpy.environment import Environment, Frame, Scope
+from loxpy.callable import LoxCallable, LoxFunction, LoxClass, LoxInstance, LoxReturn
 from loxpy.error import LoxRuntimeError
+from loxpy.value import is_equal, stringify
+from loxpy.closure_compiler import ClosureCompiler
 
 from loxpy.builtins import BUILTIN_MAP
 
@@ -54,41 +71,51 @@ def load_builtins() -> Environment:
 
 
 class Interpreter(Visitor):
-    def __init__(self, verbose: bool=False) -> None:
+    def __init__(
+        self,
+        verbose: bool=False,
+        compile_closures: bool=False,
+        collect_results: bool=False,
+        output: Optional[TextIO]=None
+    ) -> None:
         self.verbose: bool = verbose
-        self.locals: Dict[Expr, int] = {}
+        # Compile the resolved statements into closures before running them
+        # rather than walking the tree.
+        self.compile_closures: bool = compile_closures
+        # Keep the result of every executed statement (in blocks, loops and
+        # from interpret()). This is only useful for testing, so by default
+        # no result lists are built.
+        self.collect_results: bool = collect_results
+        # Where print statements write to, sys.stdout if not given
+        self.output: Optional[TextIO] = output
         self.globals: Environment = load_builtins()
-        self.environment: Environment = self.globals
+        self.environment: Scope = self.globals
 
-    def is_true(self, expr: Optional[Union[Expr, bool]]) -> bool:
+    def is_true(self, value: Any) -> bool:
         """
         Implement Ruby-style truth (False and None are false,
         others are true)
         """
 
-        if expr is None or expr is False:
-            return False
+        return not (value is None or value is False)
 
-        if isinstance(expr, LiteralExpr):
-            return True if (expr.value and expr.value.token_type != TokenType.NIL) else False
-
-        return True
-
-    def is_equal(self, a: Any, b: Any) -> bool:
-        if(a is None) and (b is None):
-            return True
-        if a is None:
-            return False
-
-        return a == b
-
-    def lookup_variable(self, name: Token, expr: Expr) -> Any:
-        dist = self.locals.get(expr, None)
+    def lookup_variable(self, name: Token, expr: Union[VarExpr, ThisExpr]) -> Any:
+        dist = expr.depth
         if dist is not None:
-            return self.environment.get_at(dist, name)
+            return self.environment.get_at(dist, expr.slot)     # type: ignore
         else:
             return self.globals.get(name)
 
+    def declare(self, name: Token, slot: Optional[int], value: Any) -> None:
+        """
+        Bind a declared name in the current scope. Locals go in the slot
+        the resolver gave them, globals are defined by name.
+        """
+        if slot is not None:
+            self.environment.values[slot] = value       # type: ignore
+        else:
+            self.environment.define(name.lexeme, value)     # type: ignore
+
     # NOTE: Original implementation returns a LoxObject (strictly a Java Object)
     def evaluate(self, expr) -> Any:
         if self.verbose:
@@ -103,34 +130,28 @@ class Interpreter(Visitor):
         # TODO: unreachable?
         return None
 
-    def check_number_operand(self, operator: Token, operand: Union[Token, float, bool]) -> None:
-        # Check if operand is a Token then it can be a number or a boolean
-        if isinstance(operand, Token):
-            if operand.token_type not in (TokenType.NUMBER, TokenType.TRUE, TokenType.FALSE):
-                raise LoxRuntimeError(operator, 'Operand must be a number or boolean')
-        else:
-            # Can also be a python number or boolean
-            if not (isinstance(operand, float) or isinstance(operand, bool)):
-                raise LoxRuntimeError(operator, 'Operand must be a number or boolean')
+    def check_number_operand(self, operator: Token, operand: Any) -> None:
+        if type(operand) is not float:
+            raise LoxRuntimeError(operator, "Operand must be a number")
 
-    def check_number_operands(self, operator: Token, left: Union[Token, float], right: Union[Token, float]) -> None:
-        if not isinstance(left, float) and left.token_type != TokenType.NUMBER:
+    def check_number_operands(self, operator: Token, left: Any, right: Any) -> None:
+        if type(left) is not float:
             raise LoxRuntimeError(operator, f"Left operand to [{operator.lexeme}] must be a number")
-        if not isinstance(right, float) and right.token_type != TokenType.NUMBER:
+        if type(right) is not float:
             raise LoxRuntimeError(operator, f"Right operand to [{operator.lexeme}] must be a number")
 
     # ======== Visit expressions ======== ##
-    def visit_literal_expr(self, expr: LiteralExpr) -> Token:
-        return expr.value
+    def visit_literal_expr(self, expr: LiteralExpr) -> Any:
+        return expr.value.literal
 
     def visit_logical_expr(self, expr: LogicalExpr) -> Any:
         left = self.evaluate(expr.left)
 
         if expr.op.token_type == TokenType.OR:
-            if self.is_true(expr.left):
+            if self.is_true(left):
                 return left
         else:
-            if not self.is_true(expr.left):
+            if not self.is_true(left):
                 return left
 
         return self.evaluate(expr.right)
@@ -140,14 +161,9 @@ class Interpreter(Visitor):
 
     def visit_unary_expr(self, expr: UnaryExpr) -> Union[float, bool, None]:
         right = self.evaluate(expr.right)
-        if right is None:
-            raise TypeError('Incorrect expression for right operand of unary expression [visit_unary_expr()]')
-
-        self.check_number_operand(expr.op, right)
 
         if expr.op.token_type == TokenType.MINUS:
-            if isinstance(right, Token):
-                right = float(right.lexeme)
+            self.check_number_operand(expr.op, right)
             return -right
         elif expr.op.token_type == TokenType.BANG:
             return not self.is_true(right)
@@ -155,26 +171,27 @@ class Interpreter(Visitor):
         # Unreachable ?
         return None
 
-    def visit_binary_expr(self, expr: BinaryExpr) -> Union[Token, float, bool, str, None]:
+    def visit_binary_expr(self, expr: BinaryExpr) -> Union[float, bool, str, None]:
         left = self.evaluate(expr.left)
         right = self.evaluate(expr.right)
 
+        # Equality works on values of any type
+        if expr.op.token_type == TokenType.BANG_EQUAL:
+            return not is_equal(left, right)
+        elif expr.op.token_type == TokenType.EQUAL_EQUAL:
+            return is_equal(left, right)
+
         # The '+' operator should also work for strings
-        if isinstance(left, Token) and isinstance(right, Token) and left.token_type == TokenType.STRING and right.token_type == TokenType.STRING:
-               if expr.op.token_type == TokenType.PLUS:
-                   s = left.literal + right.literal
-                   return Token(TokenType.STRING, s, s, left.line)
+        if expr.op.token_type == TokenType.PLUS and type(left) is str and type(right) is str:
+            return left + right
 
         self.check_number_operands(expr.op, left, right)
 
-        if isinstance(left, Token):
-            left = float(left.lexeme)
-        if isinstance(right, Token):
-            right = float(right.lexeme)
-
         if expr.op.token_type == TokenType.MINUS:
             return left - right
         elif expr.op.token_type == TokenType.SLASH:
+            if right == 0.0:
+                raise LoxRuntimeError(expr.op, "Division by zero")
             return left / right
         elif expr.op.token_type == TokenType.STAR:
             return left * right
@@ -188,15 +205,130 @@ class Interpreter(Visitor):
             return left < right
         elif expr.op.token_type == TokenType.LESS_EQUAL:
             return left <= right
-        elif expr.op.token_type == TokenType.BANG_EQUAL:
-            return not self.is_equal(left, right)
-        elif expr.op.token_type == TokenType.EQUAL_EQUAL:
-            return self.is_equal(left, right)
         else:
             return None     # unreachable?
 
+    # ======== Specialised binary expressions ======== ##
+    # Same as visit_binary_expr, but the operator is known from the class
+    def visit_add_expr(self, expr: AddExpr) -> Union[float, str]:
+        left = self.evaluate(expr.left)
+        right = self.evaluate(expr.right)
+        if (type(left) is float and type(right) is float) or (type(left) is str and type(right) is str):
+            return left + right
+
+        self.check_number_operands(expr.op, left, right)
+        return left + right
+
+    def visit_subtract_expr(self, expr: SubtractExpr) -> float:
+        left = self.evaluate(expr.left)
+        right = self.evaluate(expr.right)
+        if type(left) is not float or type(right) is not float:
+            self.check_number_operands(expr.op, left, right)
+        return left - right
+
+    def visit_multiply_expr(self, expr: MultiplyExpr) -> float:
+        left = self.evaluate(expr.left)
+        right = self.evaluate(expr.right)
+        if type(left) is not float or type(right) is not float:
+            self.check_number_operands(expr.op, left, right)
+        return left * right
+
+    def visit_divide_expr(self, expr: DivideExpr) -> float:
+        left = self.evaluate(expr.left)
+        right = self.evaluate(expr.right)
+        if type(left) is not float or type(right) is not float:
+            self.check_number_operands(expr.op, left, right)
+        if right == 0.0:
+            raise LoxRuntimeError(expr.op, "Division by zero")
+        return left / right
+
+    def visit_greater_expr(self, expr: GreaterExpr) -> bool:
+        left = self.evaluate(expr.left)
+        right = self.evaluate(expr.right)
+        if type(left) is not float or type(right) is not float:
+            self.check_number_operands(expr.op, left, right)
+        return left > right
+
+    def visit_greater_equal_expr(self, expr: GreaterEqualExpr) -> bool:
+        left = self.evaluate(expr.left)
+        right = self.evaluate(expr.right)
+        if type(left) is not float or type(right) is not float:
+            self.check_number_operands(expr.op, left, right)
+        return left >= right
+
+    def visit_less_expr(self, expr: LessExpr) -> bool:
+        left = self.evaluate(expr.left)
+        right = self.evaluate(expr.right)
+        if type(left) is not float or type(right) is not float:
+            self.check_number_operands(expr.op, left, right)
+        return left < right
+
+    def visit_less_equal_expr(self, expr: LessEqualExpr) -> bool:
+        left = self.evaluate(expr.left)
+        right = self.evaluate(expr.right)
+        if type(left) is not float or type(right) is not float:
+            self.check_number_operands(expr.op, left, right)
+        return left <= right
+
+    def visit_equal_expr(self, expr: EqualExpr) -> bool:
+        return is_equal(self.evaluate(expr.left), self.evaluate(expr.right))
+
+    def visit_not_equal_expr(self, expr: NotEqualExpr) -> bool:
+        return not is_equal(self.evaluate(expr.left), self.evaluate(expr.right))
+
+    # The right operand is a number, so only the left needs checking
+    def visit_add_const_expr(self, expr: AddConstExpr) -> float:
+        left = self.evaluate(expr.left)
+        right = expr.right.value.literal       # type: ignore
+        if type(left) is not float:
+            self.check_number_operands(expr.op, left, right)
+        return left + right
+
+    def visit_subtract_const_expr(self, expr: SubtractConstExpr) -> float:
+        left = self.evaluate(expr.left)
+        right = expr.right.value.literal       # type: ignore
+        if type(left) is not float:
+            self.check_number_operands(expr.op, left, right)
+        return left - right
+
+    def visit_less_const_expr(self, expr: LessConstExpr) -> bool:
+        left = self.evaluate(expr.left)
+        right = expr.right.value.literal       # type: ignore
+        if type(left) is not float:
+            self.check_number_operands(expr.op, left, right)
+        return left < right
+
+    def visit_less_equal_const_expr(self, expr: LessEqualConstExpr) -> bool:
+        left = self.evaluate(expr.left)
+        right = expr.right.value.literal       # type: ignore
+        if type(left) is not float:
+            self.check_number_operands(expr.op, left, right)
+        return left <= right
+
+    def visit_less_locals_expr(self, expr: LessLocalsExpr) -> bool:
+        # Both operands are locals, so read them straight from their frames
+        env = self.environment
+        left = env.get_at(expr.left.depth, expr.left.slot)     # type: ignore
+        right = env.get_at(expr.right.depth, expr.right.slot)  # type: ignore
+        if type(left) is not float or type(right) is not float:
+            self.check_number_operands(expr.op, left, right)
+        return left < right
+
     def visit_call_expr(self, expr: CallExpr) -> Any:
-        function = self.evaluate(expr.callee)
+        callee = expr.callee
+        this = None
+
+        # For obj.method(...) call the method with obj as 'this' directly,
+        # rather than creating a bound method just to call it once.
+        if type(callee) is GetExpr:
+            obj = self.evaluate(callee.obj)
+            if isinstance(obj, LoxInstance) and callee.name.lexeme not in obj.fields:
+                function = self.find_method(callee, obj)
+                this = obj
+            else:
+                function = self.get_property(callee, obj)
+        else:
+            function = self.evaluate(callee)
 
         if not isinstance(function, LoxCallable):
             raise LoxRuntimeError(expr.paren, "Can only call functions")
@@ -209,16 +341,46 @@ class Interpreter(Visitor):
             raise LoxRuntimeError(expr.paren, f"Expected {function.arity()} arguments, got {len(args)}")
 
         try:
+            if this is not None:
+                return function.invoke(self, this, args)    # type: ignore
             return function.call(self, args)
         except (NotImplementedError, TypeError, ValueError) as e:
             raise LoxRuntimeError(expr.paren, str(e))
+        except RecursionError:
+            # The innermost call reports it, the same as the VM running
+            # out of frames
+            raise LoxRuntimeError(expr.paren, "Stack overflow")
 
-    def visit_get_expr(self, expr: GetExpr) -> Any:
-        obj = self.evaluate(expr.obj)
-        if isinstance(obj, LoxInstance):
-            return obj.get(expr.name)     # lookup the instance property
+    def find_method(self, expr: GetExpr, obj: LoxInstance) -> LoxFunction:
+        """
+        Find the method named by expr on the class of obj
+        """
+        # Only look in the method table if this site last saw a different class
+        cache = expr.cache
+        if cache is None or cache[0] is not obj.lox_class:
+            method = obj.lox_class.find_method(expr.name.lexeme)
+            if method is None:
+                raise LoxRuntimeError(
+                    expr.name, 
+                    f"Undefined property '{expr.name.lexeme}' on class '{obj.lox_class.name}'"
+                )
+            cache = expr.cache = (obj.lox_class, method)
+
+        return cache[1]
+
+    def get_property(self, expr: GetExpr, obj: Any) -> Any:
+        if not isinstance(obj, LoxInstance):
+            raise LoxRuntimeError(expr.name, "Only instances have properties")
+
+        # Fields shadow methods
+        fields = obj.fields
+        if expr.name.lexeme in fields:
+            return fields[expr.name.lexeme]
+
+        return self.find_method(expr, obj).bind(obj)
 
-        raise LoxRuntimeError(expr.name, "Only instances have properties")
+    def visit_get_expr(self, expr: GetExpr) -> Any:
+        return self.get_property(expr, self.evaluate(expr.obj))
 
     def visit_set_expr(self, expr: SetExpr) -> Any:
         obj = self.evaluate(expr.obj)
@@ -234,9 +396,10 @@ class Interpreter(Visitor):
         return self.lookup_variable(expr.keyword, expr)
 
     def visit_super_expr(self, expr: SuperExpr) -> Any:
-        dist = self.locals.get(expr)
-        superclass = self.environment.get_at(dist, Str2Token("super"))   # type: ignore
-        obj = self.environment.get_at(dist - 1, Str2Token("this"))   # type: ignore
+        dist = expr.depth
+        # 'super' and 'this' are each the only slot in their scopes
+        superclass = self.environment.get_at(dist, 0)   # type: ignore
+        obj = self.environment.get_at(dist - 1, 0)      # type: ignore
         method = superclass.find_method(expr.method.lexeme)
 
         if method is None:
@@ -252,10 +415,10 @@ class Interpreter(Visitor):
 
     def visit_assignment_expr(self, expr: AssignmentExpr) -> Any:
         value = self.evaluate(expr.value)
-        dist = self.locals.get(expr, None)
+        dist = expr.depth
 
         if dist is not None:
-            self.environment.assign_at(dist, expr.name, value)
+            self.environment.assign_at(dist, expr.slot, value)     # type: ignore
         else:
             self.globals.assign(expr.name, value)
 
@@ -268,20 +431,20 @@ class Interpreter(Visitor):
     def visit_func_stmt(self, stmt: FuncStmt) -> Any:
         # Note that here we capture the environment as a closure at declaration time
         func = LoxFunction(stmt, self.environment, False)    # Just a regular function 
-        self.environment.define(stmt.name.lexeme, func)
+        self.declare(stmt.name, stmt.slot, func)
 
     def visit_print_stmt(self, stmt: PrintStmt) -> Any:
         value = self.evaluate(stmt.expr)
-        print(f"{value}")
+        print(stringify(value), file=self.output)
         return value
 
-    def visit_return_stmt(self, stmt: ReturnStmt) -> None:
+    def visit_return_stmt(self, stmt: ReturnStmt) -> LoxReturn:
         if stmt.value is not None:
             value = self.evaluate(stmt.value)
         else:
             value = None
 
-        raise LoxReturnException(value)
+        return LoxReturn(value)
 
     def visit_if_stmt(self, stmt: IfStmt) -> Any:
         if self.is_true(self.evaluate(stmt.condition)):
@@ -297,11 +460,12 @@ class Interpreter(Visitor):
         else:
             value = None
 
-        self.environment.define(stmt.name.lexeme, value)
+        self.declare(stmt.name, stmt.slot, value)
 
-    # NOTE that I am returning all the results, which is not what the interpreter does in the book
+    # NOTE that when collect_results is set I am returning all the results, which 
+    # is not what the interpreter does in the book
     def visit_block_stmt(self, stmt: BlockStmt) -> Sequence[Any]:
-        return self.execute_block(stmt.stmts, Environment(self.environment))
+        return self.execute_block(stmt.stmts, Frame([None] * stmt.num_slots, self.environment))
 
     def visit_class_stmt(self, stmt: ClassStmt) -> None:
         if stmt.superclass is not None:
@@ -314,11 +478,10 @@ class Interpreter(Visitor):
         else:
             superclass = None
 
-        self.environment.define(stmt.name.lexeme, None)
+        self.declare(stmt.name, stmt.slot, None)
         
         if stmt.superclass is not None:
-            self.environment = Environment(self.environment)
-            self.environment.define("super", superclass)
+            self.environment = Frame([superclass], self.environment)
 
         methods: Dict[str, LoxFunction] = {}    # type: ignore
         for method in stmt.methods:
@@ -330,50 +493,78 @@ class Interpreter(Visitor):
         if stmt.superclass is not None:
             self.environment = self.environment.enclosing   # type: ignore
 
-        self.environment.assign(stmt.name, cl)  # type: ignore
+        self.declare(stmt.name, stmt.slot, cl)
 
-    # NOTE: still returning results, ret here is a hack to maintain the pattern but
+    # NOTE: when collecting results, ret here is a hack to maintain the pattern but
     # it will only reuturn the last result.
     def visit_while_stmt(self, stmt: WhileStmt) -> Any:
         ret = None
         while self.is_true(self.evaluate(stmt.condition)):
             ret = self.execute(stmt.body)
+            if type(ret) is LoxReturn:
+                return ret
 
-        return ret
+        return ret if self.collect_results else None
 
     # ======== Run ======== ##
     def execute(self, stmt: Stmt) -> Any:
         return stmt.accept(self)
 
-    def execute_block(self, stmts: Sequence[Stmt], env: Environment) -> Any:
+    def execute_block(self, stmts: Sequence[Stmt], env: Scope) -> Any:
         prev_env = self.environment
-        ret = []
 
         try:
             self.environment = env
+            if self.collect_results:
+                ret = []
+                for stmt in stmts:
+                    result = self.execute(stmt)
+                    # Stop at a return and hand it up to the enclosing call
+                    if type(result) is LoxReturn:
+                        return result
+                    ret.append(result)
+
+                return ret
+
             for stmt in stmts:
-                ret.append(self.execute(stmt))
+                result = self.execute(stmt)
+                if type(result) is LoxReturn:
+                    return result
         finally:
             self.environment = prev_env
 
-        return ret
+        return None
 
-    def resolve(self, expr: Expr, depth: int) -> None:
-        self.locals[expr] = depth
+    def run(self, stmts: Sequence[Stmt], out_stmts: Optional[List[Any]]=None) -> None:
+        """
+        Execute stmts, leaving any LoxRuntimeError to the caller. The
+        result of each statement is appended to out_stmts if it is given.
+        """
+        if self.compile_closures:
+            for compiled in ClosureCompiler(self).compile(stmts):
+                result = compiled(self.environment)
+                if out_stmts is not None:
+                    out_stmts.append(result)
+        else:
+            for stmt in stmts:
+                result = self.execute(stmt)
+                if out_stmts is not None:
+                    out_stmts.append(result)
 
     # Entry point method
-    def interpret(self, stmts: Sequence[Stmt]) -> Sequence[Any]:
+    def interpret(self, stmts: Sequence[Stmt]) -> Optional[Sequence[Any]]:
         """
-        Interpret a Sequence of Lox Statements
+        Interpret a Sequence of Lox Statements, printing any runtime error.
+        If collect_results is set then the result of each statement is
+        returned, otherwise None.
         """
 
         # TODO: note that you aren't really supposed to do this, the design is more aimed at being a
         # REPL than it is about being a module, I just find this design easier to test.
-        out_stmts = []
+        out_stmts: Optional[List[Any]] = [] if self.collect_results else None
 
         try:
-            for stmt in stmts:
-                out_stmts.append(self.execute(stmt))
+            self.run(stmts, out_stmts)
         except LoxRuntimeError as e:
             print(f"Got runtime error [{e.message}] at {e.token} (line {e.token.line})")
             return out_stmts            # TODO: this isn't actually a useful thing to do I think
@@ -0,0 +1,556 @@
+"""
+OPTIMIZER
+
+Optimisations over a resolved AST. These only rewrite the tree, so the
+result can be run by any of the backends.
+
+Constant folding
+    Operators whose operands are all literals are replaced by a literal
+    holding the result. Anything that would raise an error at runtime
+    (eg: "a" - 1, 1 / 0) or give a result that isn't finite is left alone,
+    so that it fails in the same way and at the same place as before.
+    Logical operators with a literal on the left are replaced with
+    whichever operand they would evaluate to.
+
+Grouping removal
+    Parentheses have done their job once the tree is built, so the
+    GroupingExpr wrappers are removed.
+
+Branch pruning
+    An if statement with a literal condition is replaced by the branch
+    that would be taken.
+
+Operator specialisation
+    Each BinaryExpr is replaced by the subclass for its operator, or for a
+    common shape such as adding a constant, so the backends don't have to
+    decide what the operator is every time it is evaluated. This isn't
+    part of optimize(), since it is worth doing for every program run by
+    the tree-walker. See specialize().
+
+Dead code elimination
+    Removes local variables that the resolver found were never used (as
+    long as their initializer has no side effects), local functions that
+    are never used, statements after a return, loops that never run and
+    expression statements with no effect. Unless keep_globals is set,
+    global functions and variables that are never referred to are also
+    removed. That is only safe when the whole program is known, so not
+    in the REPL where later lines can use them.
+"""
+
+from math import isfinite
+from typing import Any, List, Optional, Sequence, Set, TextIO
+from dataclasses import fields, is_dataclass
+
+from loxpy.visitor import Visitor
+from loxpy.token import Token, TokenType
+from loxpy.expr import (
+    Expr,
+    AssignmentExpr,
+    BinaryExpr,
+    LessLocalsExpr,
+    CallExpr,
+    GetExpr,
+    GroupingExpr,
+    LiteralExpr,
+    LogicalExpr,
+    SetExpr,
+    SuperExpr,
+    ThisExpr,
+    UnaryExpr,
+    VarExpr,
+    OPERATOR_EXPRS,
+    CONST_OPERATOR_EXPRS,
+)
+from loxpy.statement import (
+    Stmt,
+    BlockStmt,
+    ClassStmt,
+    ExprStmt,
+    FuncStmt,
+    IfStmt,
+    PrintStmt,
+    ReturnStmt,
+    VarStmt,
+    WhileStmt,
+)
+from loxpy.value import is_equal
+
+
+# Returned when an expression can't be folded
+NOT_CONSTANT = object()
+
+
+def is_true(value: Any) -> bool:
+    return not (value is None or value is False)
+
+
+def make_literal(value: Any, where: Token) -> LiteralExpr:
+    """
+    LiteralExpr for value, with the position of the token where
+    """
+    if value is True:
+        token = Token(TokenType.TRUE, "true", True, where.line, where.col)
+    elif value is False:
+        token = Token(TokenType.FALSE, "false", False, where.line, where.col)
+    elif value is None:
+        token = Token(TokenType.NIL, "nil", None, where.line, where.col)
+    elif type(value) is float:
+        token = Token(TokenType.NUMBER, repr(value), value, where.line, where.col)
+    else:
+        token = Token(TokenType.STRING, f'"{value}"', value, where.line, where.col)
+
+    return LiteralExpr(token)
+
+
+def fold_unary(op: TokenType, right: Any) -> Any:
+    if op == TokenType.BANG:
+        return not is_true(right)
+    if op == TokenType.MINUS and type(right) is float:
+        return -right
+
+    return NOT_CONSTANT
+
+
+def fold_binary(op: TokenType, left: Any, right: Any) -> Any:
+    if op == TokenType.EQUAL_EQUAL:
+        return is_equal(left, right)
+    if op == TokenType.BANG_EQUAL:
+        return not is_equal(left, right)
+
+    if op == TokenType.PLUS and type(left) is str and type(right) is str:
+        return left + right
+
+    if type(left) is not float or type(right) is not float:
+        return NOT_CONSTANT
+
+    if op == TokenType.PLUS:
+        result = left + right
+    elif op == TokenType.MINUS:
+        result = left - right
+    elif op == TokenType.STAR:
+        result = left * right
+    elif op == TokenType.SLASH:
+        if right == 0.0:
+            return NOT_CONSTANT
+        result = left / right
+    elif op == TokenType.GREATER:
+        return left > right
+    elif op == TokenType.GREATER_EQUAL:
+        return left >= right
+    elif op == TokenType.LESS:
+        return left < right
+    elif op == TokenType.LESS_EQUAL:
+        return left <= right
+    else:
+        return NOT_CONSTANT
+
+    return result if isfinite(result) else NOT_CONSTANT
+
+
+class Optimizer(Visitor):
+    """
+    Optimizer
+    Each visit method returns the node that should replace the one
+    visited. Nodes are changed in place where possible. Statements can be
+    replaced by None, meaning that they should be removed.
+    """
+
+    def __init__(self) -> None:
+        # Counts of what has been changed
+        self.folded = 0
+        self.pruned = 0
+
+    def _expr(self, expr: Expr) -> Expr:
+        return expr.accept(self)
+
+    def _stmt(self, stmt: Stmt) -> Optional[Stmt]:
+        return stmt.accept(self)
+
+    def _body(self, stmt: Stmt) -> Stmt:
+        # A statement that has to be there, eg: the body of a loop
+        new_stmt = self._stmt(stmt)
+        return new_stmt if new_stmt is not None else BlockStmt([])
+
+    def _stmts(self, stmts: Sequence[Stmt]) -> List[Stmt]:
+        new_stmts = []
+        for stmt in stmts:
+            new_stmt = self._stmt(stmt)
+            if new_stmt is not None:
+                new_stmts.append(new_stmt)
+
+        return new_stmts
+
+    # ==== Expression visitors ====
+    def visit_assignment_expr(self, expr: AssignmentExpr) -> Expr:
+        expr.value = self._expr(expr.value)
+        return expr
+
+    def visit_binary_expr(self, expr: BinaryExpr) -> Expr:
+        expr.left = self._expr(expr.left)
+        expr.right = self._expr(expr.right)
+
+        if type(expr.left) is LiteralExpr and type(expr.right) is LiteralExpr:
+            value = fold_binary(expr.op.token_type, expr.left.value.literal, expr.right.value.literal)
+            if value is not NOT_CONSTANT:
+                self.folded += 1
+                return make_literal(value, expr.op)
+
+        return expr
+
+    def visit_call_expr(self, expr: CallExpr) -> Expr:
+        expr.callee = self._expr(expr.callee)
+        expr.arguments = tuple(self._expr(arg) for arg in expr.arguments)
+        return expr
+
+    def visit_get_expr(self, expr: GetExpr) -> Expr:
+        expr.obj = self._expr(expr.obj)
+        return expr
+
+    def visit_grouping_expr(self, expr: GroupingExpr) -> Expr:
+        return self._expr(expr.expression)
+
+    def visit_literal_expr(self, expr: LiteralExpr) -> Expr:
+        return expr
+
+    def visit_logical_expr(self, expr: LogicalExpr) -> Expr:
+        expr.left = self._expr(expr.left)
+        expr.right = self._expr(expr.right)
+
+        # The left side decides whether the right side is evaluated at all
+        if type(expr.left) is LiteralExpr:
+            self.folded += 1
+            left_true = is_true(expr.left.value.literal)
+            if left_true == (expr.op.token_type == TokenType.OR):
+                return expr.left
+            return expr.right
+
+        return expr
+
+    def visit_set_expr(self, expr: SetExpr) -> Expr:
+        expr.obj = self._expr(expr.obj)
+        expr.value = self._expr(expr.value)
+        return expr
+
+    def visit_super_expr(self, expr: SuperExpr) -> Expr:
+        return expr
+
+    def visit_this_expr(self, expr: ThisExpr) -> Expr:
+        return expr
+
+    def visit_unary_expr(self, expr: UnaryExpr) -> Expr:
+        expr.right = self._expr(expr.right)
+
+        if type(expr.right) is LiteralExpr:
+            value = fold_unary(expr.op.token_type, expr.right.value.literal)
+            if value is not NOT_CONSTANT:
+                self.folded += 1
+                return make_literal(value, expr.op)
+
+        return expr
+
+    def visit_var_expr(self, expr: VarExpr) -> Expr:
+        return expr
+
+    # ==== Statement visitors ====
+    def visit_block_stmt(self, stmt: BlockStmt) -> Optional[Stmt]:
+        stmt.stmts = self._stmts(stmt.stmts)
+        return stmt
+
+    def visit_class_stmt(self, stmt: ClassStmt) -> Optional[Stmt]:
+        for method in stmt.methods:
+            self._stmt(method)
+        return stmt
+
+    def visit_expr_stmt(self, stmt: ExprStmt) -> Optional[Stmt]:
+        stmt.expr = self._expr(stmt.expr)
+        return stmt
+
+    def visit_func_stmt(self, stmt: FuncStmt) -> Optional[Stmt]:
+        stmt.body = self._stmts(stmt.body)
+        return stmt
+
+    def visit_if_stmt(self, stmt: IfStmt) -> Optional[Stmt]:
+        stmt.condition = self._expr(stmt.condition)
+
+        if type(stmt.condition) is LiteralExpr:
+            self.pruned += 1
+            if is_true(stmt.condition.value.literal):
+                return self._stmt(stmt.then_branch)
+            if stmt.else_branch is not None:
+                return self._stmt(stmt.else_branch)
+            return None
+
+        stmt.then_branch = self._body(stmt.then_branch)
+        if stmt.else_branch is not None:
+            stmt.else_branch = self._stmt(stmt.else_branch)
+
+        return stmt
+
+    def visit_print_stmt(self, stmt: PrintStmt) -> Optional[Stmt]:
+        stmt.expr = self._expr(stmt.expr)
+        return stmt
+
+    def visit_return_stmt(self, stmt: ReturnStmt) -> Optional[Stmt]:
+        if stmt.value is not None:
+            stmt.value = self._expr(stmt.value)
+        return stmt
+
+    def visit_var_stmt(self, stmt: VarStmt) -> Optional[Stmt]:
+        if stmt.initializer is not None:
+            stmt.initializer = self._expr(stmt.initializer)
+        return stmt
+
+    def visit_while_stmt(self, stmt: WhileStmt) -> Optional[Stmt]:
+        stmt.condition = self._expr(stmt.condition)
+        stmt.body = self._body(stmt.body)
+        return stmt
+
+    def optimize(self, stmts: Sequence[Stmt]) -> List[Stmt]:
+        return self._stmts(stmts)
+
+
+def is_pure(expr: Optional[Expr]) -> bool:
+    """
+    True if evaluating expr can't have side effects or raise an error
+    """
+    if expr is None or type(expr) is LiteralExpr or type(expr) is ThisExpr:
+        return True
+    if type(expr) is VarExpr:
+        # Reading a global that isn't defined is an error
+        return expr.depth is not None
+    if type(expr) is GroupingExpr:
+        return is_pure(expr.expression)
+    if type(expr) is LogicalExpr:
+        return is_pure(expr.left) and is_pure(expr.right)
+    if type(expr) is UnaryExpr:
+        return expr.op.token_type == TokenType.BANG and is_pure(expr.right)
+    if isinstance(expr, BinaryExpr):
+        return expr.op.token_type in (TokenType.EQUAL_EQUAL, TokenType.BANG_EQUAL) and \
+            is_pure(expr.left) and is_pure(expr.right)
+
+    return False
+
+
+def always_returns(stmt: Stmt) -> bool:
+    """
+    True if running stmt always ends in a return
+    """
+    if type(stmt) is ReturnStmt:
+        return True
+    if type(stmt) is BlockStmt:
+        return any(always_returns(s) for s in stmt.stmts)
+    if type(stmt) is IfStmt:
+        return stmt.else_branch is not None and \
+            always_returns(stmt.then_branch) and always_returns(stmt.else_branch)
+
+    return False
+
+
+def global_names(node: Any, names: Set[str]) -> None:
+    """
+    Add the names of all the globals that node reads or assigns to names
+    """
+    if type(node) is VarExpr or type(node) is AssignmentExpr:
+        if node.depth is None:
+            names.add(node.name.lexeme)
+
+    for f in fields(node):
+        value = getattr(node, f.name)
+        if isinstance(value, (Expr, Stmt)):
+            global_names(value, names)
+        elif isinstance(value, (list, tuple)):
+            for v in value:
+                if isinstance(v, (Expr, Stmt)):
+                    global_names(v, names)
+
+
+class DeadCodeEliminator:
+    """
+    DeadCodeEliminator
+    Removes statements that can never run or have no effect. This has to
+    run after the Resolver, which marks the locals that are never used.
+    """
+
+    def __init__(self, keep_globals: bool=False) -> None:
+        self.keep_globals = keep_globals
+        # Count of statements removed
+        self.removed = 0
+
+    def _body(self, stmt: Stmt) -> Stmt:
+        new_stmt = self._stmt(stmt)
+        return new_stmt if new_stmt is not None else BlockStmt([])
+
+    def _stmts(self, stmts: Sequence[Stmt]) -> List[Stmt]:
+        new_stmts: List[Stmt] = []
+        for n, stmt in enumerate(stmts):
+            new_stmt = self._stmt(stmt)
+            if new_stmt is None:
+                self.removed += 1
+                continue
+
+            new_stmts.append(new_stmt)
+            # Nothing after this can run
+            if always_returns(new_stmt):
+                self.removed += len(stmts) - n - 1
+                break
+
+        return new_stmts
+
+    def _stmt(self, stmt: Stmt) -> Optional[Stmt]:
+        """
+        Remove dead code from stmt, returning None if all of stmt can go
+        """
+        if type(stmt) is VarStmt:
+            if not stmt.used and is_pure(stmt.initializer):
+                return None
+        elif type(stmt) is FuncStmt:
+            if not stmt.used:
+                return None
+            stmt.body = self._stmts(stmt.body)
+        elif type(stmt) is ClassStmt:
+            for method in stmt.methods:
+                method.body = self._stmts(method.body)
+        elif type(stmt) is BlockStmt:
+            stmt.stmts = self._stmts(stmt.stmts)
+        elif type(stmt) is IfStmt:
+            stmt.then_branch = self._body(stmt.then_branch)
+            if stmt.else_branch is not None:
+                stmt.else_branch = self._stmt(stmt.else_branch)
+        elif type(stmt) is WhileStmt:
+            if type(stmt.condition) is LiteralExpr and not is_true(stmt.condition.value.literal):
+                return None
+            stmt.body = self._body(stmt.body)
+        elif type(stmt) is ExprStmt:
+            if is_pure(stmt.expr):
+                return None
+
+        return stmt
+
+    def _remove_globals(self, stmts: List[Stmt]) -> List[Stmt]:
+        # Removing one declaration can leave others unused, so keep going
+        # until nothing changes
+        while True:
+            used: List[Set[str]] = [set() for _ in stmts]
+            for stmt, names in zip(stmts, used):
+                global_names(stmt, names)
+
+            new_stmts = []
+            for n, stmt in enumerate(stmts):
+                if type(stmt) is FuncStmt or (type(stmt) is VarStmt and is_pure(stmt.initializer)):
+                    # A function that only calls itself is still unused
+                    name = stmt.name.lexeme
+                    if not any(name in names for m, names in enumerate(used) if m != n):
+                        continue
+                new_stmts.append(stmt)
+
+            if len(new_stmts) == len(stmts):
+                return stmts
+            self.removed += len(stmts) - len(new_stmts)
+            stmts = new_stmts
+
+    def eliminate(self, stmts: Sequence[Stmt]) -> List[Stmt]:
+        new_stmts = self._stmts(stmts)
+        if not self.keep_globals:
+            new_stmts = self._remove_globals(new_stmts)
+
+        return new_stmts
+
+
+def specialize_binary(expr: BinaryExpr) -> BinaryExpr:
+    """
+    The specialised subclass of BinaryExpr for expr
+    """
+    op_type = expr.op.token_type
+    left = expr.left
+    right = expr.right
+
+    if op_type in CONST_OPERATOR_EXPRS and type(right) is LiteralExpr and type(right.value.literal) is float:
+        return CONST_OPERATOR_EXPRS[op_type](expr.op, left, right)
+
+    if op_type == TokenType.LESS and type(left) is VarExpr and left.depth is not None and \
+            type(right) is VarExpr and right.depth is not None:
+        return LessLocalsExpr(expr.op, left, right)
+
+    return OPERATOR_EXPRS[op_type](expr.op, left, right)
+
+
+def _specialize_node(node: Any) -> Any:
+    for f in fields(node):
+        value = getattr(node, f.name)
+        if isinstance(value, (Expr, Stmt)):
+            setattr(node, f.name, _specialize_node(value))
+        elif isinstance(value, (list, tuple)) and any(isinstance(v, (Expr, Stmt)) for v in value):
+            setattr(node, f.name, type(value)(_specialize_node(v) for v in value))
+
+    if type(node) is BinaryExpr:
+        return specialize_binary(node)
+
+    return node
+
+
+def specialize(stmts: Sequence[Stmt]) -> List[Stmt]:
+    """
+    Replace every BinaryExpr in a resolved program with the subclass for
+    its operator. This has to be done after resolving, since some of the
+    subclasses are only for locals.
+    """
+    return [_specialize_node(stmt) for stmt in stmts]
+
+
+def format_tree(stmts: Sequence[Stmt]) -> str:
+    """
+    Indented listing of a tree, one node per line. Tokens are shown by
+    their lexeme next to the node that holds them.
+    """
+    lines: List[str] = []
+
+    def walk(node: Any, indent: int, label: str) -> None:
+        tokens = []
+        children = []
+        for f in fields(node):
+            value = getattr(node, f.name)
+            if isinstance(value, Token):
+                tokens.append(value.lexeme)
+            elif isinstance(value, (list, tuple)):
+                for n, v in enumerate(value):
+                    if isinstance(v, Token):
+                        tokens.append(v.lexeme)
+                    else:
+                        children.append((f"{f.name}[{n}]", v))
+            elif is_dataclass(value):
+                children.append((f.name, value))
+
+        lines.append(f"{'  ' * indent}{label}{type(node).__name__} {' '.join(tokens)}".rstrip())
+        for name, child in children:
+            walk(child, indent + 1, f"{name}: ")
+
+    for stmt in stmts:
+        walk(stmt, 0, "")
+
+    return "\n".join(lines)
+
+
+def optimize(stmts: Sequence[Stmt], dump: Optional[TextIO]=None, keep_globals: bool=False) -> List[Stmt]:
+    """
+    Optimize a resolved program. If dump is given then the trees before
+    and after are written to it. Set keep_globals if more code may run
+    later with the same globals, eg: in the REPL.
+    """
+    if dump is not None:
+        print("==== Before optimizing ====", file=dump)
+        print(format_tree(stmts), file=dump)
+
+    optimizer = Optimizer()
+    stmts = optimizer.optimize(stmts)
+    eliminator = DeadCodeEliminator(keep_globals)
+    stmts = eliminator.eliminate(stmts)
+
+    if dump is not None:
+        print(
+            f"==== After optimizing ({optimizer.folded} folded, {optimizer.pruned} pruned, "
+            f"{eliminator.removed} removed) ====",
+            file=dump
+        )
+        print(format_tree(stmts), file=dump)
+
+    return stmts
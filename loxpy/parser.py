@@ -4,7 +4,7 @@ PARSER
 Implements parsing for the Lox language.
 """
 
-from typing import List, Sequence, Optional, Union
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Sequence, Optional, Tuple, Union
 from loxpy.expr import (
     Expr,
     AssignmentExpr,
@@ -32,22 +32,110 @@ from loxpy.statement import (
     VarStmt, 
     WhileStmt
 )
-from loxpy.token import Token, TokenType
+from loxpy.token import Token, TokenType, TOKEN_CODES, NUM_TOKEN_CODES, token_set
 from loxpy.error import LoxParseError
 
 
 #E = TypeVar("E", covariant=True, bound=Expr | BinaryExpr | LiteralExpr | UnaryExpr)
 
 
+# Precedence of each level of the expression grammar, from the loosest
+# binding to the tightest
+PREC_ASSIGNMENT = 1
+PREC_OR         = 2
+PREC_AND        = 3
+PREC_EQUALITY   = 4
+PREC_COMPARISON = 5
+PREC_TERM       = 6
+PREC_FACTOR     = 7
+PREC_UNARY      = 8
+PREC_CALL       = 9
+
+EOF_CODE = TOKEN_CODES[TokenType.LOX_EOF]
+
+
+class Tokens:
+    """
+    Tokens
+    Bitsets of the token types that the parser looks for
+    """
+    LEFT_PAREN  = token_set(TokenType.LEFT_PAREN)
+    RIGHT_PAREN = token_set(TokenType.RIGHT_PAREN)
+    LEFT_BRACE  = token_set(TokenType.LEFT_BRACE)
+    RIGHT_BRACE = token_set(TokenType.RIGHT_BRACE)
+    COMMA       = token_set(TokenType.COMMA)
+    DOT         = token_set(TokenType.DOT)
+    SEMICOLON   = token_set(TokenType.SEMICOLON)
+    EQUAL       = token_set(TokenType.EQUAL)
+    LESS        = token_set(TokenType.LESS)
+    IDENTIFIER  = token_set(TokenType.IDENTIFIER)
+    AND         = token_set(TokenType.AND)
+    OR          = token_set(TokenType.OR)
+    CLASS       = token_set(TokenType.CLASS)
+    ELSE        = token_set(TokenType.ELSE)
+    FOR         = token_set(TokenType.FOR)
+    FUNC        = token_set(TokenType.FUNC)
+    IF          = token_set(TokenType.IF)
+    PRINT       = token_set(TokenType.PRINT)
+    RETURN      = token_set(TokenType.RETURN)
+    SUPER       = token_set(TokenType.SUPER)
+    THIS        = token_set(TokenType.THIS)
+    VAR         = token_set(TokenType.VAR)
+    WHILE       = token_set(TokenType.WHILE)
+
+    # Tokens that start a statement, where parsing can carry on after an error
+    STATEMENT_START = token_set(
+        TokenType.CLASS,
+        TokenType.FUNC,
+        TokenType.VAR,
+        TokenType.FOR,
+        TokenType.IF,
+        TokenType.WHILE,
+        TokenType.PRINT,
+        TokenType.RETURN,
+    )
+
+
+def code_table(table: Dict[TokenType, Any]) -> List[Any]:
+    """
+    List indexed by token code, holding the value in table for the token
+    type with that code, or None
+    """
+    codes: List[Any] = [None] * NUM_TOKEN_CODES
+    for token_type, value in table.items():
+        codes[TOKEN_CODES[token_type]] = value
+
+    return codes
+
+
 class Parser:
-    def __init__(self, token_list: Sequence[Token]) -> None:
-        if type(token_list) is not list:
-            raise TypeError('token_list must be a list')
-        self.token_list: Sequence[Token] = token_list
+    """
+    Parser
+    Recursive descent parser for statements, with a Pratt parser for
+    expressions. The tokens can be a list from Scanner.scan() 
+    or any other iterable such as Scanner.iter_tokens(), in which case they 
+    are pulled one at a time as the parser needs them. Only the current and 
+    previous tokens are held by the parser.
+    """
+
+    def __init__(self, tokens: Iterable[Token]) -> None:
+        if not isinstance(tokens, Iterable) or isinstance(tokens, str):
+            raise TypeError('tokens must be an iterable of Token')
+        # Kept only so that __str__ can show every token
+        self.token_list: Optional[List[Token]] = tokens if type(tokens) is list else None
+        self.tokens    : Iterator[Token] = iter(tokens)
         self.current   : int  = 0
         self.max_args = 255
 
+        self.prev_token: Optional[Token] = None
+        self.cur_token : Token
+        self.cur_code  : int
+        self._next_token()
+
     def __str__(self) -> str:
+        if self.token_list is None:
+            return '%4d: %s\n' % (self.current, str(self.cur_token))
+
         s = []
         for n, t in enumerate(self.token_list):
             s.append('%4d: %s\n' % (n, str(t)))
@@ -55,37 +143,44 @@ class Parser:
         return ''.join(s)
 
     # ==== Methods for moving through source ==== #
+    # Lookahead is done with the code of the current token (cur_code), see
+    # Tokens. The methods that check for tokens take a bitset from Tokens.
+    def _next_token(self) -> None:
+        token = next(self.tokens, None)
+        if token is None:
+            # Ran out of tokens without an EOF
+            line = self.prev_token.line if self.prev_token is not None else 1
+            token = Token(TokenType.LOX_EOF, "", None, line)
+
+        self.cur_token = token
+        # Same as TOKEN_CODES[token.token_type], without hashing the TokenType
+        self.cur_code = token.token_type._value_
+
     def _advance(self) -> Token:
-        if self._at_end() is False:
+        if self.cur_code != EOF_CODE:
             self.current += 1
-        return self._previous()
+            self.prev_token = self.cur_token
+            self._next_token()
+        return self.prev_token
 
     def _at_end(self) -> bool:
-        cur_token = self._peek()
-        if cur_token.token_type == TokenType.LOX_EOF:
-            return True
-        return False
+        return self.cur_code == EOF_CODE
 
-    def _check(self, token_type: TokenType) -> bool:
-        if self._at_end():
-            return False
+    def _check(self, token_types: int) -> bool:
+        # EOF is never in token_types
+        return (1 << self.cur_code) & token_types != 0
 
-        cur_token = self._peek()
-        if cur_token.token_type == token_type:
-            return True
-        return False
-
-    def _consume(self, token_type: TokenType, msg:str) -> Token:
-        if self._check(token_type):
+    def _consume(self, token_types: int, msg:str) -> Token:
+        if (1 << self.cur_code) & token_types:
             return self._advance()
 
-        raise LoxParseError(self._peek(), msg)
+        raise LoxParseError(self.cur_token, msg)
 
     def _peek(self) -> Token:
-        return self.token_list[self.current]
+        return self.cur_token
 
     def _previous(self) -> Token:
-        return self.token_list[self.current - 1]
+        return self.prev_token
 
     def _synchronise(self) -> None:
         self._advance()
@@ -94,130 +189,174 @@ class Parser:
             if self._previous().token_type == TokenType.SEMICOLON:
                 return
 
-            adv = (
-                TokenType.CLASS,
-                TokenType.FUNC,
-                TokenType.VAR,
-                TokenType.FOR,
-                TokenType.IF,
-                TokenType.WHILE,
-                TokenType.PRINT,
-                TokenType.RETURN,
-            )
-            if self._peek().token_type in adv:
+            if self._check(Tokens.STATEMENT_START):
                 return
 
             self._advance()
 
-    def _match(self, token_types: Sequence[TokenType]) -> bool:
-        for t in token_types:
-            if self._check(t):
-                self._advance()
-                return True
+    def _match(self, token_types: int) -> bool:
+        if (1 << self.cur_code) & token_types:
+            self._advance()
+            return True
 
         return False
 
     # ==== Statements =====
     def _expression_statement(self) -> ExprStmt:
         expr = self._expression()
-        self._consume(TokenType.SEMICOLON, "Expect ';' after expression")
+        self._consume(Tokens.SEMICOLON, "Expect ';' after expression")
 
         return ExprStmt(expr)
 
-    # ==== Productions 
-    def _expression(self) -> Expr:
-        return self._assignment()
+    # ==== Expressions ==== #
+    # Expressions are parsed by precedence climbing (a Pratt parser). Each
+    # token that can start an expression has a prefix method, and each
+    # token that can follow one has an infix method and a precedence. See
+    # the _PREFIX and _INFIX tables at the end of the class, which are
+    # indexed by token code.
+    def _expression(self, precedence: int=PREC_ASSIGNMENT) -> Expr:
+        """
+        Parse an expression made of operators that bind at least as
+        tightly as precedence
+        """
+        token = self.cur_token
+        prefix = self._PREFIX[self.cur_code]
+        if prefix is None:
+            raise LoxParseError(token, "Expect expression")
+        self._advance()
+        expr = prefix(self, token)
+
+        infix_table = self._INFIX
+        while True:
+            infix = infix_table[self.cur_code]
+            if infix is None or infix[0] < precedence:
+                return expr
+            token = self._advance()
+            expr = infix[1](self, expr, token, infix[0])
+
+    # Prefix methods are passed the token that they start with, which has
+    # already been consumed
+    def _literal(self, token: Token) -> Expr:
+        # The scanner has already converted the literal value of these tokens
+        return LiteralExpr(token)
+
+    def _super(self, keyword: Token) -> Expr:
+        self._consume(Tokens.DOT, "Expect '.' after 'super'")
+        method = self._consume(Tokens.IDENTIFIER, "Expect superclass method name")
+        return SuperExpr(keyword, method)
+
+    def _this(self, keyword: Token) -> Expr:
+        return ThisExpr(keyword)
+
+    def _variable(self, name: Token) -> Expr:
+        return VarExpr(name)
+
+    def _grouping(self, paren: Token) -> Expr:
+        expr = self._expression()
+        self._consume(Tokens.RIGHT_PAREN, "Expect ')' after expression")
+        return GroupingExpr(expr)
 
-    def _assignment(self) -> Expr:
-        expr = self._or()
+    def _unary_op(self, op: Token) -> Expr:
+        return UnaryExpr(op, self._expression(PREC_UNARY))
 
-        if self._match([TokenType.EQUAL]):
-            equals = self._previous()
-            value = self._assignment()
+    # Infix methods are passed the expression to their left, their
+    # (consumed) operator token and its precedence
+    def _binary_op(self, left: Expr, op: Token, precedence: int) -> Expr:
+        # All binary operators are left associative, so the right operand
+        # can only hold operators that bind more tightly
+        right = self._expression(precedence + 1)
+        return BinaryExpr(op, left, right)
 
-            if isinstance(expr, VarExpr):
-                name = expr.name
-                return AssignmentExpr(name, value)
-            elif isinstance(expr, GetExpr):    # TODO: what to tell linter here?
-                return SetExpr(expr.obj, expr.name, value)
+    def _logical_op(self, left: Expr, op: Token, precedence: int) -> Expr:
+        right = self._expression(precedence + 1)
+        return LogicalExpr(op, left, right)
 
-            raise LoxParseError(equals, "Invalid assignment target")
+    def _call_args(self, callee: Expr, paren: Token, precedence: int) -> Expr:
+        return self._finish_call(callee)
 
-        return expr
+    def _property(self, obj: Expr, dot: Token, precedence: int) -> Expr:
+        name = self._consume(Tokens.IDENTIFIER, "Expect property name after '.'")
+        return GetExpr(obj, name)
 
-    def _and(self) -> Expr:
-        expr = self._equality()
+    def _assign(self, target: Expr, equals: Token, precedence: int) -> Expr:
+        # Assignment is right associative
+        value = self._expression(PREC_ASSIGNMENT)
 
-        while self._match([TokenType.AND]):
-            op = self._previous()
-            right = self._equality()
-            expr = LogicalExpr(op, expr, right)
+        if isinstance(target, VarExpr):
+            return AssignmentExpr(target.name, value)
+        elif isinstance(target, GetExpr):
+            return SetExpr(target.obj, target.name, value)
 
-        return expr
+        raise LoxParseError(equals, "Invalid assignment target")
 
-    def _or(self) -> Expr:
-        expr = self._and()
+    def _finish_call(self, callee: Expr) -> Expr:
+        args = []
 
-        while self._match([TokenType.OR]):
-            op = self._previous()
-            right = self._and()
-            expr = LogicalExpr(op, expr, right)
+        # If the next token is ')' then no need to parse arguments
+        if not self._check(Tokens.RIGHT_PAREN):
+            args.append(self._expression())
+            while self._match(Tokens.COMMA):
+                if len(args) >= self.max_args:
+                    raise LoxParseError(self._peek(), f"Can't have more than {self.max_args} arguments to function")
+                args.append(self._expression())
 
-        return expr
+        paren = self._consume(Tokens.RIGHT_PAREN, "Expect ')' after arguments")
+
+        return CallExpr(callee, paren, tuple(args))
 
     def _function(self, kind: str) -> FuncStmt:
-        name = self._consume(TokenType.IDENTIFIER, f"Expect {kind} name")
-        self._consume(TokenType.LEFT_PAREN, f"Expect '(' after {kind} name")
+        name = self._consume(Tokens.IDENTIFIER, f"Expect {kind} name")
+        self._consume(Tokens.LEFT_PAREN, f"Expect '(' after {kind} name")
         params = []
 
         # Parse parameters
-        if not self._check(TokenType.RIGHT_PAREN):
-            params.append(self._consume(TokenType.IDENTIFIER, "Expect parameter name"))
+        if not self._check(Tokens.RIGHT_PAREN):
+            params.append(self._consume(Tokens.IDENTIFIER, "Expect parameter name"))
 
-            while self._match([TokenType.COMMA]):
+            while self._match(Tokens.COMMA):
                 if len(params) >= self.max_args:
                     raise LoxParseError(self._peek(), f"[{kind}] can't have more than {self.max_args} parameters")
-                params.append(self._consume(TokenType.IDENTIFIER, "Expect parameter name"))
+                params.append(self._consume(Tokens.IDENTIFIER, "Expect parameter name"))
 
-        self._consume(TokenType.RIGHT_PAREN, f"Expect ')' after {kind} parameter list")
+        self._consume(Tokens.RIGHT_PAREN, f"Expect ')' after {kind} parameter list")
 
         # Now parse the function body 
         # Stupid workaround since I can't get a '{' into an f-string in a way that 
         # my tool setup will accept.
         LEFT_BRACE = "{"        
-        self._consume(TokenType.LEFT_BRACE, f"Expect '{LEFT_BRACE}' before {kind} body")
+        self._consume(Tokens.LEFT_BRACE, f"Expect '{LEFT_BRACE}' before {kind} body")
         body = self._block_statement()
 
         return FuncStmt(name, params, body)
 
     def _class_decl(self) -> Stmt:
-        name = self._consume(TokenType.IDENTIFIER, "Expect class name")
+        name = self._consume(Tokens.IDENTIFIER, "Expect class name")
 
         # Consume the superclass, if any
-        if self._match([TokenType.LESS]):
-            self._consume(TokenType.IDENTIFIER, "Expect superclass name")
+        if self._match(Tokens.LESS):
+            self._consume(Tokens.IDENTIFIER, "Expect superclass name")
             superclass = VarExpr(self._previous())
         else:
             superclass = None
 
-        self._consume(TokenType.LEFT_BRACE, "Expect '{' before class body")
+        self._consume(Tokens.LEFT_BRACE, "Expect '{' before class body")
 
         methods = []
-        while not self._check(TokenType.RIGHT_BRACE) and not self._at_end():
+        while not self._check(Tokens.RIGHT_BRACE) and not self._at_end():
             methods.append(self._function("method"))
 
-        self._consume(TokenType.RIGHT_BRACE, "Expect '}' after class body")
+        self._consume(Tokens.RIGHT_BRACE, "Expect '}' after class body")
 
         return ClassStmt(name, superclass, methods)
 
     def _declaration(self) -> Stmt:
         try:
-            if self._match([TokenType.CLASS]):
+            if self._match(Tokens.CLASS):
                 return self._class_decl()
-            if self._match([TokenType.FUNC]):
+            if self._match(Tokens.FUNC):
                 return self._function("function")
 
-            if self._match([TokenType.VAR]):
+            if self._match(Tokens.VAR):
                 return self._var_declaration()
 
             return self._statement()
@@ -226,154 +365,25 @@ class Parser:
             raise e
 
     def _var_declaration(self) -> Stmt:
-        name = self._consume(TokenType.IDENTIFIER, "Expect variable name")
+        name = self._consume(Tokens.IDENTIFIER, "Expect variable name")
 
-        if self._match([TokenType.EQUAL]):
+        if self._match(Tokens.EQUAL):
             initializer = self._expression()
         else:
             initializer = None
 
-        self._consume(TokenType.SEMICOLON, "Expect ';' after variable declaration")
+        self._consume(Tokens.SEMICOLON, "Expect ';' after variable declaration")
 
         return VarStmt(name, initializer)
 
 
-    def _equality(self) -> Expr:
-        expr = self._comparison()
-
-        eq_tokens = [TokenType.BANG_EQUAL, TokenType.EQUAL_EQUAL]
-        while self._match(eq_tokens):
-            operator = self._previous()
-            right = self._comparison()
-            expr = BinaryExpr(operator, expr, right)
-
-        return expr
-
-    def _comparison(self) -> Expr:
-        expr = self._term()
-        comp_tokens = [
-            TokenType.GREATER, 
-            TokenType.GREATER_EQUAL,
-            TokenType.LESS, 
-            TokenType.LESS_EQUAL
-        ]
-
-        while self._match(comp_tokens):
-            operator = self._previous()
-            right    = self._term()
-            expr     = BinaryExpr(operator, expr, right)
-
-        return expr
-
-    def _term(self) -> Expr:
-        expr = self._factor()
-        add_tokens = [TokenType.MINUS, TokenType.PLUS]
-
-        while self._match(add_tokens):
-            operator = self._previous()
-            right    = self._factor()
-            expr     = BinaryExpr(operator, expr, right)
-
-        return expr
-
-    def _factor(self) -> Expr:
-        expr = self._unary()
-        mul_tokens = [TokenType.SLASH, TokenType.STAR]
-
-        while self._match(mul_tokens):
-            operator = self._previous()
-            right = self._unary()
-            expr = BinaryExpr(operator, expr, right)
-
-        return expr
-
-    def _unary(self) -> Expr:
-        un_tokens = [TokenType.BANG, TokenType.MINUS]
-        if self._match(un_tokens):
-            operator = self._previous()
-            right = self._unary()
-            expr = UnaryExpr(operator, right)
-            return expr
-
-        return self._call()
-
-    def _finish_call(self, callee: Expr) -> Expr:
-        args = []
-
-        # If the next token is ')' then no need to parse arguments
-        if not self._check(TokenType.RIGHT_PAREN):
-            args.append(self._expression())
-            while self._match([TokenType.COMMA]):
-                if len(args) >= self.max_args:
-                    raise LoxParseError(self._peek(), f"Can't have more than {self.max_args} arguments to function")
-                args.append(self._expression())
-
-        paren = self._consume(TokenType.RIGHT_PAREN, "Expect ')' after arguments")
-
-        return CallExpr(callee, paren, tuple(args))
-
-    def _call(self) -> Expr:
-        expr = self._primary()
-
-        while True:
-            if self._match([TokenType.LEFT_PAREN]):
-                expr = self._finish_call(expr)
-            elif self._match([TokenType.DOT]):
-                name = self._consume(TokenType.IDENTIFIER, "Expect property name after '.'")
-                expr = GetExpr(expr, name)
-            else:
-                break
-
-        return expr
-
-    def _primary(self) -> Expr:
-        def token_copy(t: TokenType) -> Token:
-            return Token(
-                t, 
-                self.token_list[-1].lexeme, 
-                self.token_list[-1].literal, 
-                self.token_list[-1].line, 
-                self.token_list[-1].col
-            )
-
-        if self._match([TokenType.FALSE]):
-            return LiteralExpr(token_copy(TokenType.FALSE))
-
-        if self._match([TokenType.TRUE]):
-            return LiteralExpr(token_copy(TokenType.TRUE))
-
-        if self._match([TokenType.NIL]):
-            return LiteralExpr(token_copy(TokenType.NIL))
-
-        if self._match([TokenType.NUMBER, TokenType.STRING]):
-            return LiteralExpr(self._previous())
-
-        if self._match([TokenType.SUPER]):
-            keyword = self._previous()
-            self._consume(TokenType.DOT, "Expect '.' after 'super'")
-            method = self._consume(TokenType.IDENTIFIER, "Expect superclass method name")
-            return SuperExpr(keyword, method)
-
-        if self._match([TokenType.THIS]):
-            return ThisExpr(self._previous())
-
-        if self._match([TokenType.IDENTIFIER]):
-            return VarExpr(self._previous())
-
-        if self._match([TokenType.LEFT_PAREN]):
-            expr = self._expression()
-            self._consume(TokenType.RIGHT_PAREN, "Expect ')' after expression")
-            return GroupingExpr(expr)
-
-        return LiteralExpr(token_copy(self.token_list[-1].token_type))      # unreachable
-
     def _if_statement(self) -> IfStmt:
-        self._consume(TokenType.LEFT_PAREN, "Expect '(' after if")
+        self._consume(Tokens.LEFT_PAREN, "Expect '(' after if")
         cond = self._expression()
-        self._consume(TokenType.RIGHT_PAREN, "Expect ')' after if condition")
+        self._consume(Tokens.RIGHT_PAREN, "Expect ')' after if condition")
 
         then_branch = self._statement()
-        if self._match([TokenType.ELSE]):
+        if self._match(Tokens.ELSE):
             else_branch = self._statement()
         else:
             else_branch = None
@@ -381,28 +391,28 @@ class Parser:
         return IfStmt(cond, then_branch, else_branch)
 
     def _for_statement(self) -> Stmt:
-        self._consume(TokenType.LEFT_PAREN, "Expect '(' after 'for'")
+        self._consume(Tokens.LEFT_PAREN, "Expect '(' after 'for'")
 
         # Format of the for statement is 
         # for(init; cond; increment) { body }
-        if self._match([TokenType.SEMICOLON]):
+        if self._match(Tokens.SEMICOLON):
             init = None
-        elif self._match([TokenType.VAR]):
+        elif self._match(Tokens.VAR):
             init = self._var_declaration()
         else:
             init = self._expr_statement()
 
-        if not self._check(TokenType.SEMICOLON):
+        if not self._check(Tokens.SEMICOLON):
             cond = self._expression()
         else:
             cond = None
-        self._consume(TokenType.SEMICOLON, "Expect ';' after for condition")
+        self._consume(Tokens.SEMICOLON, "Expect ';' after for condition")
 
-        if not self._check(TokenType.RIGHT_PAREN):
+        if not self._check(Tokens.RIGHT_PAREN):
             increment = self._expression()
         else:
             increment = None
-        self._consume(TokenType.RIGHT_PAREN, "Expect ')' after for increment")
+        self._consume(Tokens.RIGHT_PAREN, "Expect ')' after for increment")
 
         body = self._statement()
 
@@ -413,7 +423,7 @@ class Parser:
         # resulting in an infinite loop. (Future work, add break?)
         if not cond:
             cond = LiteralExpr(
-                Token(TokenType.TRUE, "true", "true", self.token_list[self.current].line)
+                Token(TokenType.TRUE, "true", True, self._peek().line)
             )
 
         body = WhileStmt(cond, body)
@@ -426,25 +436,25 @@ class Parser:
 
     def _print_statement(self) -> PrintStmt:
         value = self._expression()
-        self._consume(TokenType.SEMICOLON, "Expect ';' after value")
+        self._consume(Tokens.SEMICOLON, "Expect ';' after value")
 
         return PrintStmt(value)
 
     def _return_statement(self) -> ReturnStmt:
         keyword = self._previous()
-        if not self._check(TokenType.SEMICOLON):
+        if not self._check(Tokens.SEMICOLON):
             value = self._expression()
         else:
             value = None
 
-        self._consume(TokenType.SEMICOLON, "Expect ';' after return")
+        self._consume(Tokens.SEMICOLON, "Expect ';' after return")
 
         return ReturnStmt(keyword, value)
 
     def _while_statement(self) -> WhileStmt:
-        self._consume(TokenType.LEFT_PAREN, "Expect '(' after 'while'")
+        self._consume(Tokens.LEFT_PAREN, "Expect '(' after 'while'")
         cond = self._expression()
-        self._consume(TokenType.RIGHT_PAREN, "Expect ')' after condition")
+        self._consume(Tokens.RIGHT_PAREN, "Expect ')' after condition")
         body = self._statement()
 
         return WhileStmt(cond, body)
@@ -452,36 +462,36 @@ class Parser:
     def _block_statement(self) -> List[Stmt]:
         stmts = []
         
-        while not self._check(TokenType.RIGHT_BRACE) and not self._at_end():
+        while not self._check(Tokens.RIGHT_BRACE) and not self._at_end():
             stmts.append(self._declaration())
-        self._consume(TokenType.RIGHT_BRACE, "Expect '}' after block")
+        self._consume(Tokens.RIGHT_BRACE, "Expect '}' after block")
 
         return stmts
 
 
     def _expr_statement(self) -> ExprStmt:
         value = self._expression()
-        self._consume(TokenType.SEMICOLON, "Expect ';' after value")
+        self._consume(Tokens.SEMICOLON, "Expect ';' after value")
 
         return ExprStmt(value)
 
     def _statement(self) -> Stmt:
-        if self._match([TokenType.FOR]):
+        if self._match(Tokens.FOR):
             return self._for_statement()
 
-        if self._match([TokenType.IF]):
+        if self._match(Tokens.IF):
             return self._if_statement()
 
-        if self._match([TokenType.PRINT]):
+        if self._match(Tokens.PRINT):
             return self._print_statement()
 
-        if self._match([TokenType.RETURN]):
+        if self._match(Tokens.RETURN):
             return self._return_statement()
 
-        if self._match([TokenType.WHILE]):
+        if self._match(Tokens.WHILE):
             return self._while_statement()
 
-        if self._match([TokenType.LEFT_BRACE]):
+        if self._match(Tokens.LEFT_BRACE):
             return BlockStmt(self._block_statement())
 
         return self._expr_statement()
@@ -498,3 +508,36 @@ class Parser:
 
         return statements
 
+    # Method for each token that can start an expression
+    _PREFIX: List[Optional[Callable[["Parser", Token], Expr]]] = code_table({
+        TokenType.FALSE      : _literal,
+        TokenType.TRUE       : _literal,
+        TokenType.NIL        : _literal,
+        TokenType.NUMBER     : _literal,
+        TokenType.STRING     : _literal,
+        TokenType.SUPER      : _super,
+        TokenType.THIS       : _this,
+        TokenType.IDENTIFIER : _variable,
+        TokenType.LEFT_PAREN : _grouping,
+        TokenType.BANG       : _unary_op,
+        TokenType.MINUS      : _unary_op,
+    })
+
+    # Precedence and method for each token that can follow an expression
+    _INFIX: List[Optional[Tuple[int, Callable[["Parser", Expr, Token, int], Expr]]]] = code_table({
+        TokenType.EQUAL         : (PREC_ASSIGNMENT, _assign),
+        TokenType.OR            : (PREC_OR, _logical_op),
+        TokenType.AND           : (PREC_AND, _logical_op),
+        TokenType.BANG_EQUAL    : (PREC_EQUALITY, _binary_op),
+        TokenType.EQUAL_EQUAL   : (PREC_EQUALITY, _binary_op),
+        TokenType.GREATER       : (PREC_COMPARISON, _binary_op),
+        TokenType.GREATER_EQUAL : (PREC_COMPARISON, _binary_op),
+        TokenType.LESS          : (PREC_COMPARISON, _binary_op),
+        TokenType.LESS_EQUAL    : (PREC_COMPARISON, _binary_op),
+        TokenType.MINUS         : (PREC_TERM, _binary_op),
+        TokenType.PLUS          : (PREC_TERM, _binary_op),
+        TokenType.SLASH         : (PREC_FACTOR, _binary_op),
+        TokenType.STAR          : (PREC_FACTOR, _binary_op),
+        TokenType.LEFT_PAREN    : (PREC_CALL, _call_args),
+        TokenType.DOT           : (PREC_CALL, _property),
+    })
@@ -0,0 +1,123 @@
+"""
+PROJECT
+
+Front end for programs made of several source files. Each file is
+scanned, parsed and resolved on its own, in parallel across a pool of
+worker processes, and sent back in the binary format from serialize.
+The files are then linked into one program by running their statements
+in the order the files were given, so they all share the same globals.
+
+Files can be resolved separately since the resolver only deals with
+locals, and globals are looked up by name when the program runs. A
+function in one file can use a global defined in a later one, as long
+as it isn't called until that file has run.
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from io import StringIO
+from typing import List, Optional, Sequence
+
+from loxpy.scanner import Scanner
+from loxpy.parser import Parser
+from loxpy.resolver import Resolver
+from loxpy.source import open_source
+from loxpy.serialize import dumps, loads
+from loxpy.statement import Stmt
+from loxpy.token import Token
+from loxpy.error import LoxParseError, LoxInterpreterError
+
+
+@dataclass
+class FrontEndResult:
+    """
+    FrontEndResult
+    The resolved program for one file as serialized bytes, or the error
+    that stopped it, along with anything the front end printed. Errors
+    are sent as their token and message since the exceptions themselves
+    can't all be pickled.
+    """
+    filename: str
+    data: Optional[bytes] = None
+    messages: str = ""
+    error_token: Optional[Token] = None
+    error_message: str = ""
+    # The error came from the parser rather than the resolver
+    parse_error: bool = False
+
+    def raise_error(self) -> None:
+        if self.error_token is None:
+            return
+
+        # Tokens only have a line number, so say which file it was in
+        message = f"{self.error_message} in {self.filename}"
+        if self.parse_error:
+            raise LoxParseError(self.error_token, message)
+        raise LoxInterpreterError(self.error_token, message)
+
+
+def front_end_file(filename: str) -> FrontEndResult:
+    """
+    Scan, parse and resolve filename
+    """
+    result = FrontEndResult(filename)
+    messages = StringIO()
+
+    try:
+        with open_source(filename) as source:
+            stmts = Parser(Scanner(source, output=messages).iter_tokens()).parse()
+        Resolver(output=messages).resolve(stmts)
+        result.data = dumps(stmts)
+    except LoxParseError as e:
+        result.error_token = e.token
+        result.error_message = e.message
+        result.parse_error = True
+    except LoxInterpreterError as e:
+        result.error_token = e.token
+        result.error_message = e.message
+
+    result.messages = messages.getvalue()
+
+    return result
+
+
+def front_end_files(filenames: Sequence[str], jobs: Optional[int]=None) -> List[FrontEndResult]:
+    """
+    Run the front end on each of filenames, using up to jobs worker
+    processes (by default one per CPU). The results are in the same order
+    as filenames.
+    """
+    if jobs is None:
+        jobs = os.cpu_count() or 1
+    jobs = min(jobs, len(filenames))
+
+    if jobs <= 1:
+        return [front_end_file(filename) for filename in filenames]
+
+    # Send files in batches to cut down on the messages between processes,
+    # but keep enough batches to even out files of different sizes
+    chunk_size = max(1, len(filenames) // (jobs * 4))
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        return list(pool.map(front_end_file, filenames, chunksize=chunk_size))
+
+
+def link(results: Sequence[FrontEndResult]) -> List[Stmt]:
+    """
+    Join the programs in results into one, printing their messages. If a
+    file had an error then that error is raised again here.
+    """
+    stmts: List[Stmt] = []
+    for result in results:
+        print(result.messages, end="")
+        result.raise_error()
+        stmts.extend(loads(result.data))     # type: ignore
+
+    return stmts
+
+
+def load_project(filenames: Sequence[str], jobs: Optional[int]=None) -> List[Stmt]:
+    """
+    Resolved program made from all of filenames, in order
+    """
+    return link(front_end_files(filenames, jobs))
@@ -1,13 +1,12 @@
 # Statically _resolve variables
 
-from typing import Deque, Dict, Sequence
+from typing import Deque, Dict, Optional, Sequence, TextIO, Union
 from collections import deque
 from enum import auto, Enum
 
 from loxpy.visitor import Visitor
 from loxpy.error import LoxInterpreterError
 from loxpy.token import Token
-from loxpy.interface import Interprets
 from loxpy.expr import (
     Expr, 
     BinaryExpr,
@@ -40,12 +39,16 @@ from loxpy.statement import (
 class FunctionType(Enum):
     NONE = auto()
     FUNCTION = auto()
-    CLASS = auto()
-    SUBCLASS = auto()
     INITIALIZER = auto()
     METHOD = auto()
 
 
+class ClassType(Enum):
+    NONE = auto()
+    CLASS = auto()
+    SUBCLASS = auto()
+
+
 # For resolving variables we only care about
 #
 # Block Statements - these introduce a new scope for any contained variables 
@@ -56,12 +59,15 @@ class FunctionType(Enum):
 
 
 class Resolver(Visitor):
-    def __init__(self, interp: Interprets):
+    def __init__(self, output: Optional[TextIO]=None) -> None:
+        # Where warnings are written to, sys.stdout if not given
+        self.output: Optional[TextIO] = output
         self.cur_func = FunctionType.NONE
-        self.interp: Interprets = interp
-        # Each element in scopes is  Dict[str, List[bool, bool]]
+        self.cur_class = ClassType.NONE
+        # Each element in scopes is  Dict[str, List[bool, bool, int, Stmt]]
         # where 
-        # [name, [ready, used]]
+        # [name, [ready, used, slot, declaration]]
+        # declaration is None for parameters, 'this' and 'super'.
         self.scopes: Deque[Dict] = deque()       
 
     def _begin_scope(self) -> None:
@@ -69,28 +75,38 @@ class Resolver(Visitor):
 
     def _end_scope(self) -> None:
         # Check if any vars were unused
-        for name, (_, used) in self.scopes[-1].items():
+        for name, (_, used, _, decl) in self.scopes[-1].items():
             if used is False:
-                print(f"WARNING: Variable [{name}] unused")
+                print(f"WARNING: Variable [{name}] unused", file=self.output)
+                if decl is not None:
+                    decl.used = False
 
         self.scopes.pop()
 
-    def _declare(self, name: Token) -> None:
+    def _declare(self, name: Token, decl: Optional[Stmt]=None) -> Optional[int]:
+        """
+        Declare name in the innermost scope, returning the slot it was
+        given or None if it is a global. If the name is never used then
+        the used flag of decl is cleared.
+        """
         if len(self.scopes) == 0:
-            return
+            return None
 
         scope = self.scopes[-1]
         if name.lexeme in scope:
             raise LoxInterpreterError(name, f"[{name.lexeme}] already in this scope")
 
-        scope[name.lexeme] = [False, False]   # mark as not ready
+        slot = len(scope)
+        scope[name.lexeme] = [False, False, slot, decl]   # mark as not ready
+
+        return slot
 
     def _define(self, name: Token) -> None:
         if len(self.scopes) == 0:
             return
 
         scope = self.scopes[-1]
-        scope[name.lexeme] = [True, False]   # mark as defined
+        scope[name.lexeme][:2] = [True, False]   # mark as defined
 
     # ==== Expression visitors ==== 
     def visit_binary_expr(self, expr: BinaryExpr) -> None:
@@ -115,12 +131,12 @@ class Resolver(Visitor):
 
     def visit_super_expr(self, expr: SuperExpr) -> None:
         # Check that we are using super inside a subclass
-        if self.cur_func == FunctionType.NONE:
+        if self.cur_class == ClassType.NONE:
             raise LoxInterpreterError(
                 expr.keyword, 
                 "Can't use 'super' keyword outside of a class"
             )
-        elif self.cur_func != FunctionType.SUBCLASS:
+        elif self.cur_class != ClassType.SUBCLASS:
             raise LoxInterpreterError(
                 expr.keyword,
                 "Can't use 'super' keyword in a class with no superclass"
@@ -142,7 +158,8 @@ class Resolver(Visitor):
         self._resolve_expr(expr.right)
         
     def visit_var_expr(self, expr: VarExpr) -> None:
-        if self.scopes and (self.scopes[-1].get(expr.name.lexeme, None) is False):
+        entry = self.scopes[-1].get(expr.name.lexeme) if self.scopes else None
+        if entry is not None and entry[0] is False:
             raise LoxInterpreterError(expr.name, f"Failed to read local variable [{expr.name.lexeme}] in its own initializer")
 
         self._resolve_local(expr, expr.name)
@@ -156,7 +173,7 @@ class Resolver(Visitor):
         self._resolve_expr(stmt.expr)
 
     def visit_func_stmt(self, stmt: FuncStmt) -> None:
-        self._declare(stmt.name)
+        stmt.slot = self._declare(stmt.name, stmt)
         self._define(stmt.name)
         self._resolve_function(stmt, FunctionType.FUNCTION)
 
@@ -169,13 +186,14 @@ class Resolver(Visitor):
     def visit_block_stmt(self, stmt: BlockStmt) -> None:
         self._begin_scope()
         self.resolve(stmt.stmts)
+        stmt.num_slots = len(self.scopes[-1])
         self._end_scope()
 
     def visit_class_stmt(self, stmt: ClassStmt) -> None:
-        enclosing_func = self.cur_func
-        self.cur_func = FunctionType.CLASS
+        enclosing_class = self.cur_class
+        self.cur_class = ClassType.CLASS
 
-        self._declare(stmt.name)
+        stmt.slot = self._declare(stmt.name)
         self._define(stmt.name)
 
         # Prevent self-inheritance
@@ -183,17 +201,14 @@ class Resolver(Visitor):
             raise LoxInterpreterError(stmt.superclass.name, "Class can't inherit from itself")
 
         if stmt.superclass is not None:
-            self.cur_func = FunctionType.SUBCLASS
+            self.cur_class = ClassType.SUBCLASS
             self._resolve_expr(stmt.superclass)
 
-        # If there is a superclass, add the superclass scope before 
-        # the class scope.
+        # If there is a superclass, add the superclass scope around 
+        # the methods.
         if stmt.superclass is not None:
             self._begin_scope()
-            self.scopes[-1]["super"] = [True, True]
-
-        self._begin_scope()
-        self.scopes[-1]["this"] = [True, True]  # Ensure 'this' keyword always in scope
+            self.scopes[-1]["super"] = [True, True, 0, None]
 
         for method in stmt.methods:
             if method.name.lexeme == "init":
@@ -202,18 +217,16 @@ class Resolver(Visitor):
                 func_type = FunctionType.METHOD
             self._resolve_function(method, func_type)
 
-        self._end_scope()
-
         if stmt.superclass is not None:
             self._end_scope()
 
-        self.cur_func = enclosing_func
+        self.cur_class = enclosing_class
 
     def visit_print_stmt(self, stmt: PrintStmt) -> None:
         self._resolve_expr(stmt.expr)
 
     def visit_var_stmt(self, stmt: VarStmt) -> None:
-        self._declare(stmt.name)
+        stmt.slot = self._declare(stmt.name, stmt)
         if stmt.initializer is not None:
             self._resolve_expr(stmt.initializer)
         
@@ -244,11 +257,13 @@ class Resolver(Visitor):
     def _resolve_stmt(self, stmt: Stmt) -> None:
         stmt.accept(self)
 
-    def _resolve_local(self, expr: Expr, name: Token) -> None:
+    def _resolve_local(self, expr: Union[VarExpr, AssignmentExpr, ThisExpr, SuperExpr], name: Token) -> None:
         for depth, scope in enumerate(reversed(self.scopes)):
             if name.lexeme in scope:
-                self.interp.resolve(expr, depth)
-                scope[name.lexeme][1] = True
+                entry = scope[name.lexeme]
+                entry[1] = True
+                expr.depth = depth
+                expr.slot = entry[2]
                 return
 
     def _resolve_function(self, func: FuncStmt, ftype: FunctionType) -> None:
@@ -256,11 +271,17 @@ class Resolver(Visitor):
         self.cur_func = ftype
         self._begin_scope()
 
+        # Methods are called with the instance in the first slot of their
+        # frame, so 'this' is always in scope ahead of the parameters.
+        if ftype in (FunctionType.METHOD, FunctionType.INITIALIZER):
+            self.scopes[-1]["this"] = [True, True, 0, None]
+
         for param in func.params:
             self._declare(param)
             self._define(param)
 
         self.resolve(func.body)
+        func.num_slots = len(self.scopes[-1])
         self._end_scope()
         self.cur_func = enclosing_func
 
@@ -4,239 +4,222 @@ Token Scanner class
 
 """
 
-from typing import Any, Dict, List
+import re
+from typing import Any, Dict, Generator, Iterator, List, Optional, TextIO, Union
+from loxpy.source import SourceReader
 from loxpy.token import Token, TokenType
 
 
-class Scanner:
-    def __init__(self, source: str, verbose: bool=False) -> None:
-        if type(source) is not str:
-            raise ValueError('source must be a string')
+# Keywords that are also literal values
+KEYWORD_LITERALS: Dict[TokenType, Any] = {
+    TokenType.TRUE  : True,
+    TokenType.FALSE : False,
+    TokenType.NIL   : None,
+}
+
+RESERVED_WORDS: Dict[str, TokenType] = {
+    "and"    : TokenType.AND,
+    "class"  : TokenType.CLASS,
+    "else"   : TokenType.ELSE,
+    "false"  : TokenType.FALSE,
+    "for"    : TokenType.FOR,
+    "func"   : TokenType.FUNC,
+    "if"     : TokenType.IF,
+    "nil"    : TokenType.NIL,
+    "or"     : TokenType.OR,
+    "print"  : TokenType.PRINT,
+    "return" : TokenType.RETURN,
+    "super"  : TokenType.SUPER,
+    "this"   : TokenType.THIS,
+    "true"   : TokenType.TRUE,
+    "var"    : TokenType.VAR,
+    "while"  : TokenType.WHILE
+}
+
+OPERATORS: Dict[str, TokenType] = {
+    "("  : TokenType.LEFT_PAREN,
+    ")"  : TokenType.RIGHT_PAREN,
+    "{"  : TokenType.LEFT_BRACE,
+    "}"  : TokenType.RIGHT_BRACE,
+    ","  : TokenType.COMMA,
+    "."  : TokenType.DOT,
+    "-"  : TokenType.MINUS,
+    "+"  : TokenType.PLUS,
+    ";"  : TokenType.SEMICOLON,
+    "*"  : TokenType.STAR,
+    "/"  : TokenType.SLASH,
+    "!"  : TokenType.BANG,
+    "!=" : TokenType.BANG_EQUAL,
+    "="  : TokenType.EQUAL,
+    "==" : TokenType.EQUAL_EQUAL,
+    "<"  : TokenType.LESS,
+    "<=" : TokenType.LESS_EQUAL,
+    ">"  : TokenType.GREATER,
+    ">=" : TokenType.GREATER_EQUAL,
+}
+
+
+# Each match is any leading spaces followed by one lexeme. Alternatives are 
+# tried in order, so two character operators come before one character ones,
+# and strings with no closing quote only match once a terminated string can't.
+# Trailing spaces at the end of the source don't match at all and are skipped.
+TOKEN_PATTERN = re.compile(r"""
+    [ \r\t]*
+    (?:
+        (?P<op>!=|==|<=|>=|[(){},.\-+;*!=<>]|/(?!/))
+      | (?P<identifier>[A-Za-z_][A-Za-z0-9_]*)
+      | (?P<newline>\n)
+      | (?P<number>[0-9]+(?:\.[0-9]+)?)
+      | (?P<comment>//[^\n]*)
+      | (?P<string>"[^"]*")
+      | (?P<unterminated>"[^"]*)
+      | (?P<error>[^ \r\t\n])
+    )
+""", re.VERBOSE)
 
-        self.source      :str  = source
-        self.token_list  :List[Token] = []
 
-        # Source position
-        self.src_start   :int  = 0
-        self.src_current :int  = 0
+class Scanner:
+    """
+    Scanner
+    Splits the source into tokens with a single compiled regex, rather
+    than one character at a time. The tokens (including line and column)
+    are the same as the ones produced by the original character at a time
+    scanner, LegacyScanner in tools/legacy.py.
+
+    The source is either a string or a SourceReader. A reader is scanned a 
+    line at a time as its chunks arrive, so only the text since the last 
+    complete line (or since the start of an unfinished string) is held.
+    """
+
+    def __init__(self, source: Union[str, SourceReader], verbose: bool=False, output: Optional[TextIO]=None) -> None:
+        if not isinstance(source, (str, SourceReader)):
+            raise ValueError('source must be a string or a SourceReader')
+
+        self.source      :Union[str, SourceReader] = source
+        self.token_list  :List[Token] = []
         self.src_line    :int  = 1
-        self.cur_col     :int  = 1
-
-        # reserved words
-        self.reserved_words : Dict[str, TokenType] = {
-            "and"    : TokenType.AND,
-            "class"  : TokenType.CLASS,
-            "else"   : TokenType.ELSE,
-            "false"  : TokenType.FALSE,
-            "for"    : TokenType.FOR,
-            "func"   : TokenType.FUNC,
-            "if"     : TokenType.IF,
-            "nil"    : TokenType.NIL,
-            "or"     : TokenType.OR,
-            "print"  : TokenType.PRINT,
-            "return" : TokenType.RETURN,
-            "super"  : TokenType.SUPER,
-            "this"   : TokenType.THIS,
-            "true"   : TokenType.TRUE,
-            "var"    : TokenType.VAR,
-            "while"  : TokenType.WHILE
-        }
+
+        # Column state carried between regions of a chunked source. See
+        # _scan_region().
+        self._line_start :int  = 0
+        self._col_base   :int  = 1
+
         # debug mode
         self.verbose: bool = verbose
+        # Where errors are written to, sys.stdout if not given
+        self.output: Optional[TextIO] = output
 
     def __repr__(self) -> str:
-        return f"Scanner [start : {self.src_start}\t current: {self.src_current}\t line: {self.src_line}]"
-
-    # Internal lexing functions
-    def _src_end(self) -> bool:
-        return self.src_current >= len(self.source)
-
-    def _advance(self) -> str:
-        self.src_current += 1
-        self.cur_col += 1
-        return self.source[self.src_current-1]
+        return f"Scanner [line: {self.src_line}\t tokens: {len(self.token_list)}]"
 
-    def _new_line(self) -> None:
-        self.src_line += 1
-        self.cur_col = 1
-
-    def _identifier(self) -> None:
-        while self._isalphanumeric(self._peek()):
-            self._advance()
-
-        text = self.source[self.src_start:self.src_current]
-        if text in self.reserved_words.keys():
-            token_type = self.reserved_words[text]
-        else:
-            token_type = TokenType.IDENTIFIER
-        self._add_token(token_type, text)
-
-    def _isalpha(self, c:str) -> bool:
-        # '_' is ASCII 95
-        if ord(c) in range(65,91) or ord(c) in range(97, 123) or ord(c) == 95:
-            return True
-        return False
-
-    def _isalphanumeric(self, c:str) -> bool:
-        if self._isalpha(c) or self._isdigit(c):
-            return True
-        return False
-
-    def _isdigit(self, c:str) -> bool:
-        # While we could use str.isdigit() here, this function allows us
-        # to write self._isdigit(self._peek()) and consume the output
-        # of self._peek() in a loop
-        if ord(c) in range(48, 58):
-            return True
-
-        return False
-
-    def _match(self, expected_char:str) -> bool:
+    def scan(self) -> List[Token]:
         """
-        Only consume input if this is the character we expect
+        Scan across the entire source and produce a list of all tokens
         """
-        if self._src_end():
-            return False
-        if self.source[self.src_current] != expected_char:
-            return False
-        self.src_current += 1
-
-        return True
-
-    def _number(self) -> None:
-        while self._isdigit(self._peek()) is True:
-            self._advance()
-
-        # Check for fractional part
-        if self._peek() == '.' and self._isdigit(self._peek_next()):
-            self._advance()
-            while(self._isdigit(self._peek())):
-                self._advance()
-
-        # Now add a new number token
-        self._add_token(
-            TokenType.NUMBER,
-            float(self.source[self.src_start:self.src_current])
-        )
-
-    def _peek(self) -> str:
-        if self._src_end():
-            return '\0'
-        return self.source[self.src_current]
-
-    def _peek_next(self) -> str:
-        if self._src_end() or (self.src_current + 1) > len(self.source):
-            return '\0'
-        return self.source[self.src_current + 1]
-
-    def _parse_string(self) -> None:
-        while self._peek() != '"' and self._src_end() is False:
-            if self._peek() == '\n':
-                self._new_line()
-            self._advance()
-
-        # Handle unterminated string
-        if self._src_end():
-            print(f"line {self.src_line}: unterminated string")
-            return
-
-        # Consume closing quote
-        self._advance()
-        # trim surrounding quotes
-        value = self.source[self.src_start + 1 : self.src_current - 1]
-        self._add_token(TokenType.STRING, value)
-
-    def _add_token(self, token_type: TokenType, literal:Any=None) -> None:
-        text = self.source[self.src_start : self.src_current]
-        token = Token(token_type, text, literal, self.src_line, self.cur_col)
-        self.token_list.append(token)
-
-    def _scan_token(self) -> None:
+        self.token_list.extend(self.iter_tokens())
+
+        return self.token_list
+
+    def iter_tokens(self) -> Iterator[Token]:
         """
-        Scan a single token from the source
+        Generate the tokens in the source one at a time, finishing with
+        LOX_EOF. Unlike scan() the tokens are not kept in token_list.
         """
-        c = self._advance()
-        # single character tokens
-        if c == '(':
-            self._add_token(TokenType.LEFT_PAREN)
-        elif c == ')':
-            self._add_token(TokenType.RIGHT_PAREN)
-        elif c == '{':
-            self._add_token(TokenType.LEFT_BRACE)
-        elif c == '}':
-            self._add_token(TokenType.RIGHT_BRACE)
-        elif c == ',':
-            self._add_token(TokenType.COMMA)
-        elif c == '.':
-            self._add_token(TokenType.DOT)
-        elif c == '-':
-            self._add_token(TokenType.MINUS)
-        elif c == '+':
-            self._add_token(TokenType.PLUS)
-        elif c == ';':
-            self._add_token(TokenType.SEMICOLON)
-        elif c == '*':
-            self._add_token(TokenType.STAR)
-        # Two character tokens
-        elif c == '!':
-            if self._match('='):
-                self._add_token(TokenType.BANG_EQUAL)
-            else:
-                self._add_token(TokenType.BANG)
-        elif c == '=':
-            if self._match('='):
-                self._add_token(TokenType.EQUAL_EQUAL)
-            else:
-                self._add_token(TokenType.EQUAL)
-        elif c == '<':
-            if self._match('='):
-                self._add_token(TokenType.LESS_EQUAL)
-            else:
-                self._add_token(TokenType.LESS)
-        elif c == '>':
-            if self._match('='):
-                self._add_token(TokenType.GREATER_EQUAL)
-            else:
-                self._add_token(TokenType.GREATER)
-        # Because comments in Lox begin with a slash, we need
-        # some extra logic here
-        elif c == '/':
-            if self._match('/'):
-                # Comment - runs until end of line
-                while(self._peek() != '\n' and self._src_end() == False):
-                    self._advance()
-            else:
-                self._add_token(TokenType.SLASH)
-        # String literals
-        elif c == '"':
-            self._parse_string()
-        # Consume whitespace
-        elif c == ' ' or c == '\r' or c == '\t':
-            pass
-        elif c == '\n':
-            self._new_line()
+        if isinstance(self.source, str):
+            yield from self._scan_region(self.source, len(self.source), True)
         else:
-            if self._isdigit(c):
-                self._number()
-            elif self._isalpha(c):
-                self._identifier()
-            else:
-                print(f"line {self.src_line}: unexpected character {c}")
+            yield from self._scan_chunks(self.source)
 
-        if self.verbose:
-            print('%s' % self.__repr__())
+        yield Token(TokenType.LOX_EOF, "", None, self.src_line)
 
-    def scan(self) -> List[Token]:
+    def _scan_chunks(self, chunks: SourceReader) -> Iterator[Token]:
+        # Text that has been read but not scanned
+        pending: List[str] = []
+        # Set when the pending text starts with a string that has no closing
+        # quote yet, in which case there is no point scanning it again until 
+        # a quote turns up.
+        open_string = False
+
+        for chunk in chunks:
+            pending.append(chunk)
+            if ('"' not in chunk) if open_string else ("\n" not in chunk):
+                continue
+
+            text = "".join(pending)
+            end = text.rfind("\n") + 1
+            if end == 0:
+                pending = [text]
+                continue
+
+            stop = yield from self._scan_region(text, end, False)
+            open_string = stop < end and text.find('"', stop + 1) == -1
+            pending = [text[stop:]]
+
+        text = "".join(pending)
+        yield from self._scan_region(text, len(text), True)
+
+    def _scan_region(self, source: str, end: int, final: bool) -> Generator[Token, None, int]:
         """
-        Scan across the entire source and produce a list of all tokens
+        Generate the tokens in source[:end]. Unless this is the final region 
+        of the source, end must be just after a newline, and a string that 
+        is still open at end is left for the next region. Returns where 
+        scanning stopped, which is end unless a string was left open.
         """
-        self.src_current = 0
-        self.src_start = 0
-        while(self._src_end() == False):
-            self.src_start = self.src_current
-            self._scan_token()
+        operators = OPERATORS
+        reserved_words = RESERVED_WORDS
+        identifier = TokenType.IDENTIFIER
+        keyword_literals = KEYWORD_LITERALS
+
+        line = self.src_line
+        # Columns are counted from the start of the line. To match the
+        # LegacyScanner (tools/legacy.py), a two character operator only advances the column
+        # by one, and after a newline inside a string the column starts 
+        # from 2 rather than 1. col_base accounts for both.
+        line_start = self._line_start
+        col_base = self._col_base
+
+        for m in TOKEN_PATTERN.finditer(source, 0, end):
+            kind = m.lastgroup
+            text = m[kind]
+
+            if kind == "op":
+                if len(text) == 2:
+                    col_base -= 1
+                yield Token(operators[text], text, None, line, m.end() - line_start + col_base)
+            elif kind == "identifier":
+                token_type = reserved_words.get(text, identifier)
+                yield Token(token_type, text, keyword_literals.get(token_type, text), line, m.end() - line_start + col_base)
+            elif kind == "comment":
+                pass
+            elif kind == "newline":
+                line += 1
+                line_start = m.end()
+                col_base = 1
+            elif kind == "number":
+                yield Token(TokenType.NUMBER, text, float(text), line, m.end() - line_start + col_base)
+            elif kind == "string" or kind == "unterminated":
+                if kind == "unterminated" and not final:
+                    end = m.start(kind)
+                    break
+                num_lines = text.count("\n")
+                if num_lines:
+                    line += num_lines
+                    line_start = m.start(kind) + text.rindex("\n") + 1
+                    col_base = 2
+                if kind == "unterminated":
+                    print(f"line {line}: unterminated string", file=self.output)
+                else:
+                    yield Token(TokenType.STRING, text, text[1:-1], line, m.end() - line_start + col_base)
+            else:
+                print(f"line {line}: unexpected character {text}", file=self.output)
 
-        token = Token(TokenType.LOX_EOF, "", None, self.src_line)
-        self.token_list.append(token)
+            if self.verbose:
+                self.src_line = line
+                print(f"{self.__repr__()}", file=self.output)
 
-        return self.token_list
+        # The next region starts at end, so positions are moved back by end
+        self.src_line = line
+        self._line_start = line_start - end
+        self._col_base = col_base
+
+        return end
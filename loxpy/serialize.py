@@ -0,0 +1,437 @@
+"""
+SERIALIZE
+
+Versioned binary encoding of a Lox program (a sequence of Stmt). The
+AST is written as a flat stream of integers along with a table of
+interned strings (identifiers, lexemes and string literals) and a table
+of constants, so that loading is a handful of bulk array reads followed
+by a single pass over the stream. The resolver's annotations (depth,
+slot, num_slots) are kept, so a resolved program can be run as soon as
+it is loaded.
+
+Layout
+
+    magic       b"LOXAST"
+    version     u16
+    flags       u16         (FLAG_COMPRESSED: the rest is zlib compressed)
+    counts      6 x u32     strings, constants, numbers, ints, string bytes,
+                            int width
+    strings     utf-8       all interned strings back to back
+    numbers     f64 x n     number constants
+    ints        u8/u16/u32/u64 x n
+
+The int stream holds the length of each string, then each constant (0
+for the next number, otherwise 1 + the index of a string), then the
+number of statements followed by each statement in pre-order. A node
+is its tag followed by its fields in dataclass order. An optional node
+or int is 0 for None, and a bool is 0 or 1. A token is its type, the 
+index of its lexeme, its literal, its line and its column. All values 
+are little endian.
+"""
+
+import struct
+import sys
+import zlib
+from array import array
+from dataclasses import fields
+from typing import Any, BinaryIO, Callable, Dict, List, Sequence, Tuple, Type
+
+from loxpy.expr import (
+    AssignmentExpr,
+    BinaryExpr,
+    AddExpr,
+    SubtractExpr,
+    MultiplyExpr,
+    DivideExpr,
+    GreaterExpr,
+    GreaterEqualExpr,
+    LessExpr,
+    LessEqualExpr,
+    EqualExpr,
+    NotEqualExpr,
+    AddConstExpr,
+    SubtractConstExpr,
+    LessConstExpr,
+    LessEqualConstExpr,
+    LessLocalsExpr,
+    CallExpr,
+    GetExpr,
+    GroupingExpr,
+    LiteralExpr,
+    LogicalExpr,
+    SetExpr,
+    SuperExpr,
+    ThisExpr,
+    UnaryExpr,
+    VarExpr,
+)
+from loxpy.statement import (
+    Stmt,
+    BlockStmt,
+    ClassStmt,
+    ExprStmt,
+    FuncStmt,
+    IfStmt,
+    PrintStmt,
+    ReturnStmt,
+    VarStmt,
+    WhileStmt,
+)
+from loxpy.token import Token, TokenType
+
+
+MAGIC = b"LOXAST"
+FORMAT_VERSION = 3
+FLAG_COMPRESSED = 0x1
+
+_HEADER = struct.Struct("<6sHH")
+_COUNTS = struct.Struct("<6I")
+
+# Typecodes for each width of int in the stream
+_INT_TYPECODES = {1: "B", 2: "H", 4: "I", 8: "Q"}
+
+# Kinds of node fields
+NODE = "node"               # Expr or Stmt
+OPT_NODE = "opt_node"       # Expr, Stmt or None
+NODE_TUPLE = "node_tuple"   # tuple of Expr
+NODE_LIST = "node_list"     # list of Stmt
+TOKEN = "token"
+TOKEN_LIST = "token_list"
+OPT_INT = "opt_int"         # int or None
+INT = "int"
+BOOL = "bool"
+
+# Fields that are not serialized, since they are only filled in at runtime
+RUNTIME_FIELDS = {"cache"}
+
+# Every node type and the kind of each of its fields. The position in this
+# list is the tag of the node in the stream (starting from 1), so new nodes
+# must only ever be added at the end.
+NODE_SCHEMA: List[Tuple[Type, Tuple[str, ...]]] = [
+    (BinaryExpr,     (TOKEN, NODE, NODE)),
+    (CallExpr,       (NODE, TOKEN, NODE_TUPLE)),
+    (GetExpr,        (NODE, TOKEN)),
+    (SetExpr,        (NODE, TOKEN, NODE)),
+    (SuperExpr,      (TOKEN, TOKEN, OPT_INT, OPT_INT)),
+    (ThisExpr,       (TOKEN, OPT_INT, OPT_INT)),
+    (GroupingExpr,   (NODE,)),
+    (LiteralExpr,    (TOKEN,)),
+    (LogicalExpr,    (TOKEN, NODE, NODE)),
+    (UnaryExpr,      (TOKEN, NODE)),
+    (VarExpr,        (TOKEN, OPT_INT, OPT_INT)),
+    (AssignmentExpr, (TOKEN, NODE, OPT_INT, OPT_INT)),
+    (ExprStmt,       (NODE,)),
+    (FuncStmt,       (TOKEN, TOKEN_LIST, NODE_LIST, OPT_INT, INT, BOOL)),
+    (IfStmt,         (NODE, NODE, OPT_NODE)),
+    (BlockStmt,      (NODE_LIST, INT)),
+    (ClassStmt,      (TOKEN, OPT_NODE, NODE_LIST, OPT_INT)),
+    (PrintStmt,      (NODE,)),
+    (ReturnStmt,     (TOKEN, OPT_NODE)),
+    (VarStmt,        (TOKEN, OPT_NODE, OPT_INT, BOOL)),
+    (WhileStmt,      (NODE, NODE)),
+    (AddExpr,            (TOKEN, NODE, NODE)),
+    (SubtractExpr,       (TOKEN, NODE, NODE)),
+    (MultiplyExpr,       (TOKEN, NODE, NODE)),
+    (DivideExpr,         (TOKEN, NODE, NODE)),
+    (GreaterExpr,        (TOKEN, NODE, NODE)),
+    (GreaterEqualExpr,   (TOKEN, NODE, NODE)),
+    (LessExpr,           (TOKEN, NODE, NODE)),
+    (LessEqualExpr,      (TOKEN, NODE, NODE)),
+    (EqualExpr,          (TOKEN, NODE, NODE)),
+    (NotEqualExpr,       (TOKEN, NODE, NODE)),
+    (AddConstExpr,       (TOKEN, NODE, NODE)),
+    (SubtractConstExpr,  (TOKEN, NODE, NODE)),
+    (LessConstExpr,      (TOKEN, NODE, NODE)),
+    (LessEqualConstExpr, (TOKEN, NODE, NODE)),
+    (LessLocalsExpr,     (TOKEN, NODE, NODE)),
+]
+
+# Literals of tokens. Anything from LITERAL_CONSTANT up is an index into
+# the constant table.
+LITERAL_NONE = 0
+LITERAL_TRUE = 1
+LITERAL_FALSE = 2
+LITERAL_LEXEME = 3
+LITERAL_CONSTANT = 4
+
+TOKEN_TYPES: Dict[int, TokenType] = {t.value: t for t in TokenType}
+
+
+def _field_names(node_type: Type) -> List[str]:
+    return [f.name for f in fields(node_type) if f.name not in RUNTIME_FIELDS]
+
+
+# Check that the schema covers every field of every node
+for _node_type, _kinds in NODE_SCHEMA:
+    assert len(_field_names(_node_type)) == len(_kinds), f"schema for {_node_type.__name__} is out of date"
+
+
+class _Encoder:
+    def __init__(self) -> None:
+        self.ints: List[int] = []
+        self.strings: Dict[str, int] = {}
+        # Keyed by type and repr so that 1.0 and "1.0", or 0.0 and -0.0,
+        # are different constants
+        self.constants: Dict[Tuple[type, str], int] = {}
+        self.constant_values: List[Any] = []
+
+        self.node_tags = {node_type: tag for tag, (node_type, _) in enumerate(NODE_SCHEMA, 1)}
+        self.node_fields = {node_type: list(zip(_field_names(node_type), kinds)) for node_type, kinds in NODE_SCHEMA}
+
+    def intern(self, s: str) -> int:
+        index = self.strings.get(s)
+        if index is None:
+            index = self.strings[s] = len(self.strings)
+        return index
+
+    def literal(self, token: Token) -> int:
+        literal = token.literal
+        if literal is None:
+            return LITERAL_NONE
+        if literal is True:
+            return LITERAL_TRUE
+        if literal is False:
+            return LITERAL_FALSE
+        if type(literal) is str and literal == token.lexeme:
+            return LITERAL_LEXEME
+        if type(literal) not in (str, float):
+            raise ValueError(f"Can't serialize literal {literal!r} of token {token!r}")
+
+        key = (type(literal), repr(literal))
+        index = self.constants.get(key)
+        if index is None:
+            index = self.constants[key] = len(self.constant_values)
+            self.constant_values.append(literal)
+
+        return LITERAL_CONSTANT + index
+
+    def token(self, token: Token) -> None:
+        self.ints.extend((
+            token.token_type.value,
+            self.intern(token.lexeme),
+            self.literal(token),
+            token.line,
+            token.col
+        ))
+
+    def node(self, node: Any) -> None:
+        try:
+            self.ints.append(self.node_tags[type(node)])
+            node_fields = self.node_fields[type(node)]
+        except KeyError:
+            raise ValueError(f"Can't serialize {type(node).__name__}") from None
+
+        ints = self.ints
+        for name, kind in node_fields:
+            value = getattr(node, name)
+            if kind == NODE:
+                self.node(value)
+            elif kind == TOKEN:
+                self.token(value)
+            elif kind == OPT_NODE:
+                if value is None:
+                    ints.append(0)
+                else:
+                    self.node(value)
+            elif kind == OPT_INT:
+                ints.append(0 if value is None else value + 1)
+            elif kind == INT or kind == BOOL:
+                ints.append(int(value))
+            elif kind == TOKEN_LIST:
+                ints.append(len(value))
+                for token in value:
+                    self.token(token)
+            else:   # NODE_TUPLE, NODE_LIST
+                ints.append(len(value))
+                for child in value:
+                    self.node(child)
+
+    def encode(self, stmts: Sequence[Stmt]) -> bytes:
+        self.ints.append(len(stmts))
+        for stmt in stmts:
+            self.node(stmt)
+
+        numbers = [c for c in self.constant_values if type(c) is float]
+        constants = [0 if type(c) is float else self.intern(c) + 1 for c in self.constant_values]
+        strings = list(self.strings)
+        ints = [len(s) for s in strings] + constants + self.ints
+
+        width = 1
+        largest = max(ints)
+        while largest >= 1 << (8 * width):
+            width *= 2
+        int_data = array(_INT_TYPECODES[width], ints)
+        number_data = array("d", numbers)
+        if sys.byteorder == "big":
+            int_data.byteswap()
+            number_data.byteswap()
+
+        string_data = "".join(strings).encode("utf-8", "surrogatepass")
+        counts = _COUNTS.pack(
+            len(strings),
+            len(constants),
+            len(number_data),
+            len(int_data),
+            len(string_data),
+            width
+        )
+
+        return b"".join((counts, string_data, number_data.tobytes(), int_data.tobytes()))
+
+
+class _Decoder:
+    def __init__(self, payload: bytes) -> None:
+        num_strings, num_constants, num_numbers, num_ints, string_size, width = _COUNTS.unpack_from(payload)
+        if width not in _INT_TYPECODES:
+            raise ValueError(f"Invalid int width {width}")
+
+        offset = _COUNTS.size
+        string_data = payload[offset : offset + string_size].decode("utf-8", "surrogatepass")
+        offset += string_size
+
+        numbers = array("d")
+        numbers.frombytes(payload[offset : offset + 8 * num_numbers])
+        offset += 8 * num_numbers
+
+        ints = array(_INT_TYPECODES[width])
+        ints.frombytes(payload[offset : offset + width * num_ints])
+        if offset + width * num_ints != len(payload):
+            raise ValueError("Serialized program has the wrong size")
+        if sys.byteorder == "big":
+            numbers.byteswap()
+            ints.byteswap()
+
+        self.next_int: Callable[[], int] = iter(ints.tolist()).__next__
+
+        self.strings: List[str] = []
+        start = 0
+        for _ in range(num_strings):
+            end = start + self.next_int()
+            self.strings.append(string_data[start:end])
+            start = end
+
+        # Indexed by the literal of a token. LITERAL_LEXEME is handled
+        # in token().
+        self.literals: List[Any] = [None, True, False, None]
+        next_number = iter(numbers).__next__
+        for _ in range(num_constants):
+            code = self.next_int()
+            self.literals.append(next_number() if code == 0 else self.strings[code - 1])
+
+        self.readers = [None] + [self._node_reader(node_type, kinds) for node_type, kinds in NODE_SCHEMA]
+
+    def _node_reader(self, node_type: Type, kinds: Tuple[str, ...]) -> Callable[[], Any]:
+        next_int = self.next_int
+        read_node = self.node
+        read_token = self.token
+
+        def read_opt_node() -> Any:
+            tag = next_int()
+            return self.readers[tag]() if tag else None
+
+        def read_opt_int() -> Any:
+            value = next_int()
+            return value - 1 if value else None
+
+        def read_node_tuple() -> Tuple[Any, ...]:
+            return tuple([read_node() for _ in range(next_int())])
+
+        def read_node_list() -> List[Any]:
+            return [read_node() for _ in range(next_int())]
+
+        def read_token_list() -> List[Token]:
+            return [read_token() for _ in range(next_int())]
+
+        field_readers = {
+            NODE: read_node,
+            OPT_NODE: read_opt_node,
+            NODE_TUPLE: read_node_tuple,
+            NODE_LIST: read_node_list,
+            TOKEN: read_token,
+            TOKEN_LIST: read_token_list,
+            OPT_INT: read_opt_int,
+            INT: next_int,
+            BOOL: lambda: next_int() == 1,
+        }
+        readers = [field_readers[kind] for kind in kinds]
+
+        def read() -> Any:
+            return node_type(*[r() for r in readers])
+
+        return read
+
+    def token(self) -> Token:
+        next_int = self.next_int
+        token_type = TOKEN_TYPES[next_int()]
+        lexeme = self.strings[next_int()]
+        literal = next_int()
+
+        return Token(
+            token_type,
+            lexeme,
+            lexeme if literal == LITERAL_LEXEME else self.literals[literal],
+            next_int(),
+            next_int()
+        )
+
+    def node(self) -> Any:
+        tag = self.next_int()
+        if tag == 0:
+            raise ValueError("Missing node")
+        return self.readers[tag]()
+
+    def decode(self) -> List[Stmt]:
+        stmts = [self.node() for _ in range(self.next_int())]
+        if next(self.next_int.__self__, None) is not None:
+            raise ValueError("Trailing data after program")
+
+        return stmts
+
+
+def dumps(stmts: Sequence[Stmt], compress: bool=True) -> bytes:
+    """
+    Serialize a program to bytes
+    """
+    payload = _Encoder().encode(stmts)
+    flags = 0
+    if compress:
+        payload = zlib.compress(payload)
+        flags |= FLAG_COMPRESSED
+
+    return _HEADER.pack(MAGIC, FORMAT_VERSION, flags) + payload
+
+
+def loads(data: bytes) -> List[Stmt]:
+    """
+    Load a program serialized by dumps(). Raises ValueError if data isn't
+    a serialized program or was written by a different version of the
+    format.
+    """
+    if len(data) < _HEADER.size:
+        raise ValueError("Not a serialized Lox program")
+
+    magic, version, flags = _HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise ValueError("Not a serialized Lox program")
+    if version != FORMAT_VERSION:
+        raise ValueError(f"Serialized program is format version {version}, expected {FORMAT_VERSION}")
+
+    payload = data[_HEADER.size:]
+    if flags & FLAG_COMPRESSED:
+        try:
+            payload = zlib.decompress(payload)
+        except zlib.error as e:
+            raise ValueError(f"Corrupt serialized program: {e}") from None
+
+    try:
+        return _Decoder(payload).decode()
+    except (IndexError, KeyError, StopIteration, struct.error, UnicodeDecodeError, TypeError) as e:
+        raise ValueError(f"Corrupt serialized program: {e}") from None
+
+
+def dump(stmts: Sequence[Stmt], fp: BinaryIO, compress: bool=True) -> None:
+    fp.write(dumps(stmts, compress))
+
+
+def load(fp: BinaryIO) -> List[Stmt]:
+    return loads(fp.read())
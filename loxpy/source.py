@@ -0,0 +1,172 @@
+"""
+SOURCE
+
+Readers that hand Lox source to the Scanner as a series of text chunks,
+so that a large file never needs to be decoded into a single string.
+"""
+
+import codecs
+import io
+import mmap
+import os
+import stat
+from typing import BinaryIO, Iterator, Optional
+
+
+DEFAULT_CHUNK_SIZE = 1 << 20     # bytes
+DEFAULT_ENCODING = "utf-8"
+
+
+class SourceReader:
+    """
+    SourceReader
+    Base class for sources of Lox text. Iterating a reader gives the text
+    in chunks. A chunk can end anywhere, including in the middle of a token,
+    so it is up to the Scanner to put tokens back together.
+    """
+
+    def __iter__(self) -> Iterator[str]:
+        raise NotImplementedError
+
+    def __enter__(self) -> "SourceReader":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def close(self) -> None:
+        pass
+
+    def read(self) -> str:
+        """
+        Read all of the source into a single string
+        """
+        return "".join(self)
+
+
+class StringSource(SourceReader):
+    """
+    StringSource
+    Source that is already in memory, optionally handed out in chunks of
+    chunk_size characters.
+    """
+
+    def __init__(self, text: str, chunk_size: Optional[int]=None) -> None:
+        self.text = text
+        self.chunk_size = chunk_size
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({len(self.text)} chars)"
+
+    def __iter__(self) -> Iterator[str]:
+        if self.chunk_size is None:
+            yield self.text
+            return
+
+        for start in range(0, len(self.text), self.chunk_size):
+            yield self.text[start : start + self.chunk_size]
+
+
+class FileSource(SourceReader):
+    """
+    FileSource
+    Reads a file chunk_size bytes at a time. Bytes are decoded
+    incrementally, so a character split across two chunks is handled, and
+    line endings are translated to '\\n' in the same way as open() does.
+    """
+
+    def __init__(self, filename: str, chunk_size: int=DEFAULT_CHUNK_SIZE, encoding: str=DEFAULT_ENCODING) -> None:
+        if chunk_size <= 0:
+            raise ValueError("chunk_size must be positive")
+
+        self.filename = filename
+        self.chunk_size = chunk_size
+        self.encoding = encoding
+        self.fp: Optional[BinaryIO] = open(filename, "rb")
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({self.filename}, chunk_size={self.chunk_size})"
+
+    def _read_chunks(self) -> Iterator[bytes]:
+        if self.fp is None:
+            raise ValueError(f"{self.filename} is closed")
+
+        if self.fp.seekable():
+            self.fp.seek(0)
+        while True:
+            chunk = self.fp.read(self.chunk_size)
+            if not chunk:
+                return
+            yield chunk
+
+    def __iter__(self) -> Iterator[str]:
+        decoder = io.IncrementalNewlineDecoder(
+            codecs.getincrementaldecoder(self.encoding)(),
+            translate=True
+        )
+        for chunk in self._read_chunks():
+            text = decoder.decode(chunk)
+            if text:
+                yield text
+
+        text = decoder.decode(b"", final=True)
+        if text:
+            yield text
+
+    def close(self) -> None:
+        if self.fp is not None:
+            self.fp.close()
+            self.fp = None
+
+
+class MmapSource(FileSource):
+    """
+    MmapSource
+    Like FileSource, but maps the file into memory and decodes it a window
+    of chunk_size bytes at a time. The operating system pages the file in
+    as needed, and only the current window is ever copied.
+    """
+
+    def __init__(self, filename: str, chunk_size: int=DEFAULT_CHUNK_SIZE, encoding: str=DEFAULT_ENCODING) -> None:
+        super().__init__(filename, chunk_size, encoding)
+        assert self.fp is not None
+
+        self.map: Optional[mmap.mmap] = None
+        info = os.fstat(self.fp.fileno())
+        if not stat.S_ISREG(info.st_mode):
+            self.close()
+            raise ValueError(f"{filename} is not a regular file")
+
+        # An empty file can't be mapped, but then there is nothing to read
+        if info.st_size > 0:
+            try:
+                self.map = mmap.mmap(self.fp.fileno(), 0, access=mmap.ACCESS_READ)
+            except OSError:
+                self.close()
+                raise
+
+    def _read_chunks(self) -> Iterator[bytes]:
+        if self.map is None:
+            if self.fp is None:
+                raise ValueError(f"{self.filename} is closed")
+            return
+
+        for start in range(0, len(self.map), self.chunk_size):
+            yield self.map[start : start + self.chunk_size]
+
+    def close(self) -> None:
+        if self.map is not None:
+            self.map.close()
+            self.map = None
+        super().close()
+
+
+def open_source(filename: str, chunk_size: int=DEFAULT_CHUNK_SIZE, encoding: str=DEFAULT_ENCODING) -> FileSource:
+    """
+    Open filename with an MmapSource, falling back to reading it in chunks
+    for files that can't be mapped (eg: pipes)
+    """
+    try:
+        return MmapSource(filename, chunk_size, encoding)
+    except (OSError, ValueError):
+        return FileSource(filename, chunk_size, encoding)
@@ -2,7 +2,7 @@
 
 from typing import Any, List, Optional, Sequence
 from abc import ABC, abstractmethod
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 
 from loxpy.expr import Expr, VarExpr
 from loxpy.token import Token
@@ -10,7 +10,7 @@ from loxpy.token import Token
 # TODO: what should the type of the visitor be?
 
 
-@dataclass
+@dataclass(slots=True)
 class Stmt(ABC):
 
     @abstractmethod
@@ -18,7 +18,7 @@ class Stmt(ABC):
         raise NotImplementedError("This method must be defined in derived class")
 
 
-@dataclass
+@dataclass(slots=True)
 class ExprStmt(Stmt):
     expr: Expr
 
@@ -26,17 +26,23 @@ class ExprStmt(Stmt):
         return visitor.visit_expr_stmt(self)
 
 
-@dataclass
+@dataclass(slots=True)
 class FuncStmt(Stmt):
     name: Token
     params: Sequence[Token]
     body: Sequence[Stmt]
+    # Filled in by the Resolver: the slot the function is declared in
+    # (None for globals and methods), the size of its frame and whether
+    # a local function is ever used.
+    slot: Optional[int] = field(default=None, compare=False, repr=False)
+    num_slots: int = field(default=0, compare=False, repr=False)
+    used: bool = field(default=True, compare=False, repr=False)
 
     def accept(self, visitor):
         return visitor.visit_func_stmt(self)
 
 
-@dataclass
+@dataclass(slots=True)
 class IfStmt(Stmt):
     condition: Expr
     then_branch: Stmt
@@ -46,25 +52,27 @@ class IfStmt(Stmt):
         return visitor.visit_if_stmt(self)
 
 
-@dataclass 
+@dataclass(slots=True)
 class BlockStmt(Stmt):
     stmts: List[Stmt]
+    num_slots: int = field(default=0, compare=False, repr=False)
 
     def accept(self, visitor):
         return visitor.visit_block_stmt(self)
 
 
-@dataclass
+@dataclass(slots=True)
 class ClassStmt(Stmt):
     name: Token
     superclass: Optional[VarExpr]
     methods: Sequence[FuncStmt]
+    slot: Optional[int] = field(default=None, compare=False, repr=False)
 
     def accept(self, visitor) -> Any:
         return visitor.visit_class_stmt(self)
 
 
-@dataclass
+@dataclass(slots=True)
 class PrintStmt(Stmt):
     expr: Expr
 
@@ -72,7 +80,7 @@ class PrintStmt(Stmt):
         return visitor.visit_print_stmt(self)
 
 
-@dataclass
+@dataclass(slots=True)
 class ReturnStmt(Stmt):
     keyword: Token
     value: Optional[Expr] = None
@@ -81,10 +89,13 @@ class ReturnStmt(Stmt):
         return visitor.visit_return_stmt(self)
 
 
-@dataclass
+@dataclass(slots=True)
 class VarStmt(Stmt):
     name: Token
     initializer: Optional[Expr] = None
+    # Filled in by the Resolver, as for FuncStmt
+    slot: Optional[int] = field(default=None, compare=False, repr=False)
+    used: bool = field(default=True, compare=False, repr=False)
 
     def __str__(self) -> str:
         return f"VarExpr({self.name} = {self.initializer})"
@@ -93,7 +104,7 @@ class VarStmt(Stmt):
         return visitor.visit_var_stmt(self)
 
 
-@dataclass
+@dataclass(slots=True)
 class WhileStmt(Stmt):
     condition: Expr
     body: Stmt
@@ -2,9 +2,9 @@
 TOKEN
 """
 
-from dataclasses import dataclass
+from dataclasses import dataclass, fields
 from enum import auto, Enum
-from typing import Any
+from typing import Any, Dict
 
 
 
@@ -137,8 +137,27 @@ TOKEN_SYMBOL = {
     TokenType.LOX_EOF       : "EOF"
 }
 
+# Small integer code for each token type. The parser works with these
+# rather than with TokenType, which is slow to compare and hash. A set of
+# token types is held as an int with a bit set for each code, see
+# token_set(), so testing for any of them is a single &.
+TOKEN_CODES: Dict[TokenType, int] = {t: t.value for t in TokenType}
+NUM_TOKEN_CODES = max(TOKEN_CODES.values()) + 1
 
-@dataclass(frozen=True)
+
+def token_set(*token_types: TokenType) -> int:
+    """
+    Bitset of the codes of token_types, for testing a code c with 
+    (1 << c) & bitset
+    """
+    bits = 0
+    for t in token_types:
+        bits |= 1 << TOKEN_CODES[t]
+
+    return bits
+
+
+@dataclass(slots=True, unsafe_hash=True)
 class Token:
     """
     Token.
@@ -150,6 +169,8 @@ class Token:
         literal (Any): Any literal. Used for literal expressions.
         line (int): The line in the source file where the token was parsed.
 
+    Tokens are never modified once they are scanned, but the class isn't
+    frozen since a frozen dataclass is several times slower to construct.
     """
 
     token_type: TokenType
@@ -165,7 +186,7 @@ class Token:
 
     def __repr__(self) -> str:
         r = ",".join(
-            f"{k}={v!r}" for k, v in self.__dict__.items()
+            f"{f.name}={getattr(self, f.name)!r}" for f in fields(self)
         )
         return f"{self.__class__.__name__}({r})"
 
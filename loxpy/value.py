@@ -0,0 +1,35 @@
+"""
+VALUE
+Rules for Lox values that every backend has to agree on
+
+"""
+
+from typing import Any
+
+
+def is_equal(a: Any, b: Any) -> bool:
+    """
+    Lox equality. Values of different types are never equal, so unlike
+    Python 1 == true is false.
+    """
+    if a is None:
+        return b is None
+
+    return type(a) is type(b) and a == b
+
+
+def stringify(value: Any) -> str:
+    """
+    Text of value as print shows it. Numbers with no fractional part
+    are shown without the '.0'.
+    """
+    if value is None:
+        return "nil"
+    if value is True:
+        return "true"
+    if value is False:
+        return "false"
+    if type(value) is float and value.is_integer():
+        return f"{int(value)}"
+
+    return f"{value}"
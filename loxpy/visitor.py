@@ -4,6 +4,21 @@ from typing import Any, Optional
 
 from loxpy.expr import (
     BinaryExpr,
+    AddExpr,
+    SubtractExpr,
+    MultiplyExpr,
+    DivideExpr,
+    GreaterExpr,
+    GreaterEqualExpr,
+    LessExpr,
+    LessEqualExpr,
+    EqualExpr,
+    NotEqualExpr,
+    AddConstExpr,
+    SubtractConstExpr,
+    LessConstExpr,
+    LessEqualConstExpr,
+    LessLocalsExpr,
     CallExpr,
     GetExpr,
     SetExpr,
@@ -81,6 +96,54 @@ class Visitor(ABC):
     def visit_var_expr(self, expr: VarExpr) -> Optional[Any]:
         raise NotImplemented
 
+    # ======== Specialised binary expression visitors ======== #
+    # Each defaults to the visitor for the class it derives from, ending
+    # up at visit_binary_expr.
+    def visit_add_expr(self, expr: AddExpr) -> Optional[Any]:
+        return self.visit_binary_expr(expr)
+
+    def visit_subtract_expr(self, expr: SubtractExpr) -> Optional[Any]:
+        return self.visit_binary_expr(expr)
+
+    def visit_multiply_expr(self, expr: MultiplyExpr) -> Optional[Any]:
+        return self.visit_binary_expr(expr)
+
+    def visit_divide_expr(self, expr: DivideExpr) -> Optional[Any]:
+        return self.visit_binary_expr(expr)
+
+    def visit_greater_expr(self, expr: GreaterExpr) -> Optional[Any]:
+        return self.visit_binary_expr(expr)
+
+    def visit_greater_equal_expr(self, expr: GreaterEqualExpr) -> Optional[Any]:
+        return self.visit_binary_expr(expr)
+
+    def visit_less_expr(self, expr: LessExpr) -> Optional[Any]:
+        return self.visit_binary_expr(expr)
+
+    def visit_less_equal_expr(self, expr: LessEqualExpr) -> Optional[Any]:
+        return self.visit_binary_expr(expr)
+
+    def visit_equal_expr(self, expr: EqualExpr) -> Optional[Any]:
+        return self.visit_binary_expr(expr)
+
+    def visit_not_equal_expr(self, expr: NotEqualExpr) -> Optional[Any]:
+        return self.visit_binary_expr(expr)
+
+    def visit_add_const_expr(self, expr: AddConstExpr) -> Optional[Any]:
+        return self.visit_add_expr(expr)
+
+    def visit_subtract_const_expr(self, expr: SubtractConstExpr) -> Optional[Any]:
+        return self.visit_subtract_expr(expr)
+
+    def visit_less_const_expr(self, expr: LessConstExpr) -> Optional[Any]:
+        return self.visit_less_expr(expr)
+
+    def visit_less_equal_const_expr(self, expr: LessEqualConstExpr) -> Optional[Any]:
+        return self.visit_less_equal_expr(expr)
+
+    def visit_less_locals_expr(self, expr: LessLocalsExpr) -> Optional[Any]:
+        return self.visit_less_expr(expr)
+
     # ======== Statement Visitors ======== #
     @abstractmethod
     def visit_block_stmt(self, stmt: BlockStmt) -> Optional[Any]:
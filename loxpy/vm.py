@@ -0,0 +1,527 @@
+"""
+VM
+Stack based virtual machine that executes the bytecode produced
+by loxpy.compiler
+
+"""
+
+from typing import Any, Dict, List, Optional, Sequence
+
+from loxpy.compiler import FunctionProto, OpCode, compile_program
+from loxpy.callable import LoxCallable
+from loxpy.error import LoxRuntimeError
+from loxpy.statement import Stmt
+from loxpy.token import Token
+from loxpy.value import is_equal, stringify
+
+from loxpy.builtins import BUILTIN_MAP
+
+
+# Plain int copies of the opcodes, comparing against these in the
+# dispatch loop is much cheaper than going through the IntEnum.
+GET_LOCAL = int(OpCode.GET_LOCAL)
+CONSTANT = int(OpCode.CONSTANT)
+STORE_LOCAL = int(OpCode.STORE_LOCAL)
+ADD = int(OpCode.ADD)
+SUBTRACT = int(OpCode.SUBTRACT)
+LESS = int(OpCode.LESS)
+LESS_EQUAL = int(OpCode.LESS_EQUAL)
+JUMP_IF_FALSE = int(OpCode.JUMP_IF_FALSE)
+JUMP = int(OpCode.JUMP)
+GET_GLOBAL = int(OpCode.GET_GLOBAL)
+CALL = int(OpCode.CALL)
+RETURN = int(OpCode.RETURN)
+POP = int(OpCode.POP)
+GET_UPVALUE = int(OpCode.GET_UPVALUE)
+SET_UPVALUE = int(OpCode.SET_UPVALUE)
+SET_LOCAL = int(OpCode.SET_LOCAL)
+INVOKE = int(OpCode.INVOKE)
+GET_PROPERTY = int(OpCode.GET_PROPERTY)
+SET_PROPERTY = int(OpCode.SET_PROPERTY)
+MULTIPLY = int(OpCode.MULTIPLY)
+DIVIDE = int(OpCode.DIVIDE)
+GREATER = int(OpCode.GREATER)
+GREATER_EQUAL = int(OpCode.GREATER_EQUAL)
+EQUAL = int(OpCode.EQUAL)
+NOT_EQUAL = int(OpCode.NOT_EQUAL)
+NOT = int(OpCode.NOT)
+NEGATE = int(OpCode.NEGATE)
+JUMP_IF_FALSE_OR_POP = int(OpCode.JUMP_IF_FALSE_OR_POP)
+JUMP_IF_TRUE_OR_POP = int(OpCode.JUMP_IF_TRUE_OR_POP)
+NIL = int(OpCode.NIL)
+TRUE = int(OpCode.TRUE)
+FALSE = int(OpCode.FALSE)
+PRINT = int(OpCode.PRINT)
+SET_GLOBAL = int(OpCode.SET_GLOBAL)
+DEFINE_GLOBAL = int(OpCode.DEFINE_GLOBAL)
+CLOSURE = int(OpCode.CLOSURE)
+CLOSE_UPVALUE = int(OpCode.CLOSE_UPVALUE)
+GET_SUPER = int(OpCode.GET_SUPER)
+SUPER_INVOKE = int(OpCode.SUPER_INVOKE)
+CLASS = int(OpCode.CLASS)
+INHERIT = int(OpCode.INHERIT)
+METHOD = int(OpCode.METHOD)
+
+
+# ======== Runtime objects ======== #
+class VMUpvalue:
+    """
+    A reference to a captured variable. While the variable is still live
+    this points at a slot in the frame that declared it, once that slot
+    goes out of scope the value is moved into a cell of its own.
+    """
+    __slots__ = ("cells", "index")
+
+    def __init__(self, cells: List[Any], index: int) -> None:
+        self.cells = cells
+        self.index = index
+
+    def close(self) -> None:
+        self.cells = [self.cells[self.index]]
+        self.index = 0
+
+
+class VMClosure:
+    __slots__ = ("proto", "upvalues")
+
+    def __init__(self, proto: FunctionProto, upvalues: List[VMUpvalue]) -> None:
+        self.proto = proto
+        self.upvalues = upvalues
+
+    def __str__(self) -> str:
+        return f"<fn {self.proto.name}>"
+
+
+class VMClass:
+    __slots__ = ("name", "methods")
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.methods: Dict[str, VMClosure] = {}
+
+    def __str__(self) -> str:
+        return f"LoxClass({self.name})"
+
+
+class VMInstance:
+    __slots__ = ("lox_class", "fields")
+
+    def __init__(self, lox_class: VMClass) -> None:
+        self.lox_class = lox_class
+        self.fields: Dict[str, Any] = {}
+
+    def __str__(self) -> str:
+        fields = ",".join(f"{fname}" for fname in self.fields.keys())
+        return f"LoxInstance({self.lox_class.name}) [{fields}]"
+
+
+class VMBoundMethod:
+    __slots__ = ("receiver", "method")
+
+    def __init__(self, receiver: VMInstance, method: VMClosure) -> None:
+        self.receiver = receiver
+        self.method = method
+
+    def __str__(self) -> str:
+        return str(self.method)
+
+
+class VMFrame:
+    __slots__ = ("closure", "slots", "ip", "open_upvalues")
+
+    def __init__(self, closure: VMClosure, slots: List[Any]) -> None:
+        self.closure = closure
+        self.slots = slots
+        self.ip = 0
+        self.open_upvalues: Optional[Dict[int, VMUpvalue]] = None
+
+
+class VM:
+    """
+    VM
+    Executes compiled Lox bytecode. Globals persist across calls to
+    run() so that the VM can back a REPL.
+    """
+
+    def __init__(self, max_frames: int=10000) -> None:
+        self.max_frames = max_frames
+        self.globals: Dict[str, Any] = dict(BUILTIN_MAP)
+        self.stack: List[Any] = []
+        self.frames: List[VMFrame] = []
+
+    def _new_frame(self, closure: VMClosure, argc: int, token: Optional[Token]) -> VMFrame:
+        """
+        Build the frame for a call to closure. The callee (or receiver) and
+        arguments are the top argc + 1 entries of the stack, these become
+        the first slots of the new frame.
+        """
+        proto = closure.proto
+        if argc != proto.arity:
+            raise LoxRuntimeError(token, f"Expected {proto.arity} arguments, got {argc}")    # type: ignore
+        if len(self.frames) >= self.max_frames:
+            raise LoxRuntimeError(token, "Stack overflow")     # type: ignore
+
+        stack = self.stack
+        slots = stack[-argc - 1:]
+        del stack[-argc - 1:]
+        if proto.num_slots > argc + 1:
+            slots.extend([None] * (proto.num_slots - argc - 1))
+
+        return VMFrame(closure, slots)
+
+    def _call_value(self, callee: Any, argc: int, token: Optional[Token]) -> Optional[VMFrame]:
+        """
+        Call anything that isn't a plain closure. Returns a new frame if
+        the call needs one, otherwise the result is left on the stack.
+        """
+        stack = self.stack
+
+        if isinstance(callee, VMClosure):
+            return self._new_frame(callee, argc, token)
+
+        if isinstance(callee, VMBoundMethod):
+            stack[-argc - 1] = callee.receiver
+            return self._new_frame(callee.method, argc, token)
+
+        if isinstance(callee, VMClass):
+            stack[-argc - 1] = VMInstance(callee)
+            initializer = callee.methods.get("init")
+            if initializer is not None:
+                return self._new_frame(initializer, argc, token)
+            if argc != 0:
+                raise LoxRuntimeError(token, f"Expected 0 arguments, got {argc}")    # type: ignore
+            return None
+
+        if isinstance(callee, LoxCallable):
+            if argc != callee.arity():
+                raise LoxRuntimeError(token, f"Expected {callee.arity()} arguments, got {argc}")     # type: ignore
+            args = stack[len(stack) - argc:]
+            del stack[-argc - 1:]
+            try:
+                stack.append(callee.call(self, args))
+            except (NotImplementedError, TypeError, ValueError) as e:
+                raise LoxRuntimeError(token, str(e))    # type: ignore
+            return None
+
+        raise LoxRuntimeError(token, "Can only call functions")      # type: ignore
+
+    def _invoke(self, receiver: Any, name: str, argc: int, token: Optional[Token]) -> Optional[VMFrame]:
+        if not isinstance(receiver, VMInstance):
+            raise LoxRuntimeError(token, "Only instances have properties")   # type: ignore
+
+        # Fields shadow methods
+        if name in receiver.fields:
+            value = receiver.fields[name]
+            self.stack[-argc - 1] = value
+            return self._call_value(value, argc, token)
+
+        method = receiver.lox_class.methods.get(name)
+        if method is None:
+            raise LoxRuntimeError(token, f"Undefined property '{name}' on class '{receiver.lox_class.name}'")   # type: ignore
+
+        return self._new_frame(method, argc, token)
+
+    def _capture_upvalue(self, frame: VMFrame, slot: int) -> VMUpvalue:
+        if frame.open_upvalues is None:
+            frame.open_upvalues = {}
+
+        upvalue = frame.open_upvalues.get(slot)
+        if upvalue is None:
+            upvalue = VMUpvalue(frame.slots, slot)
+            frame.open_upvalues[slot] = upvalue
+
+        return upvalue
+
+    def _number_operands(self, token: Optional[Token], left: Any, right: Any) -> None:
+        if type(left) is not float:
+            raise LoxRuntimeError(token, f"Left operand to [{token.lexeme}] must be a number")    # type: ignore
+        if type(right) is not float:
+            raise LoxRuntimeError(token, f"Right operand to [{token.lexeme}] must be a number")   # type: ignore
+
+    def run(self, proto: FunctionProto) -> Any:
+        """
+        Execute a compiled top level script, returning the value it returns
+        (which is always nil for a script).
+        """
+
+        stack = self.stack
+        push = stack.append
+        pop = stack.pop
+        frames = self.frames
+        globals_ = self.globals
+
+        frame = VMFrame(VMClosure(proto, []), [None] * proto.num_slots)
+        code = proto.chunk.code
+        consts = proto.chunk.constants
+        tokens = proto.chunk.tokens
+        upvalues = frame.closure.upvalues
+        slots = frame.slots
+        ip = 0
+        base_frames = len(frames)
+
+        try:
+            while True:
+                op = code[ip]
+                ip += 1
+
+                if op == GET_LOCAL:
+                    push(slots[code[ip]])
+                    ip += 1
+                elif op == CONSTANT:
+                    push(consts[code[ip]])
+                    ip += 1
+                elif op == STORE_LOCAL:
+                    slots[code[ip]] = pop()
+                    ip += 1
+                elif op == ADD:
+                    b = pop()
+                    a = stack[-1]
+                    if type(a) is float and type(b) is float:
+                        stack[-1] = a + b
+                    elif type(a) is str and type(b) is str:
+                        stack[-1] = a + b
+                    else:
+                        self._number_operands(tokens[ip - 1], a, b)
+                elif op == SUBTRACT:
+                    b = pop()
+                    a = stack[-1]
+                    if type(a) is not float or type(b) is not float:
+                        self._number_operands(tokens[ip - 1], a, b)
+                    stack[-1] = a - b
+                elif op == LESS:
+                    b = pop()
+                    a = stack[-1]
+                    if type(a) is not float or type(b) is not float:
+                        self._number_operands(tokens[ip - 1], a, b)
+                    stack[-1] = a < b
+                elif op == LESS_EQUAL:
+                    b = pop()
+                    a = stack[-1]
+                    if type(a) is not float or type(b) is not float:
+                        self._number_operands(tokens[ip - 1], a, b)
+                    stack[-1] = a <= b
+                elif op == JUMP_IF_FALSE:
+                    value = pop()
+                    if value is None or value is False:
+                        ip = code[ip]
+                    else:
+                        ip += 1
+                elif op == JUMP:
+                    ip = code[ip]
+                elif op == GET_GLOBAL:
+                    name = consts[code[ip]]
+                    ip += 1
+                    try:
+                        push(globals_[name])
+                    except KeyError:
+                        raise LoxRuntimeError(tokens[ip - 1], f"Undefined variable {name}")   # type: ignore
+                elif op == CALL or op == INVOKE or op == SUPER_INVOKE:
+                    if op == CALL:
+                        argc = code[ip]
+                        ip += 1
+                        callee = stack[-argc - 1]
+                        if type(callee) is VMClosure:
+                            new_frame = self._new_frame(callee, argc, tokens[ip - 1])
+                        else:
+                            new_frame = self._call_value(callee, argc, tokens[ip - 1])
+                    elif op == INVOKE:
+                        name = consts[code[ip]]
+                        argc = code[ip + 1]
+                        ip += 2
+                        new_frame = self._invoke(stack[-argc - 1], name, argc, tokens[ip - 1])
+                    else:
+                        name = consts[code[ip]]
+                        argc = code[ip + 1]
+                        ip += 2
+                        superclass = pop()
+                        method = superclass.methods.get(name)
+                        if method is None:
+                            raise LoxRuntimeError(tokens[ip - 1], f"Undefined property '{name}'")    # type: ignore
+                        new_frame = self._new_frame(method, argc, tokens[ip - 1])
+
+                    if new_frame is not None:
+                        frame.ip = ip
+                        frames.append(frame)
+                        frame = new_frame
+                        proto = frame.closure.proto
+                        code = proto.chunk.code
+                        consts = proto.chunk.constants
+                        tokens = proto.chunk.tokens
+                        upvalues = frame.closure.upvalues
+                        slots = frame.slots
+                        ip = 0
+                elif op == RETURN:
+                    result = pop()
+                    if len(frames) == base_frames:
+                        return result
+
+                    frame = frames.pop()
+                    proto = frame.closure.proto
+                    code = proto.chunk.code
+                    consts = proto.chunk.constants
+                    tokens = proto.chunk.tokens
+                    upvalues = frame.closure.upvalues
+                    slots = frame.slots
+                    ip = frame.ip
+                    push(result)
+                elif op == POP:
+                    pop()
+                elif op == GET_UPVALUE:
+                    upvalue = upvalues[code[ip]]
+                    push(upvalue.cells[upvalue.index])
+                    ip += 1
+                elif op == SET_UPVALUE:
+                    upvalue = upvalues[code[ip]]
+                    upvalue.cells[upvalue.index] = stack[-1]
+                    ip += 1
+                elif op == SET_LOCAL:
+                    slots[code[ip]] = stack[-1]
+                    ip += 1
+                elif op == GET_PROPERTY:
+                    name = consts[code[ip]]
+                    ip += 1
+                    obj = stack[-1]
+                    if type(obj) is not VMInstance:
+                        raise LoxRuntimeError(tokens[ip - 1], "Only instances have properties")    # type: ignore
+                    if name in obj.fields:
+                        stack[-1] = obj.fields[name]
+                    else:
+                        method = obj.lox_class.methods.get(name)
+                        if method is None:
+                            raise LoxRuntimeError(
+                                tokens[ip - 1],     # type: ignore
+                                f"Undefined property '{name}' on class '{obj.lox_class.name}'"
+                            )
+                        stack[-1] = VMBoundMethod(obj, method)
+                elif op == SET_PROPERTY:
+                    value = pop()
+                    obj = stack[-1]
+                    if type(obj) is not VMInstance:
+                        raise LoxRuntimeError(tokens[ip], "Only instances have fields")     # type: ignore
+                    obj.fields[consts[code[ip]]] = value
+                    stack[-1] = value
+                    ip += 1
+                elif op == MULTIPLY:
+                    b = pop()
+                    a = stack[-1]
+                    if type(a) is not float or type(b) is not float:
+                        self._number_operands(tokens[ip - 1], a, b)
+                    stack[-1] = a * b
+                elif op == DIVIDE:
+                    b = pop()
+                    a = stack[-1]
+                    if type(a) is not float or type(b) is not float:
+                        self._number_operands(tokens[ip - 1], a, b)
+                    if b == 0.0:
+                        raise LoxRuntimeError(tokens[ip - 1], "Division by zero")     # type: ignore
+                    stack[-1] = a / b
+                elif op == GREATER:
+                    b = pop()
+                    a = stack[-1]
+                    if type(a) is not float or type(b) is not float:
+                        self._number_operands(tokens[ip - 1], a, b)
+                    stack[-1] = a > b
+                elif op == GREATER_EQUAL:
+                    b = pop()
+                    a = stack[-1]
+                    if type(a) is not float or type(b) is not float:
+                        self._number_operands(tokens[ip - 1], a, b)
+                    stack[-1] = a >= b
+                elif op == EQUAL:
+                    b = pop()
+                    stack[-1] = is_equal(stack[-1], b)
+                elif op == NOT_EQUAL:
+                    b = pop()
+                    stack[-1] = not is_equal(stack[-1], b)
+                elif op == NOT:
+                    value = stack[-1]
+                    stack[-1] = value is None or value is False
+                elif op == NEGATE:
+                    value = stack[-1]
+                    if type(value) is not float:
+                        raise LoxRuntimeError(tokens[ip - 1], "Operand must be a number")     # type: ignore
+                    stack[-1] = -value
+                elif op == JUMP_IF_FALSE_OR_POP:
+                    value = stack[-1]
+                    if value is None or value is False:
+                        ip = code[ip]
+                    else:
+                        pop()
+                        ip += 1
+                elif op == JUMP_IF_TRUE_OR_POP:
+                    value = stack[-1]
+                    if value is None or value is False:
+                        pop()
+                        ip += 1
+                    else:
+                        ip = code[ip]
+                elif op == NIL:
+                    push(None)
+                elif op == TRUE:
+                    push(True)
+                elif op == FALSE:
+                    push(False)
+                elif op == PRINT:
+                    print(stringify(pop()))
+                elif op == SET_GLOBAL:
+                    name = consts[code[ip]]
+                    ip += 1
+                    if name not in globals_:
+                        raise LoxRuntimeError(tokens[ip - 1], f"Undefined variable {name}")   # type: ignore
+                    globals_[name] = stack[-1]
+                elif op == DEFINE_GLOBAL:
+                    globals_[consts[code[ip]]] = pop()
+                    ip += 1
+                elif op == CLOSURE:
+                    fn_proto = consts[code[ip]]
+                    ip += 1
+                    captured = []
+                    for is_local, index in fn_proto.upvalues:
+                        if is_local:
+                            captured.append(self._capture_upvalue(frame, index))
+                        else:
+                            captured.append(upvalues[index])
+                    push(VMClosure(fn_proto, captured))
+                elif op == CLOSE_UPVALUE:
+                    slot = code[ip]
+                    ip += 1
+                    if frame.open_upvalues is not None and slot in frame.open_upvalues:
+                        frame.open_upvalues.pop(slot).close()
+                elif op == GET_SUPER:
+                    name = consts[code[ip]]
+                    ip += 1
+                    superclass = pop()
+                    method = superclass.methods.get(name)
+                    if method is None:
+                        raise LoxRuntimeError(tokens[ip - 1], f"Undefined property '{name}'")    # type: ignore
+                    stack[-1] = VMBoundMethod(stack[-1], method)
+                elif op == CLASS:
+                    push(VMClass(consts[code[ip]]))
+                    ip += 1
+                elif op == INHERIT:
+                    subclass = pop()
+                    superclass = pop()
+                    if not isinstance(superclass, VMClass):
+                        raise LoxRuntimeError(
+                            tokens[ip - 1],     # type: ignore
+                            f"Superclass of '{subclass.name}' must be a class"
+                        )
+                    # Copy down the inherited methods, overrides are added after this
+                    subclass.methods.update(superclass.methods)
+                elif op == METHOD:
+                    method = pop()
+                    stack[-1].methods[consts[code[ip]]] = method
+                    ip += 1
+                else:
+                    raise RuntimeError(f"Unknown opcode {op}")
+        finally:
+            # Unwind anything left behind by an error so the VM can be reused
+            del frames[base_frames:]
+            stack.clear()
+
+    # Entry point method
+    def interpret(self, stmts: Sequence[Stmt]) -> Any:
+        """
+        Compile and run a resolved Sequence of Lox Statements
+        """
+        return self.run(compile_program(stmts))
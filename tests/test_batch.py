@@ -0,0 +1,96 @@
+"""
+TEST_BATCH
+Unit tests for the batch runner
+
+"""
+
+import pytest
+
+from loxpy.batch import (
+    STATUS_OK,
+    STATUS_ERROR,
+    STATUS_RUNTIME_ERROR,
+    STATUS_CRASH,
+    BatchRunner,
+    find_scripts,
+    run_batch,
+    run_script,
+)
+
+
+SCRIPTS = {
+    "ok.lox": "var a = 1;\nprint a + 1;",
+    "parse_error.lox": "print 1;\nprint 1 +;",
+    "resolve_error.lox": "{ var a = 1; var a = 2; }",
+    "runtime_error.lox": 'print "before";\nprint "a" - 1;\nprint "after";',
+    "sub/globals.lox": "print a;",
+    "zero.lox": "print 1 / 0;",
+}
+
+
+def write_scripts(tmp_path) -> None:
+    (tmp_path / "sub").mkdir()
+    for name, source in SCRIPTS.items():
+        (tmp_path / name).write_text(source)
+    (tmp_path / "notes.txt").write_text("not a script")
+    # Can't be decoded, which isn't a Lox error at all
+    (tmp_path / "bad_utf8.lox").write_bytes(b'print "\xff";')
+
+
+def test_run_script(tmp_path) -> None:
+    write_scripts(tmp_path)
+
+    result = run_script(str(tmp_path / "ok.lox"))
+    assert result.status == STATUS_OK
+    assert result.stdout == "2\n"
+    assert result.elapsed > 0
+
+    result = run_script(str(tmp_path / "parse_error.lox"))
+    assert result.status == STATUS_ERROR
+    # Nothing runs if the script doesn't parse
+    assert result.stdout.startswith("[line 2]: Error at [;]")
+
+    assert run_script(str(tmp_path / "resolve_error.lox")).status == STATUS_ERROR
+
+    result = run_script(str(tmp_path / "runtime_error.lox"))
+    assert result.status == STATUS_RUNTIME_ERROR
+    assert result.stdout.split("\n")[0] == "before"
+    assert "after" not in result.stdout
+
+    result = run_script(str(tmp_path / "bad_utf8.lox"))
+    assert result.status == STATUS_CRASH
+    assert result.stdout.startswith("UnicodeDecodeError")
+
+
+@pytest.mark.parametrize("jobs", [1, 2])
+def test_run_batch(tmp_path, jobs) -> None:
+    write_scripts(tmp_path)
+
+    results = run_batch([str(tmp_path)], jobs=jobs)
+    assert [r.filename for r in results] == [str(tmp_path / name) for name in sorted([*SCRIPTS, "bad_utf8.lox"])]
+
+    # Each script has its own globals, so a is undefined in globals.lox
+    # even though ok.lox defined it
+    statuses = {r.filename[len(str(tmp_path)) + 1:]: r.status for r in results}
+    # One script failing doesn't stop the others
+    assert statuses == {
+        "bad_utf8.lox": STATUS_CRASH,
+        "ok.lox": STATUS_OK,
+        "parse_error.lox": STATUS_ERROR,
+        "resolve_error.lox": STATUS_ERROR,
+        "runtime_error.lox": STATUS_RUNTIME_ERROR,
+        "sub/globals.lox": STATUS_RUNTIME_ERROR,
+        "zero.lox": STATUS_RUNTIME_ERROR,
+    }
+
+
+def test_batch_runner_reuse(tmp_path) -> None:
+    write_scripts(tmp_path)
+    filenames = find_scripts([str(tmp_path / "ok.lox"), str(tmp_path / "sub")])
+    assert filenames == [str(tmp_path / "ok.lox"), str(tmp_path / "sub" / "globals.lox")]
+
+    # The same workers run any number of batches
+    with BatchRunner(jobs=2) as runner:
+        for _ in range(3):
+            assert [r.status for r in runner.run(filenames)] == [STATUS_OK, STATUS_RUNTIME_ERROR]
+    assert runner.pool is None
@@ -0,0 +1,111 @@
+"""
+TEST_CACHE
+Unit tests for the cache of resolved programs
+
+"""
+
+import io
+import os
+from contextlib import redirect_stdout
+
+from loxpy.scanner import Scanner
+from loxpy.parser import Parser
+from loxpy.resolver import Resolver
+from loxpy.interpreter import Interpreter
+from loxpy.cache import (
+    CACHE_DIR_NAME,
+    CachedProgram,
+    cache_path,
+    load_program,
+    save_program,
+    source_digest,
+)
+from loxpy.util import load_source
+
+
+FIB_FUNC_PROGRAM = "programs/fib_func.lox"
+UNUSED_VAR_PROGRAM = "programs/unused_var.lox"
+
+
+def build_program(filename: str) -> CachedProgram:
+    messages = io.StringIO()
+    with redirect_stdout(messages):
+        stmts = Parser(Scanner(load_source(filename)).scan()).parse()
+        Resolver().resolve(stmts)
+
+    return CachedProgram(stmts, messages.getvalue())
+
+
+def test_cache_round_trip(tmp_path, capsys) -> None:
+    filename = FIB_FUNC_PROGRAM
+    digest = source_digest(filename)
+    program = build_program(filename)
+
+    assert load_program(filename, digest, str(tmp_path)) is None
+    assert save_program(filename, digest, program, str(tmp_path))
+
+    cached = load_program(filename, digest, str(tmp_path))
+    assert cached is not None
+    assert cached.stmts == program.stmts
+
+    # The cached program runs the same as a fresh one
+    Interpreter().interpret(program.stmts)
+    exp_out = capsys.readouterr().out
+    Interpreter().interpret(cached.stmts)
+    assert capsys.readouterr().out == exp_out
+
+
+def test_cache_keeps_messages(tmp_path) -> None:
+    filename = UNUSED_VAR_PROGRAM
+    digest = source_digest(filename)
+    program = build_program(filename)
+    assert "unused" in program.messages
+
+    save_program(filename, digest, program, str(tmp_path))
+    cached = load_program(filename, digest, str(tmp_path))
+    assert cached is not None
+    assert cached.messages == program.messages
+
+
+def test_cache_stale(tmp_path) -> None:
+    filename = tmp_path / "prog.lox"
+    filename.write_text("print 1;")
+    digest = source_digest(str(filename))
+    save_program(str(filename), digest, build_program(str(filename)))
+
+    # By default the cache goes next to the script
+    path = cache_path(str(filename))
+    assert os.path.dirname(path) == str(tmp_path / CACHE_DIR_NAME)
+    assert os.path.exists(path)
+    assert load_program(str(filename), digest) is not None
+
+    # Changing the source invalidates the cache
+    filename.write_text("print 2;")
+    new_digest = source_digest(str(filename))
+    assert new_digest != digest
+    assert load_program(str(filename), new_digest) is None
+
+    # As does a corrupt cache file
+    with open(path, "r+b") as fp:
+        fp.seek(-10, os.SEEK_END)
+        fp.write(b"\x00" * 10)
+    assert load_program(str(filename), digest) is None
+
+
+def test_cache_path() -> None:
+    # Scripts with the same name in different directories get their own
+    # files in a shared cache dir
+    a = cache_path("a/prog.lox", "cache")
+    b = cache_path("b/prog.lox", "cache")
+    assert a != b
+    assert os.path.dirname(a) == "cache"
+
+    assert cache_path("a/prog.lox") != cache_path("b/prog.lox")
+
+
+def test_cache_unwritable(tmp_path) -> None:
+    not_a_dir = tmp_path / "file"
+    not_a_dir.write_text("")
+
+    program = build_program(FIB_FUNC_PROGRAM)
+    assert save_program(FIB_FUNC_PROGRAM, "digest", program, str(not_a_dir)) is False
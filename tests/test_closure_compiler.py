@@ -0,0 +1,258 @@
+import pytest
+from typing import Sequence
+
+from loxpy.scanner import Scanner
+from loxpy.parser import Parser
+from loxpy.resolver import Resolver
+from loxpy.interpreter import Interpreter
+from loxpy.statement import Stmt
+from loxpy.closure_compiler import ClosureCompiler, CompiledFunction
+from loxpy.callable import LoxInstance
+from loxpy.token import Str2Token
+from loxpy.util import load_source
+
+
+FIB_FUNC_PROGRAM = "programs/fib_func.lox"
+CLOSURE_PROGRAM  = "programs/closure.lox"
+SUPER_PROGRAM    = "programs/super.lox"
+SHADOW_PROGRAM   = "programs/shadow.lox"
+LOGIC_PROGRAM    = "programs/logic.lox"
+
+
+def parse_input(expr_src: str) -> Sequence[Stmt]:
+    scanner       = Scanner(expr_src)
+    token_list    = scanner.scan()
+    parser        = Parser(token_list)
+    parsed_output = parser.parse()
+
+    return parsed_output
+
+
+def run_both(source: str, capsys) -> Sequence[str]:
+    """
+    Run source with the tree-walker and then with the closure compiler,
+    checking that both produce the same output.
+    """
+    outputs = []
+    for compile_closures in (False, True):
+        interp = Interpreter(compile_closures=compile_closures)
+        stmts = parse_input(source)
+        Resolver().resolve(stmts)
+        interp.interpret(stmts)
+        outputs.append(capsys.readouterr().out.split("\n")[:-1])
+
+    assert outputs[0] == outputs[1]
+
+    return outputs[1]
+
+
+def test_compile_returns_closures() -> None:
+    interp = Interpreter()
+    stmts = parse_input("var a = 1 + 2; func f(x) { return x; }")
+    Resolver().resolve(stmts)
+
+    compiled = ClosureCompiler(interp).compile(stmts)
+    assert len(compiled) == 2
+    assert all(callable(c) for c in compiled)
+
+    # Nothing runs until the closures are called
+    assert "a" not in interp.globals.values
+
+    for c in compiled:
+        c(interp.globals)
+
+    assert interp.globals.values["a"] == 3.0
+    assert isinstance(interp.globals.values["f"], CompiledFunction)
+
+
+def test_closures_fib_func(capsys) -> None:
+    out = run_both(load_source(FIB_FUNC_PROGRAM), capsys)
+
+    exp_out = ["0", "1", "1", "2", "3", "5", "8", "13", "21", "34"]
+    assert out == exp_out
+
+
+def test_closures_closure(capsys) -> None:
+    out = run_both(load_source(CLOSURE_PROGRAM), capsys)
+
+    assert out == [f"{i}" for i in range(1, 11)]
+
+
+def test_closures_shadow(capsys) -> None:
+    out = run_both(load_source(SHADOW_PROGRAM), capsys)
+
+    exp_out = [
+        "inner a", "outer b", "global c",
+        "outer a", "outer b", "global c",
+        "global a", "global b", "global c"
+    ]
+    assert out == exp_out
+
+
+def test_closures_super(capsys) -> None:
+    out = run_both(load_source(SUPER_PROGRAM), capsys)
+
+    assert out == ["A method"]
+
+
+def test_closures_logic(capsys) -> None:
+    run_both(load_source(LOGIC_PROGRAM), capsys)
+
+
+def test_closures_results_match_tree_walker() -> None:
+    source = """
+    class Foo {
+        init(a) { this.a = a; }
+    }
+    var f = Foo(1);
+    var ff = f.init(2);
+    var s = "a" + "b";
+    var n = -(2 * 3) / 4;
+    var i = 0;
+    while(i < 3) i = i + 1;
+    """
+
+    results = []
+    for compile_closures in (False, True):
+        interp = Interpreter(compile_closures=compile_closures, collect_results=True)
+        stmts = parse_input(source)
+        Resolver().resolve(stmts)
+        results.append(interp.interpret(stmts))
+        g = interp.globals
+
+        assert isinstance(g.get(Str2Token("f")), LoxInstance)
+        assert g.get(Str2Token("f")) is g.get(Str2Token("ff"))
+        assert g.get(Str2Token("f")).fields["a"] == 2.0
+        assert g.get(Str2Token("s")) == "ab"
+        assert g.get(Str2Token("n")) == -1.5
+        assert g.get(Str2Token("i")) == 3.0
+
+    assert len(results[0]) == len(results[1])
+
+    # Without collect_results neither mode builds result lists
+    for compile_closures in (False, True):
+        interp = Interpreter(compile_closures=compile_closures)
+        stmts = parse_input(source)
+        Resolver().resolve(stmts)
+        assert interp.interpret(stmts) is None
+
+
+def test_closures_runtime_error(capsys) -> None:
+    source = """
+    func add(a, b) {
+        return a + b;
+    }
+    add(1, "two");
+    """
+    out = run_both(source, capsys)
+
+    assert len(out) == 1
+    assert "Right operand to [+] must be a number" in out[0]
+    assert "(line 3)" in out[0]
+
+
+def test_closures_division_by_zero_and_stack_overflow(capsys) -> None:
+    out = run_both("var a = 1; var b = 0; print a / b;", capsys)
+    assert out == ["Got runtime error [Division by zero] at / (line 1)"]
+
+    # Through a plain call and through a method invocation
+    for source in ["func g(n) { return g(n + 1); } g(0);", "class A { f(n) { return this.f(n + 1); } } A().f(0);"]:
+        out = run_both(source, capsys)
+        assert [line.split(" at ")[0] for line in out] == ["Got runtime error [Stack overflow]"]
+
+
+def test_closures_return_from_nested_loops(capsys) -> None:
+    source = """
+    func find(target) {
+        for(var i = 0; i < 10; i = i + 1) {
+            var j = 0;
+            while(j < 10) {
+                if(i * 10 + j == target) return i;
+                j = j + 1;
+            }
+        }
+        print "not found";
+    }
+    print find(42);
+    print find(100);
+    """
+    out = run_both(source, capsys)
+
+    assert out == ["4", "not found", "nil"]
+
+
+def test_closures_inline_caches(capsys) -> None:
+    source = """
+    class A {
+        init(n) { this.n = n; }
+        get() { return this.n; }
+    }
+    class B < A {
+        init(n) { super.init(n * 10); }
+    }
+    class C < B {}
+
+    var c;
+    for(var i = 0; i < 3; i = i + 1) {
+        var a = A(i);
+        c = C(i);
+        print a.get() + c.get();
+    }
+    c.get = "field";
+    print c.get;
+    C();
+    """
+    out = run_both(source, capsys)
+
+    assert out[:-1] == ["0", "11", "22", "field"]
+    assert "Expected 1 arguments, got 0" in out[-1]
+
+
+def test_closures_method_invocation(capsys) -> None:
+    source = """
+    class Counter {
+        init(start) { this.count = start; }
+        add(n) { this.count = this.count + n; return this; }
+        adder() {
+            func add(n) { return this.add(n); }
+            return add;
+        }
+    }
+    class Doubler < Counter {
+        add(n) { return super.add(n * 2); }
+    }
+
+    var c = Doubler(1);
+    c.add(1).add(2);
+    print c.count;
+
+    var bound = c.add;
+    bound(3);
+    print c.count;
+
+    var add = c.adder();
+    add(4);
+    print c.count;
+
+    func twice(n) { return n * 2; }
+    c.fn = twice;
+    print c.fn(5);
+
+    print c.init(0) == c;
+    print c.count;
+    """
+    out = run_both(source, capsys)
+
+    assert out == ["7", "13", "21", "10", "true", "0"]
+
+
+def test_closures_equality_by_type(capsys) -> None:
+    out = run_both('print 1 == true; print 0 == false; print 0 != false; print nil == false; print "1" == 1; print 2 == 2;', capsys)
+
+    assert out == ["false", "false", "true", "false", "false", "true"]
+
+
+def test_closures_print_values(capsys) -> None:
+    out = run_both('print 1; print 1.5; print -3; print 1 / 3; print nil; print true; print "a";', capsys)
+
+    assert out == ["1", "1.5", "-3", f"{1 / 3}", "nil", "true", "a"]
@@ -0,0 +1,191 @@
+import pytest
+from typing import Sequence
+
+from loxpy.scanner import Scanner
+from loxpy.parser import Parser
+from loxpy.resolver import Resolver
+from loxpy.statement import Stmt
+from loxpy.codegen import PythonRuntime, transpile
+from loxpy.error import LoxRuntimeError
+from loxpy.util import load_source
+
+
+FIB_FUNC_PROGRAM = "programs/fib_func.lox"
+CLOSURE_PROGRAM  = "programs/closure.lox"
+SUPER_PROGRAM    = "programs/super.lox"
+SHADOW_PROGRAM   = "programs/shadow.lox"
+
+
+def parse_input(expr_src: str) -> Sequence[Stmt]:
+    scanner       = Scanner(expr_src)
+    token_list    = scanner.scan()
+    parser        = Parser(token_list)
+    parsed_output = parser.parse()
+
+    return parsed_output
+
+
+def run_python(source: str, runtime: PythonRuntime=None) -> PythonRuntime:
+    stmts = parse_input(source)
+    Resolver().resolve(stmts)
+    runtime = runtime if runtime is not None else PythonRuntime()
+    runtime.execute(stmts)
+
+    return runtime
+
+
+def test_transpile_fib_func() -> None:
+    program = transpile(parse_input(load_source(FIB_FUNC_PROGRAM)))
+
+    assert program.source.startswith("def __lox_main__():")
+    assert "def g_fib(" in program.source
+    # Every line of generated code maps back to a Lox line
+    assert len(program.line_map) == len(program.source.splitlines())
+
+
+def test_codegen_fib_func(capsys) -> None:
+    run_python(load_source(FIB_FUNC_PROGRAM))
+    out = capsys.readouterr().out.split("\n")
+
+    exp_out = ["0", "1", "1", "2", "3", "5", "8", "13", "21", "34"]
+    assert out[:-1] == exp_out
+
+
+def test_codegen_closure(capsys) -> None:
+    run_python(load_source(CLOSURE_PROGRAM))
+    out = capsys.readouterr().out.split("\n")
+
+    assert out[:-1] == [f"{i}" for i in range(1, 11)]
+
+
+def test_codegen_closures_capture_each_iteration(capsys) -> None:
+    source = """
+    var first;
+    var second;
+    for(var i = 0; i < 2; i = i + 1) {
+        var j = i;
+        func get() { j = j + 10; return j; }
+        if(first == nil) first = get; else second = get;
+    }
+    print first();
+    print second();
+    print first();
+    """
+    run_python(source)
+    out = capsys.readouterr().out.split("\n")
+
+    assert out[:-1] == ["10", "11", "20"]
+
+
+def test_codegen_shadow(capsys) -> None:
+    run_python(load_source(SHADOW_PROGRAM))
+    out = capsys.readouterr().out.split("\n")
+
+    exp_out = [
+        "inner a", "outer b", "global c",
+        "outer a", "outer b", "global c",
+        "global a", "global b", "global c"
+    ]
+    assert out[:-1] == exp_out
+
+
+def test_codegen_super(capsys) -> None:
+    runtime = run_python(load_source(SUPER_PROGRAM))
+    out = capsys.readouterr().out.split("\n")
+
+    assert out[:-1] == ["A method"]
+    assert runtime.globals["c_out"] == "A method"
+
+
+def test_codegen_class_init_returns_this(capsys) -> None:
+    source = """
+    class Foo {
+        init(a) { this.a = a; }
+        get() { return this.a; }
+    }
+
+    var f = Foo(1);
+    var ff = f.init(2);
+    print Foo;
+    print f;
+    print f.get;
+    """
+    runtime = run_python(source)
+    out = capsys.readouterr().out.split("\n")
+
+    assert runtime.globals["f"] is runtime.globals["ff"]
+    assert runtime.globals["f"].p_a == 2.0
+    assert out[:-1] == ["LoxClass(Foo)", "LoxInstance(Foo) [a]", "<fn get>"]
+
+
+def test_codegen_keeps_globals_between_runs(capsys) -> None:
+    runtime = run_python("var a = 1;")
+    run_python("a = a + 1; print a;", runtime)
+    out = capsys.readouterr().out.split("\n")
+
+    assert out[:-1] == ["2"]
+
+
+def test_codegen_runtime_error() -> None:
+    source = """
+    func add(a, b) {
+        return a + b;
+    }
+    add(1, "two");
+    """
+
+    with pytest.raises(LoxRuntimeError, match=r"Right operand to \[\+\] must be a number") as err:
+        run_python(source)
+    assert err.value.token.line == 3
+
+    with pytest.raises(LoxRuntimeError, match=r"Expected 2 arguments, got 1") as err:
+        run_python("func f(a, b) {}\nf(1);")
+    assert err.value.token.line == 2
+
+    with pytest.raises(LoxRuntimeError, match=r"Expected 1 arguments, got 2") as err:
+        run_python("class A { m(a) {} }\nA().m(1, 2);")
+    assert err.value.token.line == 2
+
+    # Initializers, and classes without one
+    with pytest.raises(LoxRuntimeError, match=r"Expected 1 arguments, got 0") as err:
+        run_python("class A { init(a) {} }\nclass B < A {}\nB();")
+    assert err.value.token.line == 3
+    with pytest.raises(LoxRuntimeError, match=r"Expected 0 arguments, got 1"):
+        run_python("class A {}\nA(1);")
+
+    with pytest.raises(LoxRuntimeError, match=r"Undefined variable b") as err:
+        run_python("var a = 1;\n\nprint b;")
+    assert err.value.token.line == 3
+
+    with pytest.raises(LoxRuntimeError, match=r"Undefined variable b"):
+        run_python("b = 1;")
+
+    with pytest.raises(LoxRuntimeError, match=r"Undefined property 'x' on class 'A'"):
+        run_python("class A {}\nprint A().x;")
+
+    with pytest.raises(LoxRuntimeError, match=r"Can only call functions"):
+        run_python("var a = 1;\na();")
+
+
+def test_codegen_equality_by_type(capsys) -> None:
+    run_python('print 1 == true; print 0 == false; print 0 != false; print nil == false; print "1" == 1; print 2 == 2;')
+    out = capsys.readouterr().out.split("\n")
+
+    assert out[:-1] == ["false", "false", "true", "false", "false", "true"]
+
+
+def test_codegen_only_instances_have_properties(capsys) -> None:
+    # Classes, functions and strings are Python objects with attributes,
+    # but not Lox instances
+    for source in ["class A {} A.f = 1;", "class A { m() {} } A.m = 1;", "func g() {} g.x = 2;", 'var s = "x"; s.f = 1;']:
+        with pytest.raises(LoxRuntimeError, match="Only instances have fields"):
+            run_python(source)
+
+    for source in ["class A { m() { return 1; } } print A.m;", "func g() {} print g.x;", 'print "x".f;', "class A {} print (A).m;"]:
+        with pytest.raises(LoxRuntimeError, match="Only instances have properties"):
+            run_python(source)
+
+    run_python("print clock; class A { m() { return 1; } } var a = A(); a.f = 2; print a.f + a.m();")
+    out = capsys.readouterr().out.split("\n")
+
+    assert out[:-1] == ["<builtin clock", "3"]
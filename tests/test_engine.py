@@ -0,0 +1,125 @@
+"""
+TEST_ENGINE
+Unit tests for the embedding API
+
+"""
+
+import gc
+import io
+import threading
+import weakref
+
+import pytest
+
+from loxpy.engine import LoxEngine
+from loxpy.error import LoxParseError, LoxInterpreterError, LoxRuntimeError
+
+
+COUNTER = """
+var count = start;
+func bump() { count = count + 1; return count; }
+print bump();
+"""
+
+
+def test_compile_once_run_many(capsys) -> None:
+    engine = LoxEngine()
+    program = engine.compile(COUNTER)
+
+    first = engine.run(program, {"start": 1})
+    second = engine.run(program, {"start": 10})
+    assert first.output == "2\n"
+    assert second.output == "11\n"
+    # Each run has its own globals
+    assert first.get("count") == 2
+    assert second.get("count") == 11
+    assert "clock" in first.globals.values
+
+    # Nothing went to stdout
+    assert capsys.readouterr().out == ""
+
+
+def test_fork_globals() -> None:
+    engine = LoxEngine()
+    base = engine.eval(COUNTER, {"start": 0})
+    bump = engine.compile("print bump();")
+
+    fork = engine.run(bump, engine.fork(base.globals))
+    assert fork.output == "2\n"
+    assert fork.get("count") == 2
+    assert base.get("count") == 1
+
+    # Running on the globals themselves keeps the changes
+    engine.run(bump, base.globals)
+    engine.run(bump, base.globals)
+    assert base.get("count") == 3
+
+
+def test_output_stream() -> None:
+    out = io.StringIO()
+    result = LoxEngine().run(LoxEngine().compile('print "a"; print 1 + 2;'), output=out)
+    assert out.getvalue() == "a\n3\n"
+    assert result.output == ""
+
+
+def test_errors_raised() -> None:
+    engine = LoxEngine()
+    with pytest.raises(LoxParseError):
+        engine.compile("print 1 +;")
+    with pytest.raises(LoxInterpreterError):
+        engine.compile("{ var a = 1; var a = 2; }")
+
+    program = engine.compile('print "before"; print missing;')
+    with pytest.raises(LoxRuntimeError):
+        engine.run(program)
+    # A failed run doesn't affect the next one
+    assert engine.run(program, {"missing": 1}).output == "before\n1\n"
+
+    # Python errors in the program are reported as Lox ones
+    with pytest.raises(LoxRuntimeError, match="Division by zero"):
+        engine.eval("print 1 / 0;")
+    with pytest.raises(LoxRuntimeError, match="Stack overflow"):
+        engine.eval("func f() { return f(); } f();")
+
+
+def test_warnings_and_optimize(capsys) -> None:
+    program = LoxEngine(optimize=True).compile("func f() { var unused = 1; return 2 * 3; } print f(); @")
+    assert "unused" in program.messages
+    assert "unexpected character @" in program.messages
+    assert capsys.readouterr().out == ""
+    assert LoxEngine().run(program).output == "6\n"
+
+
+def test_threads() -> None:
+    engine = LoxEngine()
+    results = [None] * 8
+
+    # Each thread compiles its own program, with a warning only it gives
+    def run(n: int) -> None:
+        program = engine.compile(f"{{ var unused{n}; }} var total = 0; for (var i = 0; i < n; i = i + 1) total = total + i; print total;")
+        assert program.messages == f"WARNING: Variable [unused{n}] unused\n"
+        results[n] = engine.run(program, {"n": n * 100}).output
+
+    threads = [threading.Thread(target=run, args=(n,)) for n in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert results == [f"{sum(range(n * 100))}\n" for n in range(8)]
+
+
+def test_finished_run_is_freed() -> None:
+    engine = LoxEngine()
+    program = engine.compile("class A { m() { return 1; } } print A().m();")
+    result = engine.run(program)
+    assert result.output == "1\n"
+
+    # The inline cache for A().m mustn't keep the run's class, and so its
+    # globals, alive once the run is over
+    ref = weakref.ref(result.globals)
+    del result
+    gc.collect()
+    assert ref() is None
+
+    assert engine.run(program).output == "1\n"
@@ -1,7 +1,7 @@
 import pytest
 
 from loxpy.error import LoxRuntimeError
-from loxpy.environment import Environment
+from loxpy.environment import Environment, Frame
 from loxpy.token import Token, TokenType
 from loxpy.util import float_equal
 
@@ -99,3 +99,29 @@ def test_env_chain() -> None:
     out = env_chain(inner_env)
 
     assert out == exp_out
+
+
+def test_frame() -> None:
+    global_env = Environment()
+    global_env.define("a", 1.0)
+
+    outer = Frame([2.0, 3.0], global_env)
+    inner = Frame([None], outer)
+
+    assert len(inner) == 1
+    assert inner.get_at(0, 0) is None
+    assert inner.get_at(1, 1) == 3.0
+
+    inner.assign_at(0, 0, 4.0)
+    inner.assign_at(1, 0, 5.0)
+    assert inner.values == [4.0]
+    assert outer.values == [5.0, 3.0]
+
+    # Frames don't have a __dict__, only their slots
+    with pytest.raises(AttributeError):
+        inner.name = "inner"
+
+    from loxpy.environment import env_chain
+
+    exp_out = "Env(0) :\n\t0 : 4.0\nEnv(1) :\n\t0 : 5.0,\n\t1 : 3.0\nEnv(2) :\n\ta : 1.0\n"
+    assert env_chain(inner) == exp_out
@@ -1,3 +1,4 @@
+import pytest
 from typing import Sequence, Tuple
 
 from loxpy.expr import BinaryExpr, LiteralExpr, UnaryExpr
@@ -7,8 +8,10 @@ from loxpy.scanner import Scanner
 from loxpy.parser import Parser
 from loxpy.interpreter import Interpreter
 from loxpy.resolver import Resolver
+from loxpy.optimizer import specialize
 from loxpy.callable import LoxClass, LoxInstance
 from loxpy.util import load_source, float_equal
+from loxpy.error import LoxRuntimeError
 
 
 GLOBAL_VERBOSE = False
@@ -34,7 +37,7 @@ def get_resolver_and_interpreter(expr_str: str) -> Tuple[Resolver, Interpreter]:
 
     stmts = parse_input(expr_str)
     interp   = Interpreter(verbose=GLOBAL_VERBOSE)
-    resolver = Resolver(interp)
+    resolver = Resolver()
     resolver.resolve(stmts)
     interp.interpret(stmts)
 
@@ -43,11 +46,11 @@ def get_resolver_and_interpreter(expr_str: str) -> Tuple[Resolver, Interpreter]:
 
 
 def test_interpret_unary() -> None:
-    interp = Interpreter(verbose=GLOBAL_VERBOSE)
-    resolver = Resolver(interp)
+    interp = Interpreter(verbose=GLOBAL_VERBOSE, collect_results=True)
+    resolver = Resolver()
 
     # Test unary on number types
-    operand = Token(TokenType.NUMBER, "2", None, 1)
+    operand = Token(TokenType.NUMBER, "2", 2.0, 1)
     tok_minus  = Token(TokenType.MINUS, "-", None, 1)
     expr = [ExprStmt(UnaryExpr(tok_minus, LiteralExpr(operand)))]
 
@@ -57,7 +60,7 @@ def test_interpret_unary() -> None:
     assert float_equal(value[0], exp_value)
 
     # Test unary on boolean type 
-    operand = Token(TokenType.TRUE, "true", "true", 1)
+    operand = Token(TokenType.TRUE, "true", True, 1)
     tok_bang  = Token(TokenType.BANG, "!", None, 1)
     expr = [ExprStmt(UnaryExpr(tok_bang, LiteralExpr(operand)))]
 
@@ -70,7 +73,7 @@ def test_interpret_unary() -> None:
     # Bang works on number types, but it just applies "not is_true(v)" on any value v.
     # Since the truthiness of any value is True, this will always return False for any
     # numerical value
-    operand = Token(TokenType.NUMBER, "2", None, 1)
+    operand = Token(TokenType.NUMBER, "2", 2.0, 1)
     tok_bang  = Token(TokenType.BANG, "!", None, 1)
     expr = [ExprStmt(UnaryExpr(tok_bang, LiteralExpr(operand)))]
 
@@ -81,8 +84,8 @@ def test_interpret_unary() -> None:
 
 
 def test_interpret_binary() -> None:
-    interp = Interpreter(verbose=GLOBAL_VERBOSE)
-    resolver = Resolver(interp)
+    interp = Interpreter(verbose=GLOBAL_VERBOSE, collect_results=True)
+    resolver = Resolver()
 
     op_tokens = [
         Token(TokenType.PLUS, "+", None, 1),
@@ -92,8 +95,8 @@ def test_interpret_binary() -> None:
     ]
     exp_values = [6.0, -2.0, 8.0, 0.5]
 
-    tok_num1 = Token(TokenType.NUMBER, "2", None, 1)
-    tok_num2 = Token(TokenType.NUMBER, "4", None, 1)
+    tok_num1 = Token(TokenType.NUMBER, "2", 2.0, 1)
+    tok_num2 = Token(TokenType.NUMBER, "4", 4.0, 1)
 
     interp_values = []
     for op_tok in op_tokens:
@@ -128,23 +131,49 @@ def test_interpret_binary() -> None:
 #
 
 def test_interpret_print() -> None:
-    interp = Interpreter(verbose=GLOBAL_VERBOSE)
-    resolver = Resolver(interp)
+    interp = Interpreter(verbose=GLOBAL_VERBOSE, collect_results=True)
+    resolver = Resolver()
 
-    tok_string = Token(TokenType.STRING, "bet you can't print this", None, 1)
+    tok_string = Token(TokenType.STRING, "\"bet you can't print this\"", "bet you can't print this", 1)
     stmts = [PrintStmt(LiteralExpr(tok_string))]
 
     resolver.resolve(stmts)
     ret = interp.interpret(stmts)
     assert len(ret) == 1
-    assert ret[0] == tok_string
+    assert ret[0] == "bet you can't print this"
+
+
+def test_interpret_without_results() -> None:
+    source = """
+    var i = 0;
+    while(i < 3) {
+        var j = i;
+        i = j + 1;
+    }
+    print i;
+    """
+
+    stmts  = parse_input(source)
+    interp = Interpreter(verbose=GLOBAL_VERBOSE)
+    Resolver().resolve(stmts)
+
+    # By default no results are kept, only the side effects are visible
+    assert interp.interpret(stmts) is None
+    assert interp.environment.values["i"] == 3.0
+
+    stmts  = parse_input(source)
+    interp = Interpreter(verbose=GLOBAL_VERBOSE, collect_results=True)
+    Resolver().resolve(stmts)
+
+    # The while loop returns the results from its last iteration
+    assert interp.interpret(stmts) == [None, [None, 3.0], 3.0]
 
 
 def test_interpret_while() -> None:
     source   = load_source(WHILE_PROGRAM)
     stmts    = parse_input(source)
     interp   = Interpreter(verbose=GLOBAL_VERBOSE)
-    resolver = Resolver(interp)
+    resolver = Resolver()
 
     resolver.resolve(stmts)
     interp.interpret(stmts)
@@ -161,7 +190,7 @@ def test_interpret_for() -> None:
     source   = load_source(FOR_PROGRAM)
     stmts    = parse_input(source)
     interp   = Interpreter(verbose=GLOBAL_VERBOSE)
-    resolver = Resolver(interp)
+    resolver = Resolver()
 
     resolver.resolve(stmts)
     interp.interpret(stmts)
@@ -176,7 +205,7 @@ def test_interpret_fib_for() -> None:
     source   = load_source("programs/fib_for.lox")
     stmts    = parse_input(source)
     interp   = Interpreter(verbose=GLOBAL_VERBOSE)
-    resolver = Resolver(interp)
+    resolver = Resolver()
 
     resolver.resolve(stmts)
     interp.interpret(stmts)
@@ -191,7 +220,7 @@ def test_interpret_class_fields() -> None:
     source   = load_source("programs/class_fields.lox")
     stmts    = parse_input(source)
     interp   = Interpreter(verbose=GLOBAL_VERBOSE)
-    resolver = Resolver(interp)
+    resolver = Resolver()
 
     resolver.resolve(stmts)
     interp.interpret(stmts)
@@ -213,7 +242,7 @@ def test_interpret_class_methods() -> None:
     source   = load_source("programs/class_methods.lox")
     stmts    = parse_input(source)
     interp   = Interpreter(verbose=GLOBAL_VERBOSE)
-    resolver = Resolver(interp)
+    resolver = Resolver()
 
     resolver.resolve(stmts)
     interp.interpret(stmts)
@@ -223,20 +252,17 @@ def test_interpret_class_methods() -> None:
     expected_state = {
         "Methods": LoxClass,
         "m"      : LoxInstance,
-        "ma_out" : Token,
-        "mb_out" : Token,
+        "ma_out" : str,
+        "mb_out" : str,
     }
 
     for var_name, var_type in expected_state.items():
         assert var_name in interp.environment.values
         assert isinstance(interp.environment.values[var_name], var_type)
 
-    # Check that the Tokens ma_out and mb_out have the right values 
-    ma_out_exp = Token(TokenType.STRING, lexeme='"method a"', literal="method a", line=3, col=20)
-    mb_out_exp = Token(TokenType.STRING, lexeme='"method b"', literal="method b", line=7, col=20)
-
-    assert interp.environment.values["ma_out"] == ma_out_exp
-    assert interp.environment.values["mb_out"] == mb_out_exp
+    # Check that ma_out and mb_out have the right values
+    assert interp.environment.values["ma_out"] == "method a"
+    assert interp.environment.values["mb_out"] == "method b"
 
 
 
@@ -252,7 +278,7 @@ def test_class_init_returns_this() -> None:
 
     stmts    = parse_input(source)
     interp   = Interpreter(verbose=GLOBAL_VERBOSE)
-    resolver = Resolver(interp)
+    resolver = Resolver()
 
     resolver.resolve(stmts)
     interp.interpret(stmts)
@@ -271,3 +297,183 @@ def test_class_init_returns_this() -> None:
     # the instance of a Foo).
     assert interp.environment.values["f"] == interp.environment.values["ff"]
 
+
+
+def test_return_from_nested_loops(capsys) -> None:
+    source = """
+    func find(target) {
+        for(var i = 0; i < 10; i = i + 1) {
+            var j = 0;
+            while(j < 10) {
+                if(i * 10 + j == target) {
+                    return i;
+                }
+                j = j + 1;
+            }
+        }
+        print "not found";
+    }
+
+    func early() {
+        return;
+        print "unreachable";
+    }
+
+    var found = find(42);
+    var missing = find(100);
+    var nothing = early();
+    """
+
+    stmts    = parse_input(source)
+    interp   = Interpreter(verbose=GLOBAL_VERBOSE)
+    resolver = Resolver()
+
+    resolver.resolve(stmts)
+    interp.interpret(stmts)
+
+    # Returning stops the function, the loops and the blocks around it
+    assert capsys.readouterr().out == "not found\n"
+    assert interp.environment.values["found"] == 4.0
+    assert interp.environment.values["missing"] is None
+    assert interp.environment.values["nothing"] is None
+
+
+def test_get_expr_inline_cache(capsys) -> None:
+    source = """
+    class A {
+        name() { return "A"; }
+    }
+    class B < A {
+        name() { return "B"; }
+    }
+    class C < B {}
+
+    func describe(obj) {
+        return obj.name();
+    }
+
+    print describe(A());
+    print describe(C());
+    print describe(C());
+    var a = A();
+    a.name = "field";
+    print a.name;
+    """
+
+    stmts    = parse_input(source)
+    interp   = Interpreter(verbose=GLOBAL_VERBOSE)
+    resolver = Resolver()
+
+    resolver.resolve(stmts)
+    interp.interpret(stmts)
+
+    # The same site sees both classes, and fields shadow the cached method
+    assert capsys.readouterr().out == "A\nB\nB\nfield\n"
+
+    # The site in describe() caches the last class and the method found for it
+    call_expr = stmts[3].body[0].value
+    cls, method = call_expr.callee.cache
+    assert cls.name == "C"
+    assert method.decl.name.lexeme == "name"
+    assert method is interp.environment.values["B"].methods["name"]
+
+
+def test_class_method_table() -> None:
+    source = """
+    class A {
+        init(a, b) {}
+        one() { return 1; }
+        two() { return 2; }
+    }
+    class B < A {
+        two() { return 22; }
+    }
+    class C < B {
+        init() {}
+        three() { return 3; }
+    }
+    """
+
+    _, interp = get_resolver_and_interpreter(source)
+    a, b, c = (interp.environment.values[name] for name in ("A", "B", "C"))
+
+    # Each class has all of its inherited methods in one table, with
+    # overrides replacing the superclass version
+    assert set(a.method_table.keys()) == {"init", "one", "two"}
+    assert b.method_table["one"] is a.methods["one"]
+    assert b.method_table["two"] is b.methods["two"]
+    assert set(c.method_table.keys()) == {"init", "one", "two", "three"}
+    assert c.find_method("two") is b.methods["two"]
+    assert c.find_method("four") is None
+
+    # The initializer (and so the arity) is inherited unless overridden
+    assert b.initializer is a.methods["init"]
+    assert b.arity() == 2
+    assert c.initializer is c.methods["init"]
+    assert c.arity() == 0
+
+
+def test_specialized_binary(capsys) -> None:
+    source = """
+    func ops(a, b) {
+        print a + b;
+        print a - b;
+        print a * b;
+        print a / b;
+        print a > b;
+        print a >= b;
+        print a < b;
+        print a <= b;
+        print a == b;
+        print a != b;
+        print a + 1;
+        print a - 1;
+        print a < 1;
+        print a <= 1;
+    }
+    ops(3, 4);
+    ops(1, 1);
+    print "a" + "b";
+    print "a" == "a";
+    print nil != false;
+    var i = 0;
+    {
+        var n = 3;
+        var j = 0;
+        while (j < n) { j = j + 1; }
+        print j;
+    }
+    """
+    errors = ['print "a" + 1;', 'print 1 - "a";', 'print nil + 1;', 'print nil < 1;', '{ var a = 1; var b = "b"; print a < b; }', '{ var a = 1; var b = 0; print a / b; }']
+
+    # The specialised nodes give the same results and errors as BinaryExpr
+    for src in [source] + errors:
+        outputs = []
+        for specialized in (False, True):
+            stmts = parse_input(src)
+            Resolver().resolve(stmts)
+            if specialized:
+                stmts = specialize(stmts)
+            Interpreter(verbose=GLOBAL_VERBOSE).interpret(stmts)
+            outputs.append(capsys.readouterr().out)
+
+        assert outputs[0] == outputs[1]
+        assert outputs[0] != ""
+
+
+def test_division_by_zero_and_stack_overflow() -> None:
+    # Both are Lox runtime errors, as on the VM, rather than Python ones
+    for source, message in [
+        ("print 1 / 0;", "Division by zero"),
+        ("{ var a = 1; var b = 0; print a / b; }", "Division by zero"),
+        ("func f(n) { return f(n + 1); } f(0);", "Stack overflow"),
+    ]:
+        for specialized in (False, True):
+            stmts = parse_input(source)
+            Resolver().resolve(stmts)
+            if specialized:
+                stmts = specialize(stmts)
+            interp = Interpreter(verbose=GLOBAL_VERBOSE)
+            with pytest.raises(LoxRuntimeError, match=message):
+                for stmt in stmts:
+                    interp.execute(stmt)
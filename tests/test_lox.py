@@ -0,0 +1,39 @@
+"""
+TEST_LOX
+Tests for the lox.py command line
+
+"""
+
+import subprocess
+import sys
+
+import pytest
+
+
+BACKENDS = [[], ["--closures"], ["--vm"], ["--python"]]
+
+
+def run_lox(args, tmp_path, source: str) -> subprocess.CompletedProcess:
+    script = tmp_path / "script.lox"
+    script.write_text(source)
+    return subprocess.run(
+        [sys.executable, "lox.py", "--no-cache", *args, str(script)],
+        capture_output=True,
+        text=True,
+    )
+
+
+@pytest.mark.parametrize("source", [
+    'print "a";\nprint 1 + "x";\nprint "never";',
+    "func f(n) { return n / 0; }\nprint f(1);",
+    "class A {}\nA().m();",
+])
+def test_runtime_errors_match(tmp_path, source) -> None:
+    # Every backend reports a runtime error the same way, and exits with
+    # the same status
+    results = [run_lox(args, tmp_path, source) for args in BACKENDS]
+    for result in results:
+        assert (result.stdout, result.returncode) == (results[0].stdout, results[0].returncode)
+
+    assert results[0].returncode == 254      # exit(-2)
+    assert "never" not in results[0].stdout
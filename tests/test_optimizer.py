@@ -0,0 +1,247 @@
+"""
+TEST_OPTIMIZER
+Unit tests for the AST optimizer
+
+"""
+
+import glob
+import io
+from typing import List, Sequence
+
+from loxpy.scanner import Scanner
+from loxpy.parser import Parser
+from loxpy.resolver import Resolver
+from loxpy.interpreter import Interpreter
+from loxpy.expr import (
+    BinaryExpr,
+    AddConstExpr,
+    AddExpr,
+    EqualExpr,
+    LessConstExpr,
+    LessLocalsExpr,
+    LessExpr,
+    LiteralExpr,
+    LogicalExpr,
+    VarExpr,
+)
+from loxpy.statement import Stmt, BlockStmt, ExprStmt, FuncStmt, IfStmt, PrintStmt, ReturnStmt, VarStmt, WhileStmt
+from loxpy.error import LoxParseError, LoxInterpreterError
+from loxpy.token import TokenType
+from loxpy.optimizer import optimize, format_tree, specialize
+from loxpy.util import load_source
+
+
+# Programs that never finish, or are only there for benchmarks
+SKIP_PROGRAMS = {"programs/for.lox", "programs/sum_loop.lox", "programs/method_calls.lox"}
+
+
+def parse_input(expr_src: str) -> Sequence[Stmt]:
+    scanner       = Scanner(expr_src)
+    token_list    = scanner.scan()
+    parser        = Parser(token_list)
+    parsed_output = parser.parse()
+
+    return parsed_output
+
+
+def resolve_input(source: str) -> Sequence[Stmt]:
+    stmts = parse_input(source)
+    Resolver().resolve(stmts)
+    return stmts
+
+
+def run(stmts: Sequence[Stmt], capsys) -> List[str]:
+    Interpreter().interpret(stmts)
+    return capsys.readouterr().out.split("\n")[:-1]
+
+
+def test_fold_constants() -> None:
+    stmts = optimize(resolve_input("""
+    var a = 2 * 3.14159 * 10;
+    var b = "a" + "b";
+    var c = !(1 + 2 > 3);
+    var d = -(-4);
+    var e = nil == false;
+    var f = 1 == true;
+    var g = 0 != false;
+    """), keep_globals=True)
+
+    exp_values = [2 * 3.14159 * 10, "ab", True, 4.0, False, False, True]
+    assert len(stmts) == len(exp_values)
+    for stmt, exp_value in zip(stmts, exp_values):
+        assert isinstance(stmt, VarStmt)
+        assert isinstance(stmt.initializer, LiteralExpr)
+        assert stmt.initializer.value.literal == exp_value
+
+    # Folded literals have the token type that the backends expect
+    assert stmts[0].initializer.value.token_type == TokenType.NUMBER
+    assert stmts[1].initializer.value.token_type == TokenType.STRING
+    assert stmts[2].initializer.value.token_type == TokenType.TRUE
+    assert stmts[4].initializer.value.token_type == TokenType.FALSE
+
+
+def test_no_fold_errors() -> None:
+    # These all fail at runtime, so have to be left for the interpreter
+    for source in ['print "a" - 1;', "print 1 / 0;", 'print -"a";', 'print "a" < "b";', "print 1 + nil;"]:
+        stmts = optimize(resolve_input(source))
+        assert not isinstance(stmts[0].expr, LiteralExpr)
+
+    # As is anything that doesn't give a finite number
+    stmts = optimize(resolve_input("print 100000000000000000000 * 100000000000000000000 * 100000000000000000000 * 100000000000000000000 * 100000000000000000000 * 100000000000000000000 * 100000000000000000000 * 100000000000000000000 * 100000000000000000000 * 100000000000000000000 * 100000000000000000000 * 100000000000000000000 * 100000000000000000000 * 100000000000000000000 * 100000000000000000000 * 100000000000000000000;"))
+    assert isinstance(stmts[0].expr, BinaryExpr)
+
+
+def test_logical_and_grouping() -> None:
+    stmts = optimize(resolve_input("""
+    var x = 1;
+    print nil or x;
+    print 1 and x;
+    print false and x;
+    print (x + (1));
+    print (x or nil) and 2;
+    """))
+
+    assert isinstance(stmts[1].expr, VarExpr)
+    assert isinstance(stmts[2].expr, VarExpr)
+    assert isinstance(stmts[3].expr, LiteralExpr)
+    assert stmts[3].expr.value.literal is False
+
+    # No grouping is left anywhere
+    assert isinstance(stmts[4].expr, BinaryExpr)
+    assert isinstance(stmts[4].expr.right, LiteralExpr)
+    assert isinstance(stmts[5].expr, LogicalExpr)
+    assert "GroupingExpr" not in format_tree(stmts)
+
+
+def test_prune_branches() -> None:
+    stmts = optimize(resolve_input("""
+    if (1 < 2) print "yes"; else print "no";
+    if (nil) print "never";
+    if ("a" == "b") { print "never"; } else { print "else"; }
+    var i = 0;
+    while (i < 2) if (false) print "never";
+    """))
+
+    assert isinstance(stmts[0], PrintStmt)
+    assert stmts[0].expr.value.literal == "yes"
+    assert isinstance(stmts[1], BlockStmt)
+    assert isinstance(stmts[1].stmts[0], PrintStmt)
+    assert isinstance(stmts[2], VarStmt)
+    # The loop still needs a body
+    assert isinstance(stmts[3], WhileStmt)
+    assert stmts[3].body == BlockStmt([])
+
+    stmts = optimize(resolve_input("var x = 1; if (x) print 1; else if (true) print 2;"))
+    assert isinstance(stmts[1], IfStmt)
+    assert isinstance(stmts[1].else_branch, PrintStmt)
+
+
+def test_remove_dead_locals() -> None:
+    stmts = optimize(resolve_input("""
+    func f(a) {
+        var unused = a;
+        var used = 1;
+        var called = g();
+        func helper() { return 1; }
+        a == used;
+        while (false) print "never";
+        return used;
+        print "after return";
+    }
+    func g() {
+        if (true) { return 1; } else { return 2; }
+        print "after if";
+    }
+    print f(1);
+    """))
+
+    f = stmts[0]
+    # The call to g() might have side effects so is kept
+    assert [type(s) for s in f.body] == [VarStmt, VarStmt, ReturnStmt]
+    assert [s.name.lexeme for s in f.body[:2]] == ["used", "called"]
+    assert [type(s) for s in stmts[1].body] == [BlockStmt]
+
+    # The code after the return in both branches is removed too
+    stmts = optimize(resolve_input("""
+    func h(x) {
+        if (x) return 1; else { print x; return 2; }
+        print "never";
+    }
+    print h(1);
+    """))
+    assert [type(s) for s in stmts[0].body] == [IfStmt]
+
+
+def test_remove_unused_globals() -> None:
+    source = """
+    func unused() { return unused(); }
+    func used_by_unused() { return 1; }
+    func also_unused() { return used_by_unused(); }
+    var x = 1;
+    var y = clock();
+    func main() { print x; }
+    main();
+    x + 1;
+    """
+
+    stmts = optimize(resolve_input(source))
+    assert [s.name.lexeme for s in stmts if isinstance(s, (FuncStmt, VarStmt))] == ["x", "y", "main"]
+    # x + 1 could fail at runtime so is kept
+    assert [type(s) for s in stmts[-3:]] == [FuncStmt, ExprStmt, ExprStmt]
+
+    # Later lines in the REPL could use any of these
+    stmts = optimize(resolve_input(source), keep_globals=True)
+    assert len(stmts) == 8
+
+
+def test_specialize() -> None:
+    stmts = specialize(resolve_input("""
+    var g = 1;
+    {
+        var i = 0;
+        var n = 10;
+        while (i < n) i = i + 1;
+        print i < 10;
+        print g < i;
+        print 1 + i;
+        print i == "a" + "b";
+    }
+    """))
+
+    loop, print_const, print_global, print_add, print_eq = stmts[1].stmts[2:]
+    assert type(loop.condition) is LessLocalsExpr
+    assert type(loop.body.expr.value) is AddConstExpr
+    assert type(print_const.expr) is LessConstExpr
+    # Globals aren't locals, and only a number on the right is a constant
+    assert type(print_global.expr) is LessExpr
+    assert type(print_add.expr) is AddExpr
+    assert type(print_eq.expr) is EqualExpr
+    assert type(print_eq.expr.right) is AddExpr
+
+    # Everything is still a BinaryExpr for the visitors that don't care
+    assert all(isinstance(s.expr, BinaryExpr) for s in (print_const, print_global, print_add, print_eq))
+
+
+def test_optimized_programs_match(capsys) -> None:
+    for filename in sorted(glob.glob("programs/*.lox")):
+        if filename in SKIP_PROGRAMS:
+            continue
+        try:
+            stmts = resolve_input(load_source(filename))
+        except (LoxParseError, LoxInterpreterError):
+            continue
+        opt_stmts = optimize(resolve_input(load_source(filename)))
+        capsys.readouterr()     # skip warnings from the resolver
+
+        assert run(opt_stmts, capsys) == run(stmts, capsys)
+
+
+def test_dump() -> None:
+    dump = io.StringIO()
+    optimize(resolve_input("print (1 + 2) * 3;"), dump=dump)
+    out = dump.getvalue().split("\n")[:-1]
+
+    assert out[0] == "==== Before optimizing ===="
+    assert "  expr: BinaryExpr *" in out
+    assert "==== After optimizing (2 folded, 0 pruned, 0 removed) ====" in out
+    assert out[-2:] == ["PrintStmt", "  expr: LiteralExpr 9.0"]
@@ -6,8 +6,8 @@ from loxpy.util import load_source
 from loxpy.error import LoxParseError
 from loxpy.parser import Parser
 from loxpy.scanner import Scanner
-from loxpy.token import Token, TokenType
-from loxpy.expr import AssignmentExpr, BinaryExpr, CallExpr, GetExpr, SetExpr, LiteralExpr
+from loxpy.token import Token, TokenType, TOKEN_CODES, NUM_TOKEN_CODES, token_set
+from loxpy.expr import Expr, AssignmentExpr, BinaryExpr, CallExpr, GetExpr, SetExpr, LiteralExpr
 from loxpy.statement import (
     Stmt, 
     BlockStmt, 
@@ -18,6 +18,7 @@ from loxpy.statement import (
     VarStmt, 
     WhileStmt
 )
+from tools.legacy import LegacyParser
 
 
 VAR_AND_OP_PROGRAM = "programs/op.lox"
@@ -242,3 +243,106 @@ def test_parse_class_this() -> None:
     assert len(parsed_output) == len(exp_types)
     for p, t in zip(parsed_output, exp_types):
         assert type(p) == t
+
+
+def test_ast_nodes_use_slots() -> None:
+    from dataclasses import fields
+
+    def walk(node):
+        yield node
+        for f in fields(node):
+            value = getattr(node, f.name)
+            values = value if isinstance(value, (list, tuple)) else [value]
+            for v in values:
+                if isinstance(v, (Stmt, Expr)):
+                    yield from walk(v)
+
+    parsed_output = Parser(Scanner(load_source(FIB_FUNC_PROGRAM)).scan()).parse()
+
+    # No node carries a per-instance __dict__
+    nodes = [node for stmt in parsed_output for node in walk(stmt)]
+    assert len(nodes) > 20
+    assert not any(hasattr(node, "__dict__") for node in nodes)
+
+
+def test_parse_token_stream() -> None:
+    import glob
+    import re
+
+    for filename in sorted(glob.glob("programs/*.lox")):
+        source = load_source(filename)
+        try:
+            exp_output = parse_input(source)
+        except LoxParseError as e:
+            with pytest.raises(LoxParseError, match=re.escape(str(e))):
+                Parser(Scanner(source).iter_tokens()).parse()
+            continue
+
+        assert Parser(Scanner(source).iter_tokens()).parse() == exp_output
+
+    # Any iterable of tokens will do, even one without an EOF
+    tokens = Scanner("print 1;").scan()
+    assert Parser(t for t in tokens[:-1]).parse() == parse_input("print 1;")
+
+    with pytest.raises(LoxParseError):
+        Parser(iter(Scanner("print 1").scan())).parse()
+
+    with pytest.raises(TypeError):
+        Parser("print 1;")    # type: ignore
+
+
+def test_pratt_matches_legacy() -> None:
+    import glob
+
+    sources = [load_source(filename) for filename in sorted(glob.glob("programs/*.lox"))]
+    sources += [
+        "print 1 + 2 * 3 - 4 / 5 < 6 == !7 and 8 or -9 >= 10;",
+        "print a.b(c, d).e = f = g or h and i;",
+        "print -a.b() * (c - d) - - e;",
+        "print a < b <= c > d >= e != f == g;",
+        "print super.method(this.x)(1)(2);",
+        "a + b = c;",
+        "-a = b;",
+        "a.b() = c;",
+        "print (1 + 2;",
+        "print 1 +;",
+        "print a.1;",
+        "print super;",
+        "print f(1, 2;",
+        "print",
+        "1 = 2",
+        "print (a = 1) = 2;",
+    ]
+
+    # Same trees for everything that parses, and the same error everywhere else
+    for source in sources:
+        tokens = Scanner(source).scan()
+        try:
+            exp_output = LegacyParser(tokens).parse()
+        except LoxParseError as e:
+            with pytest.raises(LoxParseError) as exc_info:
+                Parser(tokens).parse()
+            assert exc_info.value.token == e.token
+            assert str(exc_info.value) == str(e)
+            continue
+
+        assert Parser(tokens).parse() == exp_output
+
+
+def test_token_codes() -> None:
+    codes = list(TOKEN_CODES.values())
+    assert len(set(codes)) == len(TokenType)
+    assert all(0 <= c < NUM_TOKEN_CODES for c in codes)
+
+    bits = token_set(TokenType.PLUS, TokenType.MINUS)
+    assert (1 << TOKEN_CODES[TokenType.PLUS]) & bits
+    assert (1 << TOKEN_CODES[TokenType.MINUS]) & bits
+    assert not (1 << TOKEN_CODES[TokenType.STAR]) & bits
+    assert not (1 << TOKEN_CODES[TokenType.LOX_EOF]) & bits
+
+    # The parser stays at the end once it gets there
+    parser = Parser(Scanner("").scan())
+    assert parser._at_end()
+    assert not parser._match(token_set(*(t for t in TokenType if t != TokenType.LOX_EOF)))
+    parser._advance()
+    assert parser._at_end()
@@ -0,0 +1,97 @@
+"""
+TEST_PROJECT
+Unit tests for running programs made of several files
+
+"""
+
+import pytest
+
+from loxpy.scanner import Scanner
+from loxpy.parser import Parser
+from loxpy.resolver import Resolver
+from loxpy.interpreter import Interpreter
+from loxpy.error import LoxParseError, LoxInterpreterError
+from loxpy.project import front_end_files, load_project
+
+
+FILES = {
+    "a.lox": """
+    var count = 0;
+    func counter() {
+        var n = 0;
+        func inc() { n = n + 1; count = count + 1; return n; }
+        return inc;
+    }
+    """,
+    "b.lox": """
+    class Greeter {
+        init(name) { this.name = name; }
+        greet() { print "hi " + this.name; }
+    }
+    func unused_warning() { var x = 1; }
+    """,
+    "c.lox": """
+    var c = counter();
+    c();
+    print c();
+    Greeter("there").greet();
+    print count;
+    """,
+}
+
+
+def write_files(tmp_path, files) -> list:
+    filenames = []
+    for name, source in files.items():
+        path = tmp_path / name
+        path.write_text(source)
+        filenames.append(str(path))
+
+    return filenames
+
+
+def run_source(source: str) -> None:
+    stmts = Parser(Scanner(source).scan()).parse()
+    Resolver().resolve(stmts)
+    Interpreter().interpret(stmts)
+
+
+@pytest.mark.parametrize("jobs", [1, 2])
+def test_project_matches_single_file(tmp_path, capsys, jobs) -> None:
+    filenames = write_files(tmp_path, FILES)
+
+    # The files share their globals, as if they were one file
+    run_source("".join(FILES.values()))
+    exp_out = capsys.readouterr().out
+    assert "hi there" in exp_out
+
+    stmts = load_project(filenames, jobs)
+    Interpreter().interpret(stmts)
+    assert capsys.readouterr().out == exp_out
+
+
+def test_project_results_in_order(tmp_path) -> None:
+    files = {f"{n:03}.lox": f"print {n};" for n in range(20)}
+    filenames = write_files(tmp_path, files)
+
+    results = front_end_files(filenames, jobs=2)
+    assert [r.filename for r in results] == filenames
+    assert all(r.data is not None and r.error_token is None for r in results)
+
+
+def test_project_errors(tmp_path, capsys) -> None:
+    files = dict(FILES)
+    files["d.lox"] = "print 1;\nprint 1 +;"
+    filenames = write_files(tmp_path, files)
+
+    with pytest.raises(LoxParseError) as exc_info:
+        load_project(filenames, jobs=2)
+    assert exc_info.value.token.line == 2
+    assert exc_info.value.message.endswith("d.lox")
+    # Messages from the files before the error are still shown
+    assert "unused" in capsys.readouterr().out
+
+    files["d.lox"] = "{ var a = 1; var a = 2; }"
+    filenames = write_files(tmp_path, files)
+    with pytest.raises(LoxInterpreterError, match="already in this scope"):
+        load_project(filenames, jobs=1)
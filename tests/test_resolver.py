@@ -1,13 +1,14 @@
 import pytest
-from typing import Sequence
+from dataclasses import fields
+from typing import Any, List, Sequence
 
 from loxpy.resolver import Resolver
-from loxpy.interpreter import Interpreter
 from loxpy.scanner import Scanner
 from loxpy.parser import Parser
 from loxpy.statement import Stmt
 from loxpy.token import Token, TokenType
-from loxpy.expr import AssignmentExpr, BinaryExpr, LiteralExpr, VarExpr
+from loxpy.expr import Expr, AssignmentExpr, BinaryExpr, LiteralExpr, VarExpr
+from loxpy.statement import Stmt
 from loxpy.util import load_source
 from loxpy.error import LoxInterpreterError
 
@@ -20,11 +21,27 @@ RESOLVE_ERROR_PROGRAM = "programs/resolve_error.lox"
 
 
 def get_resolver() -> Resolver:
-    interp = Interpreter()
-    res = Resolver(interp)
+    res = Resolver()
 
     return res
 
+
+def resolved_exprs(node: Any) -> List[Expr]:
+    """
+    Collect every expression in node that the resolver annotated with a depth
+    """
+    found = []
+    if isinstance(node, (list, tuple)):
+        for item in node:
+            found.extend(resolved_exprs(item))
+    elif isinstance(node, (Expr, Stmt)):
+        if getattr(node, "depth", None) is not None:
+            found.append(node)
+        for f in fields(node):
+            found.extend(resolved_exprs(getattr(node, f.name)))
+
+    return found
+
 def parse_input(expr_src: str) -> Sequence[Stmt]:
     scanner       = Scanner(expr_src)
     token_list    = scanner.scan()
@@ -43,8 +60,8 @@ def test_resolve_for() -> None:
 
     res.resolve(parsed_output)
 
-    # No scopes or functions, so we expect the interpreter to have no locals()
-    assert res.interp.locals == {}
+    # No scopes or functions, so we expect nothing to resolve to a local
+    assert resolved_exprs(parsed_output) == []
 
 
 def test_resolve_func() -> None:
@@ -54,16 +71,17 @@ def test_resolve_func() -> None:
     res.resolve(parsed_output)
     
     # We expect the variables "first" and "last" to end
-    # up resolved in locals
+    # up resolved as locals
     exp_locals = [
         VarExpr(name=Token(TokenType.IDENTIFIER, lexeme="first", literal="first", line=2, col=21)),
         VarExpr(name=Token(TokenType.IDENTIFIER, lexeme="last", literal="last", line=2, col=34)),
     ]
+    locals_out = resolved_exprs(parsed_output)
 
-    assert len(res.interp.locals) == len(exp_locals)
+    assert len(locals_out) == len(exp_locals)
 
     for local in exp_locals:
-        assert local in res.interp.locals
+        assert local in locals_out
 
 
 def test_resolve_fib_func() -> None:
@@ -90,11 +108,13 @@ def test_resolve_fib_func() -> None:
         ), 1)
     ]
 
-    assert len(res.interp.locals) == len(exp_locals)
+    locals_out = resolved_exprs(parsed_output)
+
+    assert len(locals_out) == len(exp_locals)
 
     for local, dist in exp_locals:
-        assert local in res.interp.locals
-        assert res.interp.locals[local] == dist
+        assert local in locals_out
+        assert locals_out[locals_out.index(local)].depth == dist
 
 
 
@@ -146,3 +166,94 @@ def test_cant_return_value_from_init() -> None:
 
     with pytest.raises(LoxInterpreterError, match=r"Can't return a value from an initializer.*"):
         res.resolve(parsed_output)
+
+
+def test_resolve_slots() -> None:
+    source = """
+    func f(a, b) {
+        var c = a;
+        {
+            var d = b;
+            print c + d;
+        }
+    }
+    """
+
+    res = get_resolver()
+    parsed_output = parse_input(source)
+    res.resolve(parsed_output)
+
+    # Each variable is resolved to its depth and its index in that scope
+    exp_resolution = {
+        "a": (0, 0),
+        "b": (1, 1),
+        "c": (1, 2),
+        "d": (0, 0),
+    }
+
+    for expr in resolved_exprs(parsed_output):
+        assert (expr.depth, expr.slot) == exp_resolution.pop(expr.name.lexeme)
+
+    assert exp_resolution == {}
+
+    # Declarations get the slots that the expressions refer to, and each
+    # scope records how many slots its frame needs.
+    func = parsed_output[0]
+    assert func.slot is None            # globals aren't slotted
+    assert func.num_slots == 3          # a, b, c
+    assert func.body[0].slot == 2
+    block = func.body[1]
+    assert block.num_slots == 1
+    assert block.stmts[0].slot == 0
+
+
+def test_read_local_in_own_initializer() -> None:
+    source = """
+    var a = 1;
+    {
+        var a = a + 2;
+    }
+    """
+
+    res = get_resolver()
+    parsed_output = parse_input(source)
+
+    with pytest.raises(LoxInterpreterError, match=r".*in its own initializer"):
+        res.resolve(parsed_output)
+
+
+def test_resolve_identical_exprs_separately() -> None:
+    # Two structurally identical expressions must keep their own resolution
+    shared = VarExpr(Token(TokenType.IDENTIFIER, "a", "a", 1))
+    other = VarExpr(Token(TokenType.IDENTIFIER, "a", "a", 1))
+    assert shared == other
+
+    res = get_resolver()
+    res.scopes.append({"a": [True, False, 0]})
+    res.visit_var_expr(shared)
+
+    assert shared.depth == 0
+    assert other.depth is None
+
+
+def test_resolve_this_in_method_frame() -> None:
+    source = """
+    class A {
+        get(a) {
+            func inner() { return this; }
+            return this;
+        }
+    }
+    """
+
+    res = get_resolver()
+    parsed_output = parse_input(source)
+    res.resolve(parsed_output)
+
+    # 'this' takes the first slot of a method's frame, ahead of the parameters
+    method = parsed_output[0].methods[0]
+    assert method.num_slots == 3        # this, a, inner
+    inner_this = method.body[0].body[0].value
+    assert (inner_this.depth, inner_this.slot) == (1, 0)
+    method_this = method.body[1].value
+    assert (method_this.depth, method_this.slot) == (0, 0)
@@ -4,9 +4,12 @@ Unit tests for Scanner module
 
 """
 
+import glob
+
 from loxpy.scanner import Scanner
 from loxpy.token import Token, TokenType
 from loxpy.util import load_source
+from tools.legacy import LegacyScanner
 
 
 OPERATOR_SRC  = 'programs/op.lox'
@@ -49,7 +52,7 @@ def test_bang() -> None:
         Token(TokenType.VAR       , "var",  "var",  1, 4),
         Token(TokenType.IDENTIFIER, "a" ,   "a",    1, 6),
         Token(TokenType.EQUAL,      "=" ,   None,   1, 8),
-        Token(TokenType.TRUE,       "true", "true", 1, 13),
+        Token(TokenType.TRUE,       "true", True, 1, 13),
         Token(TokenType.SEMICOLON,  ";",    None,   1, 14),
 
         Token(TokenType.IDENTIFIER, "a",    "a",    2, 2),
@@ -113,3 +116,41 @@ def test_for() -> None:
         if VERBOSE and tok != exp_tok:
             print(f"Token [{n}], expected {exp_tok}, got {tok}")
         assert tok == exp_tok
+
+
+def test_token_slots() -> None:
+    token = Token(TokenType.NUMBER, "2", 2.0, 3, 4)
+
+    # Tokens only store their fields
+    assert not hasattr(token, "__dict__")
+    assert repr(token) == "Token(token_type=<TokenType.NUMBER: 22>,lexeme='2',literal=2.0,line=3,col=4)"
+    assert str(token) == "2"
+
+
+def test_scanner_matches_legacy_scanner(capsys) -> None:
+    sources = [load_source(f) for f in sorted(glob.glob("programs/*.lox"))]
+    sources += [
+        "a>=b!=c==d<=e<f>g!h=i",
+        'print "one\ntwo\n  three" + x;\ny',
+        "1 / 2 // a comment\n/3",
+        'var s = "no closing quote\n;',
+        "1.\n2.5.x @ #",
+        "trailing space \t \r",
+    ]
+
+    for source in sources:
+        exp_tokens = LegacyScanner(source).scan()
+        exp_out = capsys.readouterr().out
+        tokens = Scanner(source).scan()
+
+        assert tokens == exp_tokens
+        assert capsys.readouterr().out == exp_out
+
+
+def test_iter_tokens() -> None:
+    source = load_source(FOR_SRC)
+    tokens = Scanner(source).iter_tokens()
+
+    # Nothing is scanned until the tokens are asked for
+    assert next(tokens) == Token(TokenType.VAR, "var", "var", 5, 4)
+    assert list(tokens) == Scanner(source).scan()[1:]
@@ -0,0 +1,122 @@
+"""
+TEST_SERIALIZE
+Unit tests for the binary AST format
+
+"""
+
+import glob
+import io
+import struct
+from contextlib import redirect_stdout
+from dataclasses import fields, is_dataclass
+from typing import Any, Sequence
+
+import pytest
+
+from loxpy.scanner import Scanner
+from loxpy.parser import Parser
+from loxpy.resolver import Resolver
+from loxpy.interpreter import Interpreter
+from loxpy.optimizer import specialize
+from loxpy.statement import Stmt
+from loxpy.error import LoxParseError
+from loxpy.serialize import dumps, loads, dump, load, FORMAT_VERSION, MAGIC
+from loxpy.util import load_source
+
+
+FIB_FUNC_PROGRAM = "programs/fib_func.lox"
+
+
+def parse_input(expr_src: str) -> Sequence[Stmt]:
+    scanner       = Scanner(expr_src)
+    token_list    = scanner.scan()
+    parser        = Parser(token_list)
+    parsed_output = parser.parse()
+
+    return parsed_output
+
+
+def same_tree(a: Any, b: Any) -> bool:
+    """
+    Like ==, but also compares the fields filled in by the resolver
+    """
+    if type(a) is not type(b):
+        return False
+    if isinstance(a, (list, tuple)):
+        return len(a) == len(b) and all(same_tree(x, y) for x, y in zip(a, b))
+    if is_dataclass(a):
+        return all(same_tree(getattr(a, f.name), getattr(b, f.name)) for f in fields(a) if f.name != "cache")
+    return a == b
+
+
+def test_round_trip_programs() -> None:
+    for filename in sorted(glob.glob("programs/*.lox")):
+        try:
+            stmts = parse_input(load_source(filename))
+        except LoxParseError:
+            continue
+
+        with redirect_stdout(io.StringIO()):
+            try:
+                Resolver().resolve(stmts)
+            except Exception:
+                pass
+
+        for compress in (True, False):
+            assert same_tree(loads(dumps(stmts, compress)), stmts)
+
+        # And with the specialised binary expressions
+        stmts = specialize(stmts)
+        assert same_tree(loads(dumps(stmts)), stmts)
+
+
+def test_round_trip_literals() -> None:
+    source = """
+    var a = "a string";
+    var b = "";
+    var c = "€uro\nline" + "a string";
+    var d = 0.5 + 1 + 1.0 + 100000000000;
+    var e = true and false or nil;
+    var string = "string";
+    print string + "a string";
+    """
+    stmts = parse_input(source)
+    data = dumps(stmts, compress=False)
+
+    assert loads(data) == stmts
+    # Lexemes and constants are only stored once
+    assert data.count(b'"a string"') == 1
+    assert data.count(b'"string"') == 1
+
+
+def test_loaded_program_runs(capsys) -> None:
+    stmts = parse_input(load_source(FIB_FUNC_PROGRAM))
+    Resolver().resolve(stmts)
+
+    fp = io.BytesIO()
+    dump(stmts, fp)
+    fp.seek(0)
+    loaded = load(fp)
+
+    Interpreter().interpret(stmts)
+    exp_out = capsys.readouterr().out
+    # No need to resolve the loaded program again
+    Interpreter().interpret(loaded)
+    assert capsys.readouterr().out == exp_out
+
+
+def test_bad_data() -> None:
+    data = dumps(parse_input("print 1 + 2;"))
+
+    with pytest.raises(ValueError, match="Not a serialized"):
+        loads(b"print 1;")
+
+    with pytest.raises(ValueError, match="format version"):
+        loads(MAGIC + struct.pack("<HH", FORMAT_VERSION + 1, 0) + data[10:])
+
+    with pytest.raises(ValueError, match="Corrupt"):
+        loads(data[:-4])
+
+    raw = dumps(parse_input("print 1 + 2;"), compress=False)
+    with pytest.raises(ValueError):
+        loads(raw[:-1])
@@ -0,0 +1,70 @@
+"""
+TEST_SOURCE
+Unit tests for the source readers
+
+"""
+
+import glob
+import pytest
+
+from loxpy.scanner import Scanner
+from loxpy.source import StringSource, FileSource, MmapSource, open_source
+from loxpy.util import load_source
+
+
+def scan_output(source, capsys):
+    tokens = Scanner(source).scan()
+    return tokens, capsys.readouterr().out
+
+
+def test_string_source_chunks() -> None:
+    source = StringSource("var a = 1;", chunk_size=4)
+
+    assert list(source) == ["var ", "a = ", "1;"]
+    assert source.read() == "var a = 1;"
+    assert list(StringSource("var a = 1;")) == ["var a = 1;"]
+
+
+def test_scan_chunks_matches_string(capsys) -> None:
+    sources = [load_source(f) for f in sorted(glob.glob("programs/*.lox"))]
+    sources += [
+        'print "a string\nover\nlines" + 1.5;\nprint 2.;',
+        "a >= b != c // comment\n/ d",
+        'var s = "unterminated\n\n1;',
+    ]
+
+    # Every chunk size splits tokens, strings and comments in some places
+    for text in sources:
+        exp_output = scan_output(text, capsys)
+        for chunk_size in (1, 2, 3, 5, 16):
+            assert scan_output(StringSource(text, chunk_size), capsys) == exp_output
+
+
+@pytest.mark.parametrize("reader", [FileSource, MmapSource, open_source])
+def test_file_sources(reader, tmp_path, capsys) -> None:
+    # Multi-byte characters and CRLF line endings split across chunks
+    text = 'var s = "€uro\r\nline";\r\nprint s; // café\r\nprint "é" + s;\r\n'
+    filename = tmp_path / "source.lox"
+    filename.write_bytes(text.encode("utf-8"))
+
+    with open(filename, "r") as fp:
+        exp_output = scan_output(fp.read(), capsys)
+
+    for chunk_size in (1, 2, 3, 1024):
+        with reader(str(filename), chunk_size) as source:
+            assert scan_output(source, capsys) == exp_output
+
+    empty = tmp_path / "empty.lox"
+    empty.write_bytes(b"")
+    with reader(str(empty)) as source:
+        assert source.read() == ""
+
+
+def test_closed_source(tmp_path) -> None:
+    filename = tmp_path / "source.lox"
+    filename.write_text("print 1;")
+
+    source = MmapSource(str(filename))
+    source.close()
+    with pytest.raises(ValueError):
+        source.read()
@@ -0,0 +1,144 @@
+import pytest
+from typing import Sequence
+
+from loxpy.scanner import Scanner
+from loxpy.parser import Parser
+from loxpy.resolver import Resolver
+from loxpy.statement import Stmt
+from loxpy.compiler import OpCode, compile_program, disassemble
+from loxpy.vm import VM, VMInstance
+from loxpy.error import LoxRuntimeError
+from loxpy.util import load_source
+
+
+FIB_FUNC_PROGRAM = "programs/fib_func.lox"
+CLOSURE_PROGRAM  = "programs/closure.lox"
+SUPER_PROGRAM    = "programs/super.lox"
+SHADOW_PROGRAM   = "programs/shadow.lox"
+
+
+def parse_input(expr_src: str) -> Sequence[Stmt]:
+    scanner       = Scanner(expr_src)
+    token_list    = scanner.scan()
+    parser        = Parser(token_list)
+    parsed_output = parser.parse()
+
+    return parsed_output
+
+
+def run_vm(source: str) -> VM:
+    stmts = parse_input(source)
+    Resolver().resolve(stmts)
+    vm = VM()
+    vm.run(compile_program(stmts))
+
+    return vm
+
+
+def test_compile_fib_func() -> None:
+    stmts = parse_input(load_source(FIB_FUNC_PROGRAM))
+    proto = compile_program(stmts)
+
+    # The top level script creates the closure for fib and stores it in a global
+    assert proto.chunk.code[0] == OpCode.CLOSURE
+    fib = proto.chunk.constants[proto.chunk.code[1]]
+    assert fib.name == "fib"
+    assert fib.arity == 1
+    # Slot 0 is the callee, slot 1 is the parameter n
+    assert fib.num_slots == 2
+
+    listing = disassemble(proto)
+    assert "== script ==" in listing
+    assert "== fib ==" in listing
+
+
+def test_vm_fib_func(capsys) -> None:
+    run_vm(load_source(FIB_FUNC_PROGRAM))
+    out = capsys.readouterr().out.split("\n")
+
+    exp_out = ["0", "1", "1", "2", "3", "5", "8", "13", "21", "34"]
+    assert out[:-1] == exp_out
+
+
+def test_vm_closure(capsys) -> None:
+    run_vm(load_source(CLOSURE_PROGRAM))
+    out = capsys.readouterr().out.split("\n")
+
+    assert out[:-1] == [f"{i}" for i in range(1, 11)]
+
+
+def test_vm_closures_capture_each_iteration(capsys) -> None:
+    source = """
+    var first;
+    var second;
+    for(var i = 0; i < 2; i = i + 1) {
+        var j = i;
+        func get() { return j; }
+        if(first == nil) first = get; else second = get;
+    }
+    print first();
+    print second();
+    """
+    run_vm(source)
+    out = capsys.readouterr().out.split("\n")
+
+    assert out[:-1] == ["0", "1"]
+
+
+def test_vm_shadow(capsys) -> None:
+    run_vm(load_source(SHADOW_PROGRAM))
+    out = capsys.readouterr().out.split("\n")
+
+    exp_out = [
+        "inner a", "outer b", "global c",
+        "outer a", "outer b", "global c",
+        "global a", "global b", "global c"
+    ]
+    assert out[:-1] == exp_out
+
+
+def test_vm_super(capsys) -> None:
+    vm = run_vm(load_source(SUPER_PROGRAM))
+    out = capsys.readouterr().out.split("\n")
+
+    assert out[:-1] == ["A method"]
+    assert vm.globals["c_out"] == "A method"
+
+
+def test_vm_class_init_returns_this() -> None:
+    source = """
+    class Foo {
+        init(a) { this.a = a; }
+    }
+
+    var f = Foo(1);
+    var ff = f.init(2);
+    """
+    vm = run_vm(source)
+
+    assert isinstance(vm.globals["f"], VMInstance)
+    assert vm.globals["f"] is vm.globals["ff"]
+    assert vm.globals["f"].fields["a"] == 2.0
+
+
+def test_vm_runtime_error() -> None:
+    source = """
+    func add(a, b) {
+        return a + b;
+    }
+    add(1, "two");
+    """
+
+    with pytest.raises(LoxRuntimeError, match=r"Right operand to \[\+\] must be a number") as err:
+        run_vm(source)
+    assert err.value.token.line == 3
+
+    with pytest.raises(LoxRuntimeError, match=r"Expected 2 arguments, got 1"):
+        run_vm("func f(a, b) {} f(1);")
+
+
+def test_vm_equality_by_type(capsys) -> None:
+    run_vm('print 1 == true; print 0 == false; print 0 != false; print nil == false; print "1" == 1; print 2 == 2;')
+    out = capsys.readouterr().out.split("\n")
+
+    assert out[:-1] == ["false", "false", "true", "false", "false", "true"]
@@ -0,0 +1,369 @@
+"""
+BENCH
+Rough timings for the hot paths of the interpreter. Run from the top
+of the repo, eg
+
+    python -m tools.bench calls
+    python -m tools.bench calls --closures --repeat 20 programs/fib_func.lox
+    python -m tools.bench loop
+    python -m tools.bench methods
+    python -m tools.bench memory --copies 2000
+    python -m tools.bench scanner --copies 5000
+    python -m tools.bench serialize --copies 1000
+    python -m tools.bench operators
+    python -m tools.bench parser --copies 2000
+    python -m tools.bench project --files 200 --copies 20 --jobs 4
+    python -m tools.bench batch --files 50
+
+Each benchmark reports the best of --repeat runs, which is less noisy
+than the mean on a busy machine.
+
+"""
+
+import io
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from argparse import ArgumentParser, Namespace
+from contextlib import redirect_stdout
+from typing import Callable, Dict, List, Sequence
+
+from loxpy.scanner import Scanner
+from loxpy.parser import Parser
+from loxpy.resolver import Resolver
+from loxpy.interpreter import Interpreter
+from loxpy.callable import LoxFunction
+from loxpy.statement import Stmt
+from loxpy.optimizer import specialize
+from loxpy.util import load_source
+from loxpy import serialize
+from loxpy.project import load_project
+from loxpy.batch import run_batch
+from tools.legacy import LegacyParser, LegacyScanner
+
+
+def parse_program(filename: str) -> Sequence[Stmt]:
+    stmts = Parser(Scanner(load_source(filename)).scan()).parse()
+    with redirect_stdout(io.StringIO()):     # discard unused variable warnings
+        Resolver().resolve(stmts)
+
+    return stmts
+
+
+def best_time(func: Callable[[], None], repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+
+    return best
+
+
+def count_calls(stmts: Sequence[Stmt]) -> int:
+    """
+    Count the Lox function calls made by one run of stmts
+    """
+    num_calls = 0
+    orig_call = LoxFunction.call
+
+    def counting_call(self, interp, args):
+        nonlocal num_calls
+        num_calls += 1
+        return orig_call(self, interp, args)
+
+    LoxFunction.call = counting_call     # type: ignore
+    try:
+        with redirect_stdout(io.StringIO()):
+            Interpreter().interpret(stmts)
+    finally:
+        LoxFunction.call = orig_call     # type: ignore
+
+    return num_calls
+
+
+# ======== Benchmarks ======== #
+def bench_calls(args: Namespace) -> List[str]:
+    """
+    Function call throughput of the interpreter
+    """
+    filename = args.program or "programs/fib_func.lox"
+    stmts = parse_program(filename)
+    num_calls = count_calls(stmts)
+
+    def run() -> None:
+        with redirect_stdout(io.StringIO()):
+            for _ in range(args.loops):
+                Interpreter(compile_closures=args.closures).interpret(stmts)
+
+    elapsed = best_time(run, args.repeat)
+    total_calls = num_calls * args.loops
+
+    return [
+        f"program     : {filename} ({'closures' if args.closures else 'tree-walker'})",
+        f"calls/run   : {num_calls}",
+        f"time        : {elapsed:.4f}s for {args.loops} runs",
+        f"calls/sec   : {total_calls / elapsed:.0f}",
+        f"usec/call   : {1e6 * elapsed / total_calls:.3f}",
+    ]
+
+
+def time_program(args: Namespace, default_program: str) -> List[str]:
+    filename = args.program or default_program
+    stmts = parse_program(filename)
+
+    def run() -> None:
+        with redirect_stdout(io.StringIO()):
+            Interpreter(compile_closures=args.closures).interpret(stmts)
+
+    elapsed = best_time(run, args.repeat)
+
+    return [
+        f"program     : {filename} ({'closures' if args.closures else 'tree-walker'})",
+        f"time        : {elapsed:.4f}s",
+    ]
+
+
+def bench_loop(args: Namespace) -> List[str]:
+    """
+    Time for a loop-heavy program
+    """
+    return time_program(args, "programs/sum_loop.lox")
+
+
+def bench_methods(args: Namespace) -> List[str]:
+    """
+    Method calls and construction through a deep class hierarchy
+    """
+    return time_program(args, "programs/method_calls.lox")
+
+
+def bench_memory(args: Namespace) -> List[str]:
+    """
+    Memory held by the tokens and AST of a large program, made from
+    --copies copies of a smaller one. Also compares the peak memory of
+    parsing a token list with parsing tokens straight from the scanner.
+    """
+    filename = args.program or "programs/class_methods.lox"
+    source = "\n".join([load_source(filename)] * args.copies)
+
+    tracemalloc.start()
+    tokens = Scanner(source).scan()
+    token_mem, _ = tracemalloc.get_traced_memory()
+    stmts = Parser(tokens).parse()
+    total_mem, list_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    num_tokens = len(tokens)
+    del tokens, stmts
+
+    tracemalloc.start()
+    stmts = Parser(Scanner(source).iter_tokens()).parse()
+    stream_mem, stream_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return [
+        f"program     : {filename} x {args.copies} ({source.count(chr(10)) + 1} lines)",
+        f"tokens      : {num_tokens} using {token_mem / 2**20:.2f} MiB",
+        f"ast         : {len(stmts)} statements using {(total_mem - token_mem) / 2**20:.2f} MiB",
+        f"total       : {total_mem / 2**20:.2f} MiB",
+        f"peak (list) : {list_peak / 2**20:.2f} MiB",
+        f"peak (iter) : {stream_peak / 2**20:.2f} MiB, holding {stream_mem / 2**20:.2f} MiB after parsing",
+    ]
+
+
+def bench_scanner(args: Namespace) -> List[str]:
+    """
+    Compare the regex Scanner with the LegacyScanner on a large program,
+    made from --copies copies of a smaller one
+    """
+    filename = args.program or "programs/class_methods.lox"
+    source = "\n".join([load_source(filename)] * args.copies)
+
+    lines = [f"program     : {filename} x {args.copies} ({len(source) / 2**20:.2f} MiB)"]
+    times = {}
+    for scanner in (LegacyScanner, Scanner):
+        times[scanner] = best_time(lambda: scanner(source).scan(), args.repeat)
+        lines.append(f"{scanner.__name__:<12}: {times[scanner]:.4f}s ({len(source) / 2**20 / times[scanner]:.2f} MiB/s)")
+    lines.append(f"speedup     : {times[LegacyScanner] / times[Scanner]:.1f}x")
+
+    return lines
+
+
+# Expression-heavy code, like the output of a code generator
+GENERATED_EXPRS = """
+var a{n} = (x + y * 2 - z / 4) < limit and !done or count == max(1, 2);
+a{n} = obj.field.method(x - 1, -y, (z + 1) * 3).value >= a{n} * 0.5 + b - c;
+print a{n} != nil and (a{n} + 1) * (a{n} - 1) / 2 <= f(g(h(a{n}, 1), 2), 3);
+"""
+
+
+def bench_parser(args: Namespace) -> List[str]:
+    """
+    Compare the Pratt Parser with the LegacyParser on expression-heavy
+    code, or on --copies copies of a program if one is given
+    """
+    if args.program is not None:
+        source = "\n".join([load_source(args.program)] * args.copies)
+        name = f"{args.program} x {args.copies}"
+    else:
+        source = "".join(GENERATED_EXPRS.format(n=n) for n in range(args.copies))
+        name = f"generated expressions x {args.copies}"
+    tokens = Scanner(source).scan()
+
+    lines = [f"program     : {name} ({len(tokens)} tokens)"]
+    times = {}
+    for parser in (LegacyParser, Parser):
+        times[parser] = best_time(lambda: parser(tokens).parse(), args.repeat)
+        lines.append(f"{parser.__name__:<12}: {times[parser]:.4f}s ({len(tokens) / times[parser] / 1e6:.2f} M tokens/s)")
+    lines.append(f"speedup     : {times[LegacyParser] / times[Parser]:.1f}x")
+
+    return lines
+
+
+def bench_serialize(args: Namespace) -> List[str]:
+    """
+    Size of a serialized program and how long it takes to load, compared
+    with scanning, parsing and resolving the source
+    """
+    filename = args.program or "programs/class_methods.lox"
+    source = "\n".join([load_source(filename)] * args.copies)
+
+    def front_end() -> Sequence[Stmt]:
+        stmts = Parser(Scanner(source).iter_tokens()).parse()
+        with redirect_stdout(io.StringIO()):
+            Resolver().resolve(stmts)
+        return stmts
+
+    data = serialize.dumps(front_end())
+    parse_time = best_time(front_end, args.repeat)
+    load_time = best_time(lambda: serialize.loads(data), args.repeat)
+
+    return [
+        f"program     : {filename} x {args.copies} ({len(source.encode()) / 1024:.1f} KiB)",
+        f"serialized  : {len(data) / 1024:.1f} KiB",
+        f"front end   : {parse_time:.4f}s",
+        f"load        : {load_time:.4f}s",
+        f"speedup     : {parse_time / load_time:.1f}x",
+    ]
+
+
+def bench_operators(args: Namespace) -> List[str]:
+    """
+    Tree-walker time for a loop-heavy program with generic BinaryExprs
+    and with the specialised ones
+    """
+    filename = args.program or "programs/sum_loop.lox"
+    generic = parse_program(filename)
+    specialized = specialize(parse_program(filename))
+
+    def run(stmts: Sequence[Stmt]) -> None:
+        with redirect_stdout(io.StringIO()):
+            Interpreter().interpret(stmts)
+
+    generic_time = best_time(lambda: run(generic), args.repeat)
+    specialized_time = best_time(lambda: run(specialized), args.repeat)
+
+    return [
+        f"program     : {filename}",
+        f"generic     : {generic_time:.4f}s",
+        f"specialized : {specialized_time:.4f}s",
+        f"speedup     : {generic_time / specialized_time:.2f}x",
+    ]
+
+
+def bench_project(args: Namespace) -> List[str]:
+    """
+    Front end time for a project of --files files, each --copies copies
+    of a program, on one process and on --jobs processes
+    """
+    filename = args.program or "programs/class_methods.lox"
+    source = "\n".join([load_source(filename)] * args.copies)
+    jobs = args.jobs or os.cpu_count() or 1
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        filenames = []
+        for n in range(args.files):
+            filenames.append(os.path.join(tmp_dir, f"file{n:04}.lox"))
+            with open(filenames[-1], "w") as fp:
+                fp.write(source)
+
+        serial_time = best_time(lambda: load_project(filenames, jobs=1), args.repeat)
+        parallel_time = best_time(lambda: load_project(filenames, jobs=jobs), args.repeat)
+
+    return [
+        f"project     : {args.files} files of {filename} x {args.copies}",
+        f"1 process   : {serial_time:.4f}s",
+        f"{jobs} processes : {parallel_time:.4f}s",
+        f"speedup     : {serial_time / parallel_time:.2f}x ({os.cpu_count()} CPUs)",
+    ]
+
+
+def bench_batch(args: Namespace) -> List[str]:
+    """
+    Time to run --files short scripts with one lox.py process each and
+    with the batch runner
+    """
+    filename = args.program or "programs/fib_func.lox"
+    source = load_source(filename)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        filenames = []
+        for n in range(args.files):
+            filenames.append(os.path.join(tmp_dir, f"script{n:04}.lox"))
+            with open(filenames[-1], "w") as fp:
+                fp.write(source)
+
+        def run_processes() -> None:
+            for script in filenames:
+                subprocess.run([sys.executable, "lox.py", "--no-cache", script], stdout=subprocess.DEVNULL, check=True)
+
+        process_time = best_time(run_processes, args.repeat)
+        batch_time = best_time(lambda: run_batch([tmp_dir], args.jobs), args.repeat)
+
+    return [
+        f"scripts     : {args.files} x {filename}",
+        f"processes   : {process_time:.4f}s",
+        f"batch       : {batch_time:.4f}s",
+        f"speedup     : {process_time / batch_time:.1f}x",
+    ]
+
+
+BENCHMARKS: Dict[str, Callable[[Namespace], List[str]]] = {
+    "batch": bench_batch,
+    "calls": bench_calls,
+    "loop": bench_loop,
+    "methods": bench_methods,
+    "operators": bench_operators,
+    "parser": bench_parser,
+    "project": bench_project,
+    "memory": bench_memory,
+    "scanner": bench_scanner,
+    "serialize": bench_serialize,
+}
+
+
+def get_parser() -> ArgumentParser:
+    parser = ArgumentParser(description="Benchmark parts of the Lox interpreter")
+    parser.add_argument("benchmark", choices=sorted(BENCHMARKS.keys()))
+    parser.add_argument("program", nargs="?", default=None, help="Lox program to run")
+    parser.add_argument("--repeat", type=int, default=5, help="Take the best of this many runs")
+    parser.add_argument("--loops", type=int, default=50, help="Number of times to run the program per timing")
+    parser.add_argument("--closures", action="store_true", help="Use the closure compiler")
+    parser.add_argument("--copies", type=int, default=1000, help="Copies of the program to use for the memory, parser, scanner and serialize benchmarks")
+    parser.add_argument("--files", type=int, default=200, help="Number of files in the project and batch benchmarks")
+    parser.add_argument("--jobs", type=int, default=None, help="Processes to use for the project and batch benchmarks (default: one per CPU)")
+
+    return parser
+
+
+def main() -> None:
+    args = get_parser().parse_args()
+    for line in BENCHMARKS[args.benchmark](args):
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,401 @@
+"""
+LEGACY
+The original scanner and recursive descent parser. The ones in loxpy
+give the same tokens and trees much faster; these are only kept to test
+that against and for tools.bench to compare speeds with.
+
+"""
+
+from typing import Any, Dict, List
+
+from loxpy.expr import (
+    Expr,
+    AssignmentExpr,
+    BinaryExpr,
+    GetExpr,
+    GroupingExpr,
+    LiteralExpr,
+    LogicalExpr,
+    SetExpr,
+    SuperExpr,
+    ThisExpr,
+    UnaryExpr,
+    VarExpr,
+)
+from loxpy.token import Token, TokenType, token_set
+from loxpy.scanner import KEYWORD_LITERALS, RESERVED_WORDS
+from loxpy.parser import Parser, Tokens, PREC_ASSIGNMENT
+from loxpy.error import LoxParseError
+
+
+class LegacyScanner:
+    """
+    The original character at a time scanner. Scanner produces the same 
+    tokens much faster, this is kept as a reference for testing and 
+    benchmarking against.
+    """
+
+    def __init__(self, source: str, verbose: bool=False) -> None:
+        if type(source) is not str:
+            raise ValueError('source must be a string')
+
+        self.source      :str  = source
+        self.token_list  :List[Token] = []
+
+        # Source position
+        self.src_start   :int  = 0
+        self.src_current :int  = 0
+        self.src_line    :int  = 1
+        self.cur_col     :int  = 1
+
+        # reserved words
+        self.reserved_words : Dict[str, TokenType] = RESERVED_WORDS
+        # debug mode
+        self.verbose: bool = verbose
+
+    def __repr__(self) -> str:
+        return f"Scanner [start : {self.src_start}\t current: {self.src_current}\t line: {self.src_line}]"
+
+    # Internal lexing functions
+    def _src_end(self) -> bool:
+        return self.src_current >= len(self.source)
+
+    def _advance(self) -> str:
+        self.src_current += 1
+        self.cur_col += 1
+        return self.source[self.src_current-1]
+
+    def _new_line(self) -> None:
+        self.src_line += 1
+        self.cur_col = 1
+
+    def _identifier(self) -> None:
+        while self._isalphanumeric(self._peek()):
+            self._advance()
+
+        text = self.source[self.src_start:self.src_current]
+        if text in self.reserved_words.keys():
+            token_type = self.reserved_words[text]
+        else:
+            token_type = TokenType.IDENTIFIER
+        self._add_token(token_type, KEYWORD_LITERALS.get(token_type, text))
+
+    def _isalpha(self, c:str) -> bool:
+        # '_' is ASCII 95
+        if ord(c) in range(65,91) or ord(c) in range(97, 123) or ord(c) == 95:
+            return True
+        return False
+
+    def _isalphanumeric(self, c:str) -> bool:
+        if self._isalpha(c) or self._isdigit(c):
+            return True
+        return False
+
+    def _isdigit(self, c:str) -> bool:
+        # While we could use str.isdigit() here, this function allows us
+        # to write self._isdigit(self._peek()) and consume the output
+        # of self._peek() in a loop
+        if ord(c) in range(48, 58):
+            return True
+
+        return False
+
+    def _match(self, expected_char:str) -> bool:
+        """
+        Only consume input if this is the character we expect
+        """
+        if self._src_end():
+            return False
+        if self.source[self.src_current] != expected_char:
+            return False
+        self.src_current += 1
+
+        return True
+
+    def _number(self) -> None:
+        while self._isdigit(self._peek()) is True:
+            self._advance()
+
+        # Check for fractional part
+        if self._peek() == '.' and self._isdigit(self._peek_next()):
+            self._advance()
+            while(self._isdigit(self._peek())):
+                self._advance()
+
+        # Now add a new number token
+        self._add_token(
+            TokenType.NUMBER,
+            float(self.source[self.src_start:self.src_current])
+        )
+
+    def _peek(self) -> str:
+        if self._src_end():
+            return '\0'
+        return self.source[self.src_current]
+
+    def _peek_next(self) -> str:
+        if self._src_end() or (self.src_current + 1) >= len(self.source):
+            return '\0'
+        return self.source[self.src_current + 1]
+
+    def _parse_string(self) -> None:
+        while self._peek() != '"' and self._src_end() is False:
+            if self._peek() == '\n':
+                self._new_line()
+            self._advance()
+
+        # Handle unterminated string
+        if self._src_end():
+            print(f"line {self.src_line}: unterminated string")
+            return
+
+        # Consume closing quote
+        self._advance()
+        # trim surrounding quotes
+        value = self.source[self.src_start + 1 : self.src_current - 1]
+        self._add_token(TokenType.STRING, value)
+
+    def _add_token(self, token_type: TokenType, literal:Any=None) -> None:
+        text = self.source[self.src_start : self.src_current]
+        token = Token(token_type, text, literal, self.src_line, self.cur_col)
+        self.token_list.append(token)
+
+    def _scan_token(self) -> None:
+        """
+        Scan a single token from the source
+        """
+        c = self._advance()
+        # single character tokens
+        if c == '(':
+            self._add_token(TokenType.LEFT_PAREN)
+        elif c == ')':
+            self._add_token(TokenType.RIGHT_PAREN)
+        elif c == '{':
+            self._add_token(TokenType.LEFT_BRACE)
+        elif c == '}':
+            self._add_token(TokenType.RIGHT_BRACE)
+        elif c == ',':
+            self._add_token(TokenType.COMMA)
+        elif c == '.':
+            self._add_token(TokenType.DOT)
+        elif c == '-':
+            self._add_token(TokenType.MINUS)
+        elif c == '+':
+            self._add_token(TokenType.PLUS)
+        elif c == ';':
+            self._add_token(TokenType.SEMICOLON)
+        elif c == '*':
+            self._add_token(TokenType.STAR)
+        # Two character tokens
+        elif c == '!':
+            if self._match('='):
+                self._add_token(TokenType.BANG_EQUAL)
+            else:
+                self._add_token(TokenType.BANG)
+        elif c == '=':
+            if self._match('='):
+                self._add_token(TokenType.EQUAL_EQUAL)
+            else:
+                self._add_token(TokenType.EQUAL)
+        elif c == '<':
+            if self._match('='):
+                self._add_token(TokenType.LESS_EQUAL)
+            else:
+                self._add_token(TokenType.LESS)
+        elif c == '>':
+            if self._match('='):
+                self._add_token(TokenType.GREATER_EQUAL)
+            else:
+                self._add_token(TokenType.GREATER)
+        # Because comments in Lox begin with a slash, we need
+        # some extra logic here
+        elif c == '/':
+            if self._match('/'):
+                # Comment - runs until end of line
+                while(self._peek() != '\n' and self._src_end() == False):
+                    self._advance()
+            else:
+                self._add_token(TokenType.SLASH)
+        # String literals
+        elif c == '"':
+            self._parse_string()
+        # Consume whitespace
+        elif c == ' ' or c == '\r' or c == '\t':
+            pass
+        elif c == '\n':
+            self._new_line()
+        else:
+            if self._isdigit(c):
+                self._number()
+            elif self._isalpha(c):
+                self._identifier()
+            else:
+                print(f"line {self.src_line}: unexpected character {c}")
+
+        if self.verbose:
+            print('%s' % self.__repr__())
+
+    def scan(self) -> List[Token]:
+        """
+        Scan across the entire source and produce a list of all tokens
+        """
+        self.src_current = 0
+        self.src_start = 0
+        while(self._src_end() == False):
+            self.src_start = self.src_current
+            self._scan_token()
+
+        token = Token(TokenType.LOX_EOF, "", None, self.src_line)
+        self.token_list.append(token)
+
+        return self.token_list
+
+
+class LegacyTokens(Tokens):
+    """
+    LegacyTokens
+    Operator sets for each level of precedence, which the Pratt parser
+    gets from its tables instead
+    """
+    EQUALITY    = token_set(TokenType.BANG_EQUAL, TokenType.EQUAL_EQUAL)
+    COMPARISON  = token_set(TokenType.GREATER, TokenType.GREATER_EQUAL, TokenType.LESS, TokenType.LESS_EQUAL)
+    TERM        = token_set(TokenType.MINUS, TokenType.PLUS)
+    FACTOR      = token_set(TokenType.SLASH, TokenType.STAR)
+    UNARY       = token_set(TokenType.BANG, TokenType.MINUS)
+    LITERAL     = token_set(TokenType.FALSE, TokenType.TRUE, TokenType.NIL, TokenType.NUMBER, TokenType.STRING)
+
+
+class LegacyParser(Parser):
+    """
+    LegacyParser
+    Parses expressions by recursive descent, with one method for each 
+    level of precedence. Parser gives the same trees and errors, this is
+    kept to check that and to compare speeds.
+    """
+
+    def _expression(self, precedence: int=PREC_ASSIGNMENT) -> Expr:
+        return self._assignment()
+
+    def _assignment(self) -> Expr:
+        expr = self._or()
+
+        if self._match(LegacyTokens.EQUAL):
+            equals = self._previous()
+            value = self._assignment()
+
+            if isinstance(expr, VarExpr):
+                name = expr.name
+                return AssignmentExpr(name, value)
+            elif isinstance(expr, GetExpr):    # TODO: what to tell linter here?
+                return SetExpr(expr.obj, expr.name, value)
+
+            raise LoxParseError(equals, "Invalid assignment target")
+
+        return expr
+
+    def _or(self) -> Expr:
+        expr = self._and()
+
+        while self._match(LegacyTokens.OR):
+            op = self._previous()
+            right = self._and()
+            expr = LogicalExpr(op, expr, right)
+
+        return expr
+
+    def _and(self) -> Expr:
+        expr = self._equality()
+
+        while self._match(LegacyTokens.AND):
+            op = self._previous()
+            right = self._equality()
+            expr = LogicalExpr(op, expr, right)
+
+        return expr
+
+    def _equality(self) -> Expr:
+        expr = self._comparison()
+
+        while self._match(LegacyTokens.EQUALITY):
+            operator = self._previous()
+            right = self._comparison()
+            expr = BinaryExpr(operator, expr, right)
+
+        return expr
+
+    def _comparison(self) -> Expr:
+        expr = self._term()
+
+        while self._match(LegacyTokens.COMPARISON):
+            operator = self._previous()
+            right    = self._term()
+            expr     = BinaryExpr(operator, expr, right)
+
+        return expr
+
+    def _term(self) -> Expr:
+        expr = self._factor()
+
+        while self._match(LegacyTokens.TERM):
+            operator = self._previous()
+            right    = self._factor()
+            expr     = BinaryExpr(operator, expr, right)
+
+        return expr
+
+    def _factor(self) -> Expr:
+        expr = self._unary()
+
+        while self._match(LegacyTokens.FACTOR):
+            operator = self._previous()
+            right = self._unary()
+            expr = BinaryExpr(operator, expr, right)
+
+        return expr
+
+    def _unary(self) -> Expr:
+        if self._match(LegacyTokens.UNARY):
+            operator = self._previous()
+            right = self._unary()
+            expr = UnaryExpr(operator, right)
+            return expr
+
+        return self._call()
+
+    def _call(self) -> Expr:
+        expr = self._primary()
+
+        while True:
+            if self._match(LegacyTokens.LEFT_PAREN):
+                expr = self._finish_call(expr)
+            elif self._match(LegacyTokens.DOT):
+                name = self._consume(LegacyTokens.IDENTIFIER, "Expect property name after '.'")
+                expr = GetExpr(expr, name)
+            else:
+                break
+
+        return expr
+
+    def _primary(self) -> Expr:
+        # The scanner has already converted the literal value of these tokens
+        if self._match(LegacyTokens.LITERAL):
+            return LiteralExpr(self._previous())
+
+        if self._match(LegacyTokens.SUPER):
+            keyword = self._previous()
+            self._consume(LegacyTokens.DOT, "Expect '.' after 'super'")
+            method = self._consume(LegacyTokens.IDENTIFIER, "Expect superclass method name")
+            return SuperExpr(keyword, method)
+
+        if self._match(LegacyTokens.THIS):
+            return ThisExpr(self._previous())
+
+        if self._match(LegacyTokens.IDENTIFIER):
+            return VarExpr(self._previous())
+
+        if self._match(LegacyTokens.LEFT_PAREN):
+            expr = self._expression()
+            self._consume(LegacyTokens.RIGHT_PAREN, "Expect ')' after expression")
+            return GroupingExpr(expr)
+
+        raise LoxParseError(self._peek(), "Expect expression")